@@ -1,9 +1,8 @@
-from typing import Generator, Optional
-import os
-from fastapi import Depends, HTTPException, status
+from typing import AsyncGenerator, Generator, Optional
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwt
-from .models.db import SessionLocal
+from .models.db import SessionLocal, async_session_scope
+from .tokens import decode_token
 
 
 def get_db() -> Generator:
@@ -14,25 +13,39 @@ def get_db() -> Generator:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator:
+    # Falls back to the sync session (wrapped) when DB_ASYNC=false, e.g. in tests.
+    async with async_session_scope() as db:
+        yield db
+
+
 security = HTTPBearer(auto_error=False)
-SECRET_KEY = os.getenv("JWT_SECRET", "devsecret_change_me")
-ALGO = "HS256"
 
 
-def get_current_user_role(
+async def get_claims(
+    request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-) -> str:
+) -> dict:
+    """Verified JWT claims for this request, decoded at most once and kept on ``request.state.claims``.
+
+    Every auth dependency below builds on this one, and FastAPI caches it per request.
+    """
+    claims = getattr(request.state, "claims", None)
+    if claims is not None:
+        return claims
     if credentials is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="not authenticated")
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGO])
-        return str(payload.get("role") or "")
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token")
+    claims = decode_token(credentials.credentials)
+    request.state.claims = claims
+    return claims
+
+
+async def get_current_user_role(claims: dict = Depends(get_claims)) -> str:
+    return str(claims.get("role") or "")
 
 
 def require_role(*roles: str):
-    def _dep(role: str = Depends(get_current_user_role)) -> None:
+    async def _dep(role: str = Depends(get_current_user_role)) -> None:
         if role not in roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="forbidden")
         return None
@@ -41,20 +54,23 @@ def require_role(*roles: str):
 
 
 # Convenience dependencies
-def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> dict:
-    if credentials is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="not authenticated")
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGO])
-        return payload  # contains at least: sub, role, exp
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token")
+async def get_current_user(claims: dict = Depends(get_claims)) -> dict:
+    return claims  # contains at least: sub, role, exp
 
 
-def get_current_admin_user(_: None = Depends(require_role("admin"))) -> None:
-    return None
+async def get_stream_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    token: Optional[str] = Query(None, description="JWT for clients that cannot set headers (EventSource)"),
+) -> dict:
+    if credentials is None and token:
+        request.state.claims = decode_token(token)
+    return await get_claims(request, credentials)
 
 
-def get_current_tutor_user(_: None = Depends(require_role("tutor", "admin"))) -> None:
+async def get_current_admin_user(_: None = Depends(require_role("admin"))) -> None:
     return None
 
+
+async def get_current_tutor_user(_: None = Depends(require_role("tutor", "admin"))) -> None:
+    return None
@@ -1,12 +1,46 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import auth, forms, questions, realtime, video, admin, classrooms, submissions
-from .models.db import engine
+from sqlalchemy import text
+from . import storage, uploads
+from .routers import auth, forms, questions, realtime, video, admin, classrooms, submissions, retrieval, grading
+from .models.db import async_engine, engine
 from .models.entities import Base
+from .models.migrations import upgrade
+from .pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+from .passwords import hashing_pool
+from .pubsub import broker
+from .redis_client import close_redis
+from .services.autosave import flusher
+from .services.exam_cache import invalidation_listener
+from .services.llm import close_llm
+from .services.retrieval import retrieval_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    flusher.start()
+    invalidation_listener.start()
+    storage.warm_up()
+    retrieval_service.start()
+    yield
+    await retrieval_service.stop()
+    await close_llm()
+    await invalidation_listener.stop()
+    await flusher.stop()
+    await broker.close()
+    await close_redis()
+    hashing_pool.shutdown()
+    uploads.shutdown()
+    await storage.close()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="edu-rag API", version="0.1.0")
+    app = FastAPI(title="edu-rag API", version="0.1.0", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -14,6 +48,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER],
     )
 
     app.include_router(auth.router)
@@ -24,6 +59,8 @@ def create_app() -> FastAPI:
     app.include_router(admin.router)
     app.include_router(classrooms.router)
     app.include_router(submissions.router)
+    app.include_router(retrieval.router)
+    app.include_router(grading.router)
 
     @app.get("/health")
     def health() -> dict:
@@ -39,6 +76,10 @@ def create_app() -> FastAPI:
 app = create_app()
 
 # Create tables at startup (dev convenience)
+if engine.dialect.name == "postgresql":
+    with engine.begin() as conn:  # video_segments.embedding is a pgvector column
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
 Base.metadata.create_all(bind=engine)
+upgrade(engine)  # columns/constraints create_all does not add to existing tables
 
 
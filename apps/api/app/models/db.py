@@ -1,5 +1,9 @@
 import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 
@@ -7,9 +11,89 @@ DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "postgresql+psycopg://postgres:postgres@db:5432/edurag",
 )
+# psycopg 3 speaks asyncio natively, so the same URL works for both engines.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL)
+
+# DB_ASYNC=false keeps every request on the sync engine (tests, sqlite without aiosqlite).
+DB_ASYNC = os.getenv("DB_ASYNC", "true").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
 
+def _pool_kwargs(url: str) -> dict:
+    # sqlite uses a singleton/static pool and rejects the QueuePool sizing arguments
+    if url.startswith("sqlite"):
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True, **_pool_kwargs(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
+async_engine = (
+    create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True, **_pool_kwargs(ASYNC_DATABASE_URL))
+    if DB_ASYNC
+    else None
+)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if async_engine is not None
+    else None
+)
+
+
+class SyncSessionAdapter:
+    """Exposes a sync ``Session`` through the awaitable subset of ``AsyncSession`` the routers use.
+
+    Used when ``DB_ASYNC=false`` so tests can run the async routers against a plain sync engine.
+    """
+
+    def __init__(self, session) -> None:
+        self.sync_session = session
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return self.sync_session.execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return self.sync_session.scalar(statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return self.sync_session.scalars(statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return self.sync_session.get(entity, ident, **kwargs)
+
+    async def delete(self, instance) -> None:
+        self.sync_session.delete(instance)
+
+    async def flush(self) -> None:
+        self.sync_session.flush()
+
+    async def commit(self) -> None:
+        self.sync_session.commit()
+
+    async def rollback(self) -> None:
+        self.sync_session.rollback()
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        self.sync_session.refresh(instance, attribute_names)
+
+    async def close(self) -> None:
+        self.sync_session.close()
+
 
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator:
+    """Yield an ``AsyncSession`` (or the sync adapter when ``DB_ASYNC=false``) and close it afterwards."""
+    db = SyncSessionAdapter(SessionLocal()) if AsyncSessionLocal is None else AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
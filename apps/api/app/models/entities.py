@@ -1,7 +1,9 @@
+import os
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, JSON, UniqueConstraint
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, String, Text, JSON, UniqueConstraint
 from sqlalchemy.orm import declarative_base, relationship
 
 
@@ -16,7 +18,7 @@ class User(Base):
     email = Column(String(255), nullable=False)
     password_hash = Column(String(255), nullable=False)
     role = Column(String(32), nullable=False, default="student")  # admin | tutor | student
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
 
 class Form(Base):
@@ -28,7 +30,7 @@ class Form(Base):
     owner_id = Column(Integer, nullable=True)
     course_id = Column(Integer, nullable=True)
     settings_json = Column(JSON, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     questions = relationship("Question", back_populates="form", cascade="all, delete-orphan")
@@ -36,6 +38,8 @@ class Form(Base):
 
 class Question(Base):
     __tablename__ = "questions"
+    # keyset pagination of a form's questions walks (form_id, created_at, id)
+    __table_args__ = (Index("ix_questions_form_created", "form_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     form_id = Column(Integer, ForeignKey("forms.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -57,7 +61,58 @@ class Video(Base):
     storage_key = Column(String(512), nullable=False)
     duration = Column(Integer, nullable=True)
     lang = Column(String(8), nullable=True)
+    # SHA-256 (hex) of the stored bytes; uploads of identical content resolve to one row/object
+    content_hash = Column(String(64), nullable=True, unique=True, index=True)
+    # indexing: pending | indexing | indexed | no_transcript | failed
+    index_status = Column(String(16), nullable=True)
+    index_source = Column(String(600), nullable=True)  # "<transcript key>@<etag>" the segments were built from
+    segment_count = Column(Integer, nullable=True)
+    indexed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+# dimension of the embedding model (services.embeddings); changing it needs a table rebuild
+EMBEDDING_DIM = int(os.getenv("EMBED_DIM", "384"))
+
+
+class VideoSegment(Base):
+    """A timestamped, overlapping transcript window of a video plus its embedding."""
+
+    __tablename__ = "video_segments"
+    __table_args__ = (
+        UniqueConstraint("video_id", "seq", name="uq_video_segments_video_seq"),
+        Index(
+            "ix_video_segments_embedding",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 0-based position in the video
+    start_ms = Column(Integer, nullable=False)
+    end_ms = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    embedding = Column(Vector(EMBEDDING_DIM), nullable=False)
+
+
+class UploadSession(Base):
+    """A resumable (S3 multipart) video upload; parts live in object storage until completion."""
+
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(36), primary_key=True)  # uuid4, handed to the client
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    storage_key = Column(String(512), nullable=False)  # object key inside the bucket
+    upload_id = Column(String(255), nullable=False)  # S3 multipart upload id
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(255), nullable=True)
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="SET NULL"), nullable=True)  # set on completion
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
 
 
 # --- Classrooms ---
@@ -115,13 +170,68 @@ class Submission(Base):
 
 class Answer(Base):
     __tablename__ = "answers"
+    # one row per (submission, question) so autosave can upsert with ON CONFLICT
+    __table_args__ = (UniqueConstraint("submission_id", "question_id", name="uq_answer_submission_question"),)
 
     id = Column(Integer, primary_key=True, index=True)
     submission_id = Column(Integer, ForeignKey("submissions.id", ondelete="CASCADE"), nullable=False, index=True)
     question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
     content = Column(Text, nullable=True)
+    # autosave ordering stamp (microseconds) of the write that set ``content``: a flush carrying an
+    # older stamp never overwrites a newer answer, whichever commits last
+    save_seq = Column(BigInteger, nullable=True)
     score = Column(Integer, nullable=True)
     feedback = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     submission = relationship("Submission", back_populates="answers")
+
+
+class GradingRun(Base):
+    """One grading pass over a form; its submissions are split into ``GradingChunk``s."""
+
+    __tablename__ = "grading_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    form_id = Column(Integer, ForeignKey("forms.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_by = Column(Integer, nullable=True)
+    status = Column(String(16), nullable=False, default="pending")  # pending | running | done | failed
+    chunk_size = Column(Integer, nullable=False)
+    chunks_total = Column(Integer, nullable=False, default=0)
+    summary_json = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class GradingChunk(Base):
+    """A checkpointed slice of a run: once ``done``, a redelivered or resumed task skips it."""
+
+    __tablename__ = "grading_chunks"
+    __table_args__ = (UniqueConstraint("run_id", "seq", name="uq_grading_chunks_run_seq"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("grading_runs.id", ondelete="CASCADE"), nullable=False, index=True)
+    seq = Column(Integer, nullable=False)
+    submission_ids = Column(JSON, nullable=False)
+    status = Column(String(16), nullable=False, default="pending")  # pending | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    answers = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class HintLadder(Base):
+    """Precomputed student-independent hint stages of a question, valid for one ``version``
+    (hash of the hint-relevant question content), so an edited prompt never serves stale hints."""
+
+    __tablename__ = "hint_ladders"
+    __table_args__ = (UniqueConstraint("question_id", "version", name="uq_hint_ladders_question_version"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
+    version = Column(String(32), nullable=False)
+    stages = Column(JSON, nullable=False)  # stage texts, stage 1 first
+    model = Column(String(128), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,96 @@
+"""Schema upgrades for databases created before a model change.
+
+``Base.metadata.create_all`` creates missing tables but never alters existing ones, so columns and
+constraints added to a model later are applied here. Every step inspects the live schema first and
+is a no-op once applied; the API runs ``upgrade`` at startup, right after ``create_all``.
+"""
+import logging
+
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .entities import Answer, Video
+
+
+logger = logging.getLogger(__name__)
+
+# serializes the upgrade when several API workers start against the same postgres database
+_ADVISORY_LOCK_ID = 0x65647572
+
+
+def _constraint_names(conn: Connection, table: str) -> set[str]:
+    insp = inspect(conn)
+    return {i["name"] for i in insp.get_indexes(table)} | {c["name"] for c in insp.get_unique_constraints(table)}
+
+
+def _add_columns(conn: Connection, table: Table, names: tuple[str, ...]) -> list[str]:
+    """Add the model's ``names`` columns missing from the live table (nullable, no default)."""
+    have = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    added = []
+    for name in names:
+        if name in have:
+            continue
+        column_type = table.c[name].type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+        added.append(name)
+    return added
+
+
+def _answers_unique(conn: Connection) -> None:
+    """One answer per (submission, question), which the autosave ``ON CONFLICT`` upsert relies on."""
+    if "uq_answer_submission_question" in _constraint_names(conn, "answers"):
+        return
+    # older autosave code could insert twice for the same question; the highest id is the latest save
+    removed = conn.execute(
+        text("DELETE FROM answers WHERE id NOT IN (SELECT MAX(id) FROM answers GROUP BY submission_id, question_id)")
+    ).rowcount
+    conn.execute(text("CREATE UNIQUE INDEX uq_answer_submission_question ON answers (submission_id, question_id)"))
+    logger.info("answers: added uq_answer_submission_question, removed %s duplicate rows", removed)
+
+
+def _answers_save_seq(conn: Connection) -> None:
+    """Autosave ordering stamp; existing answers keep NULL, which any later save overwrites."""
+    if _add_columns(conn, Answer.__table__, ("save_seq",)):
+        logger.info("answers: added column save_seq")
+
+
+def _video_columns(conn: Connection) -> None:
+    """Content hash for upload deduplication and the indexing pipeline's state.
+
+    Existing rows keep NULL: the unique index allows that, and ``index_status`` NULL means never indexed.
+    """
+    added = _add_columns(
+        conn, Video.__table__, ("content_hash", "index_status", "index_source", "segment_count", "indexed_at")
+    )
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_videos_content_hash ON videos (content_hash)"))
+    if added:
+        logger.info("videos: added columns %s", ", ".join(added))
+
+
+# keyset pagination of the list endpoints walks these (``created_at``, ``id``) orderings
+_PAGINATION_INDEXES = (
+    ("ix_users_created_at", "users", "created_at"),
+    ("ix_forms_created_at", "forms", "created_at"),
+    ("ix_videos_created_at", "videos", "created_at"),
+    ("ix_questions_form_created", "questions", "form_id, created_at, id"),
+)
+
+
+def _pagination_indexes(conn: Connection) -> None:
+    """Indexes added to models after their tables existed (``create_all`` only indexes new tables)."""
+    have = {table: _constraint_names(conn, table) for table in {t for _, t, _ in _PAGINATION_INDEXES}}
+    for name, table, columns in _PAGINATION_INDEXES:
+        if name not in have[table]:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+            logger.info("%s: added index %s", table, name)
+
+
+STEPS = (_answers_unique, _answers_save_seq, _video_columns, _pagination_indexes)
+
+
+def upgrade(engine: Engine) -> None:
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+        for step in STEPS:
+            step(conn)
@@ -0,0 +1,94 @@
+"""Keyset (cursor) pagination shared by the list endpoints.
+
+Lists keep returning a plain JSON array; paging metadata travels in headers:
+- ``X-Next-Cursor``: opaque cursor for the next page (absent on the last page)
+- ``X-Total-Count``: total matching rows, only when ``with_total=true`` (costs a COUNT)
+"""
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import DateTime, func, select, tuple_
+
+
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "100"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+class PageParams:
+    def __init__(
+        self,
+        limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+        cursor: Optional[str] = Query(None, description="opaque cursor from X-Next-Cursor"),
+        with_total: bool = Query(False, description="include X-Total-Count header"),
+    ) -> None:
+        self.limit = limit
+        self.cursor = cursor
+        self.with_total = with_total
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> list[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("cursor shape")
+        return [
+            datetime.fromisoformat(v) if isinstance(k.type, DateTime) else k.type.python_type(v)
+            for k, v in zip(keys, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def _keyset(stmt, page: PageParams, keys: Sequence, descending: bool):
+    if page.cursor:
+        after = decode_cursor(page.cursor, keys)
+        row, bound = tuple_(*keys), tuple_(*after)
+        stmt = stmt.where(row < bound if descending else row > bound)
+    return stmt.order_by(*[k.desc() if descending else k.asc() for k in keys]).limit(page.limit + 1)
+
+
+async def _count(db, stmt, page: PageParams, response: Response) -> None:
+    if page.with_total:
+        total = await db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+        response.headers[TOTAL_COUNT_HEADER] = str(total or 0)
+
+
+def _trim(items: list, page: PageParams, response: Response, cursor_of) -> list:
+    if len(items) > page.limit:
+        items = items[: page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(cursor_of(items[-1]))
+    return items
+
+
+async def paginate(db, stmt, page: PageParams, response: Response, keys: Sequence, descending: bool = True) -> list:
+    """Apply keyset paging over ``keys`` (e.g. ``(Form.created_at, Form.id)``) to an entity ``select``.
+
+    ``keys`` must end with a unique column so the ordering is total.
+    """
+    await _count(db, stmt, page, response)
+    items = list((await db.scalars(_keyset(stmt, page, keys, descending))).all())
+    return _trim(items, page, response, lambda last: [getattr(last, k.key) for k in keys])
+
+
+async def paginate_rows(db, stmt, page: PageParams, response: Response, keys: Sequence, descending: bool = True) -> list[dict]:
+    """Like ``paginate`` but for column selects: returns plain dicts (the fast JSON path).
+
+    The key columns must be part of the selected columns.
+    """
+    await _count(db, stmt, page, response)
+    result = await db.execute(_keyset(stmt, page, keys, descending))
+    items = [dict(m) for m in result.mappings()]
+    return _trim(items, page, response, lambda last: [last[k.key] for k in keys])
@@ -0,0 +1,86 @@
+"""Password hashing off the request path.
+
+bcrypt is deliberately slow, so hashing/verification runs in a dedicated process pool sized to the
+cores. The number of in-flight jobs is capped: when ``HASH_MAX_PENDING`` is reached new requests get
+``503`` with ``Retry-After`` instead of queueing behind a login storm and starving other routes.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "process").lower()  # process | thread
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(HASH_WORKERS * 8)))
+HASH_RETRY_AFTER_S = int(os.getenv("HASH_RETRY_AFTER_S", "2"))
+
+# hashes with fewer rounds than BCRYPT_ROUNDS count as deprecated and are upgraded on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def hash_password(p: str) -> str:
+    return pwd_context.hash(p)
+
+
+def verify_password(p: str, h: str) -> bool:
+    return pwd_context.verify(p, h)
+
+
+def verify_and_update(p: str, h: str) -> tuple[bool, Optional[str]]:
+    """Returns (valid, new_hash); new_hash is set when ``h`` should be replaced (e.g. rounds raised)."""
+    return pwd_context.verify_and_update(p, h)
+
+
+class HashingPool:
+    def __init__(self, kind: str = HASH_EXECUTOR, workers: int = HASH_WORKERS, max_pending: int = HASH_MAX_PENDING) -> None:
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            else:
+                # spawn: never fork the running event loop / DB pools into the workers
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="authentication busy, retry shortly",
+                headers={"Retry-After": str(HASH_RETRY_AFTER_S)},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_pool = HashingPool()
+
+
+async def hash_password_async(p: str) -> str:
+    return await hashing_pool.run(hash_password, p)
+
+
+async def verify_password_async(p: str, h: str) -> tuple[bool, Optional[str]]:
+    return await hashing_pool.run(verify_and_update, p, h)
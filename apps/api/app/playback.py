@@ -0,0 +1,126 @@
+"""Video playback without routing student traffic through the API.
+
+``presigned_url`` signs a short-lived GET URL so players fetch (and seek with HTTP ``Range``)
+directly from MinIO. Signing is local HMAC work: the signing client is configured with the public
+endpoint and a fixed region so it never calls the storage server.
+
+``range_response`` is the fallback for deployments where MinIO is not reachable by clients: a
+single-range ``206`` stream copied in large chunks by Starlette's threadpool iteration, without
+buffering the object.
+"""
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
+from minio import Minio
+from minio.error import S3Error
+
+from . import storage
+
+
+PLAYBACK_URL_TTL_S = int(os.getenv("PLAYBACK_URL_TTL_S", "900"))
+# host:port clients use to reach MinIO (defaults to MINIO_ENDPOINT, which is often compose-internal)
+MINIO_PUBLIC_ENDPOINT = os.getenv("MINIO_PUBLIC_ENDPOINT", storage.MINIO_ENDPOINT)
+MINIO_PUBLIC_SECURE = os.getenv("MINIO_PUBLIC_SECURE", str(storage.MINIO_SECURE)).lower() == "true"
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+PLAYBACK_PRESIGNED = storage.STORAGE_BACKEND != "memory" and os.getenv("PLAYBACK_PRESIGNED", "true").lower() == "true"
+PLAYBACK_CHUNK_BYTES = int(os.getenv("PLAYBACK_CHUNK_BYTES", str(512 * 1024)))
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_signer: Optional[Minio] = None
+
+
+def _get_signer() -> Minio:
+    global _signer
+    if _signer is None:
+        _signer = Minio(
+            MINIO_PUBLIC_ENDPOINT,
+            access_key=storage.MINIO_ACCESS_KEY,
+            secret_key=storage.MINIO_SECRET_KEY,
+            secure=MINIO_PUBLIC_SECURE,
+            region=MINIO_REGION,
+        )
+    return _signer
+
+
+def presigned_url(storage_key: str) -> tuple[str, datetime]:
+    bucket, key = storage.split_key(storage_key)
+    ttl = timedelta(seconds=PLAYBACK_URL_TTL_S)
+    return _get_signer().presigned_get_object(bucket, key, expires=ttl), datetime.utcnow() + ttl
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Inclusive ``(start, end)`` for a single ``bytes=`` range; ``None`` means serve everything.
+
+    Multi-range and malformed headers are ignored (allowed by RFC 9110); unsatisfiable ones raise 416.
+    """
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if m is None:
+        return None
+    first, last = m.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    elif last:
+        start, end = max(size - int(last), 0), size - 1  # suffix range: the final N bytes
+    else:
+        return None
+    if start >= size or (not first and int(last) == 0):
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def _copy(bucket: str, key: str, offset: int, length: int) -> Iterator[bytes]:
+    # sync generator: Starlette drives it from its threadpool, so each blocking read is off the loop
+    resp = storage.get_client().get_object(bucket, key, offset=offset, length=length)
+    try:
+        yield from resp.stream(PLAYBACK_CHUNK_BYTES)
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+async def range_response(request: Request, storage_key: str) -> Response:
+    bucket, key = storage.split_key(storage_key)
+    try:
+        stat = await asyncio.to_thread(storage.get_client().stat_object, bucket, key)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchBucket"):
+            raise HTTPException(status_code=404, detail="video object missing")
+        raise
+    size = stat.size
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "private, max-age=3600"}
+    if stat.etag:
+        headers["ETag"] = f'"{stat.etag}"'
+    if stat.last_modified:
+        headers["Last-Modified"] = stat.last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    media_type = stat.content_type or "application/octet-stream"
+
+    byte_range = parse_range(request.headers.get("range"), size)
+    if_range = request.headers.get("if-range")
+    if byte_range is not None and if_range and if_range not in (headers.get("ETag"), headers.get("Last-Modified")):
+        byte_range = None  # the client's cached copy is stale: send the whole (new) object
+    start, end = byte_range if byte_range is not None else (0, size - 1)
+    length = end - start + 1 if size else 0
+    headers["Content-Length"] = str(length)
+    code = status.HTTP_200_OK
+    if byte_range is not None:
+        code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    if request.method == "HEAD" or length == 0:
+        return Response(status_code=code, headers=headers, media_type=media_type)
+    return StreamingResponse(_copy(bucket, key, start, length), status_code=code, headers=headers, media_type=media_type)
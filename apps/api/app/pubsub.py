@@ -0,0 +1,189 @@
+"""Realtime pub/sub backbone.
+
+Channels are scoped per form, submission and classroom (see the ``*_channel`` helpers). Messages
+are small dicts ``{"channel", "event", "data"}``.
+
+- ``MemoryBroker``: in-process fan-out; the default and what tests use.
+- ``RedisBroker``: publishes through Redis so every uvicorn worker / API replica sees every event.
+  Each process holds a single Redis subscription per channel and fans out to its local subscribers.
+
+``publish_sync`` is the entry point for code outside the event loop (Celery tasks, worker threads).
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory").lower()
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "256"))
+
+
+def form_channel(form_id: int) -> str:
+    return f"form:{form_id}"
+
+
+def submission_channel(submission_id: int) -> str:
+    return f"submission:{submission_id}"
+
+
+def classroom_channel(classroom_id: int) -> str:
+    return f"classroom:{classroom_id}"
+
+
+def grading_channel(run_id: int) -> str:
+    return f"grading:{run_id}"
+
+
+class Subscription:
+    def __init__(self, channels: Iterable[str], maxsize: int = PUBSUB_QUEUE_SIZE) -> None:
+        self.channels = tuple(channels)
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message: dict) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # slow consumer: drop rather than stall the publisher
+            self.dropped += 1
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self._queue.get()
+
+
+class MemoryBroker:
+    def __init__(self) -> None:
+        self._subs: dict[str, set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def deliver(self, message: dict) -> None:
+        for sub in tuple(self._subs.get(message["channel"], ())):
+            sub.deliver(message)
+
+    async def publish(self, channel: str, event: str, data: Any = None) -> None:
+        self.deliver({"channel": channel, "event": event, "data": data})
+
+    def publish_sync(self, channel: str, event: str, data: Any = None) -> None:
+        # subscriber queues belong to the loop; only an in-process task (eager Celery) can reach them
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.deliver, {"channel": channel, "event": event, "data": data})
+
+    @asynccontextmanager
+    async def subscribe(self, channels: Iterable[str]) -> AsyncIterator[Subscription]:
+        self._loop = asyncio.get_running_loop()
+        sub = Subscription(channels)
+        for ch in sub.channels:
+            self._subs.setdefault(ch, set()).add(sub)
+        try:
+            yield sub
+        finally:
+            for ch in sub.channels:
+                subs = self._subs.get(ch)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subs[ch]
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._subs.get(channel, ()))
+
+    async def close(self) -> None:
+        self._subs.clear()
+
+
+class RedisBroker:
+    def __init__(self, redis) -> None:
+        self._redis = redis
+        self._local = MemoryBroker()
+        self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        self._refs: Counter = Counter()
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.Task] = None
+
+    async def publish(self, channel: str, event: str, data: Any = None) -> None:
+        payload = json.dumps({"channel": channel, "event": event, "data": data}, default=str)
+        try:
+            await self._redis.publish(channel, payload)
+        except Exception:  # noqa: BLE001 - realtime is best effort, never fail the request
+            logger.exception("publish to %s failed", channel)
+
+    def publish_sync(self, channel: str, event: str, data: Any = None) -> None:
+        from .redis_client import get_sync_redis
+
+        payload = json.dumps({"channel": channel, "event": event, "data": data}, default=str)
+        try:
+            get_sync_redis().publish(channel, payload)
+        except Exception:  # noqa: BLE001
+            logger.exception("publish to %s failed", channel)
+
+    async def _read_loop(self) -> None:
+        while True:
+            try:
+                msg = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001
+                logger.exception("redis pubsub read failed")
+                await asyncio.sleep(1.0)
+                continue
+            if msg and msg.get("type") == "message":
+                try:
+                    self._local.deliver(json.loads(msg["data"]))
+                except (ValueError, KeyError):
+                    logger.warning("bad pubsub payload on %s", msg.get("channel"))
+
+    @asynccontextmanager
+    async def subscribe(self, channels: Iterable[str]) -> AsyncIterator[Subscription]:
+        channels = tuple(channels)
+        async with self._local.subscribe(channels) as sub:
+            async with self._lock:
+                new = [ch for ch in channels if self._refs[ch] == 0]
+                if new:
+                    await self._pubsub.subscribe(*new)
+                # only counted once SUBSCRIBE went through, or a failed one would mark them subscribed for good
+                self._refs.update(channels)
+                if self._reader is None:
+                    self._reader = asyncio.create_task(self._read_loop())
+            try:
+                yield sub
+            finally:
+                async with self._lock:
+                    self._refs.subtract(channels)
+                    gone = [ch for ch in channels if self._refs[ch] <= 0]
+                    for ch in gone:
+                        del self._refs[ch]
+                    if gone:
+                        await self._pubsub.unsubscribe(*gone)
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        await self._pubsub.aclose()
+
+
+def build_broker(backend: str = PUBSUB_BACKEND):
+    if backend == "redis":
+        from .redis_client import get_redis
+
+        return RedisBroker(get_redis())
+    return MemoryBroker()
+
+
+broker = build_broker()
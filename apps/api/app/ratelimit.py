@@ -0,0 +1,117 @@
+"""Per-key token-bucket rate limiting (GCRA form).
+
+Each key stores only its "theoretical arrival time" (TAT). A request reserves the next slot and
+gets back how long it must wait; the caller sleeps *outside* any shared state, so a throttled
+client never delays other keys.
+
+Backends:
+- ``MemoryRateLimiter``: per-process, state split across shards with idle-key TTL eviction.
+  Updates never await, so they are atomic on the event loop without a lock.
+- ``RedisRateLimiter``: same algorithm in a Lua script, so limits hold across uvicorn workers.
+"""
+import asyncio
+import os
+import time
+import zlib
+from typing import Optional
+
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_IDLE_TTL_S = float(os.getenv("RATE_LIMIT_IDLE_TTL_S", "300"))
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"rate limited, retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+class MemoryRateLimiter:
+    def __init__(
+        self,
+        interval: float,
+        burst: int = 1,
+        idle_ttl: float = RATE_LIMIT_IDLE_TTL_S,
+        shards: int = 64,
+    ) -> None:
+        self.interval = interval
+        self.tolerance = (burst - 1) * interval
+        self.idle_ttl = idle_ttl
+        self._shards: list[dict[str, float]] = [{} for _ in range(shards)]
+        self._sweep_at = 0
+
+    def _shard(self, key: str) -> dict[str, float]:
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def _evict_some(self, now: float) -> None:
+        # sweep one shard per call so eviction cost stays O(keys / shards)
+        shard = self._shards[self._sweep_at]
+        self._sweep_at = (self._sweep_at + 1) % len(self._shards)
+        horizon = now - self.idle_ttl
+        for k in [k for k, tat in shard.items() if tat < horizon]:
+            del shard[k]
+
+    async def reserve(self, key: str, max_wait: Optional[float] = None) -> float:
+        """Take the next slot for ``key``; returns seconds to wait before using it.
+
+        A slot further away than ``max_wait`` is not taken, so rejected requests don't push the key back.
+        """
+        now = time.monotonic()
+        shard = self._shard(key)
+        tat = max(shard.get(key, now), now)
+        wait = max(0.0, tat - self.tolerance - now)
+        if max_wait is None or wait <= max_wait:
+            shard[key] = tat + self.interval
+        self._evict_some(now)
+        return wait
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self._shards)
+
+
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local wait = tat - tolerance - now
+if wait < 0 then wait = 0 end
+if max_wait < 0 or wait <= max_wait then
+  redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', math.ceil((tat + interval - now + ttl) * 1000))
+end
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    def __init__(self, redis, interval: float, burst: int = 1, idle_ttl: float = RATE_LIMIT_IDLE_TTL_S, prefix: str = "rl") -> None:
+        self.interval = interval
+        self.tolerance = (burst - 1) * interval
+        self.idle_ttl = idle_ttl
+        self.prefix = prefix
+        self._script = redis.register_script(_GCRA_LUA)
+
+    async def reserve(self, key: str, max_wait: Optional[float] = None) -> float:
+        args = [self.interval, self.tolerance, self.idle_ttl, -1 if max_wait is None else max_wait]
+        return float(await self._script(keys=[f"{self.prefix}:{key}"], args=args))
+
+
+async def throttle(limiter, key: str, max_wait: Optional[float] = None) -> None:
+    """Wait for ``key``'s next slot; raise ``RateLimited`` instead if it is further than ``max_wait``."""
+    wait = await limiter.reserve(key, max_wait)
+    if max_wait is not None and wait > max_wait:
+        raise RateLimited(wait)
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def build_limiter(interval: float, burst: int = 1, prefix: str = "rl", backend: str = RATE_LIMIT_BACKEND):
+    if backend == "redis":
+        from .redis_client import get_redis
+
+        return RedisRateLimiter(get_redis(), interval, burst, prefix=prefix)
+    return MemoryRateLimiter(interval, burst)
@@ -0,0 +1,37 @@
+import os
+from typing import Optional
+
+from redis import Redis as SyncRedis
+from redis.asyncio import Redis
+
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/2")
+
+_client: Optional[Redis] = None
+_sync_client: Optional[SyncRedis] = None
+
+
+def get_redis() -> Redis:
+    """Process-wide asyncio Redis client (connection pool shared by all callers)."""
+    global _client
+    if _client is None:
+        _client = Redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
+
+
+async def close_redis() -> None:
+    global _client, _sync_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+
+
+def get_sync_redis() -> SyncRedis:
+    """Process-wide blocking client returning raw bytes, for worker threads and Celery tasks."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = SyncRedis.from_url(REDIS_URL)
+    return _sync_client
@@ -1,64 +1,87 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..deps import get_db, require_role
+from ..deps import get_async_db, require_role
+from ..fastjson import FAST_JSON, RowEncoder, rows_response
 from ..models.entities import User
-from ..schemas.admin import CreateUserIn, UpdateRoleIn, UserOut
-from .auth import hash_password
+from ..pagination import PageParams, paginate, paginate_rows
+from ..passwords import hash_password_async
+from ..schemas.admin import CreateUserIn, UpdateRoleIn, UserOut, UserRow
 
 
 router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_role("admin"))])
 
+USER_ROWS = RowEncoder(UserRow)
+
+
+def _escape_like(value: str) -> str:
+    """``value`` as a literal LIKE pattern: ``%`` and ``_`` in an email are not wildcards."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
 
 @router.get("/users", response_model=List[UserOut])
-def list_users(db: Session = Depends(get_db)) -> list[UserOut]:
-    return db.query(User).order_by(User.created_at.desc()).all()
+async def list_users(
+    request: Request,
+    response: Response,
+    role: str | None = None,
+    email: str | None = Query(None, description="case-insensitive prefix"),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+) -> list[UserOut]:
+    query = select(*USER_ROWS.columns(User)) if FAST_JSON else select(User)
+    if role is not None:
+        query = query.where(User.role == role)
+    if email:
+        query = query.where(User.email.ilike(f"{_escape_like(email)}%", escape="\\"))
+    keys = (User.created_at, User.id)
+    if FAST_JSON:
+        return rows_response(request, response, USER_ROWS, await paginate_rows(db, query, page, response, keys=keys))
+    return await paginate(db, query, page, response, keys=keys)
 
 
 @router.post("/users", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def create_user(payload: CreateUserIn, db: Session = Depends(get_db)) -> UserOut:
-    if db.query(User).filter(User.email == payload.email).first():
+async def create_user(payload: CreateUserIn, db: AsyncSession = Depends(get_async_db)) -> UserOut:
+    if await db.scalar(select(User.id).where(User.email == payload.email)):
         raise HTTPException(status_code=400, detail="email exists")
-    u = User(email=payload.email, password_hash=hash_password(payload.password), role=payload.role)
+    u = User(email=payload.email, password_hash=await hash_password_async(payload.password), role=payload.role)
     db.add(u)
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
     return u
 
 
 @router.patch("/users/{user_id}/role", response_model=UserOut)
-def update_role(user_id: int, payload: UpdateRoleIn, db: Session = Depends(get_db)) -> UserOut:
-    u = db.get(User, user_id)
+async def update_role(user_id: int, payload: UpdateRoleIn, db: AsyncSession = Depends(get_async_db)) -> UserOut:
+    u = await db.get(User, user_id)
     if not u:
         raise HTTPException(status_code=404, detail="user not found")
     u.role = payload.role
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
     return u
 
 
 @router.patch("/users/{user_id}/password")
-def reset_password(user_id: int, payload: dict, db: Session = Depends(get_db)) -> dict:
+async def reset_password(user_id: int, payload: dict, db: AsyncSession = Depends(get_async_db)) -> dict:
     new_password = payload.get("password")
     if not new_password or len(str(new_password)) < 6:
         raise HTTPException(status_code=400, detail="password must be at least 6 characters")
-    u = db.get(User, user_id)
+    u = await db.get(User, user_id)
     if not u:
         raise HTTPException(status_code=404, detail="user not found")
-    u.password_hash = hash_password(str(new_password))
-    db.commit()
+    u.password_hash = await hash_password_async(str(new_password))
+    await db.commit()
     return {"ok": True}
 
 
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: int, db: Session = Depends(get_db)) -> None:
-    u = db.get(User, user_id)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db)) -> None:
+    u = await db.get(User, user_id)
     if not u:
         raise HTTPException(status_code=404, detail="user not found")
-    db.delete(u)
-    db.commit()
+    await db.delete(u)
+    await db.commit()
     return None
-
-
@@ -1,56 +1,40 @@
-import os
-from datetime import datetime, timedelta
-
 from fastapi import APIRouter, Depends, HTTPException, status
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..deps import get_db
+from ..deps import get_async_db
 from ..models.entities import User
+from ..passwords import hash_password_async, verify_password_async
 from ..schemas.auth import LoginIn, RegisterIn, TokenOut
+from ..tokens import create_token
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = os.getenv("JWT_SECRET", "devsecret_change_me")
-ALGO = "HS256"
-ACCESS_TOKEN_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "60"))
-
-
-def hash_password(p: str) -> str:
-    return pwd_context.hash(p)
-
-
-def verify_password(p: str, h: str) -> bool:
-    return pwd_context.verify(p, h)
-
-
-def create_token(*, sub: str, role: str) -> str:
-    exp = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_MINUTES)
-    to_encode = {"sub": sub, "role": role, "exp": exp}
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGO)
-
 
 @router.post("/register", response_model=TokenOut, status_code=status.HTTP_201_CREATED)
-def register(payload: RegisterIn, db: Session = Depends(get_db)) -> TokenOut:
-    if db.query(User).filter(User.email == payload.email).first():
+async def register(payload: RegisterIn, db: AsyncSession = Depends(get_async_db)) -> TokenOut:
+    if await db.scalar(select(User.id).where(User.email == payload.email)):
         raise HTTPException(status_code=400, detail="email exists")
-    u = User(email=payload.email, password_hash=hash_password(payload.password), role=payload.role)
+    u = User(email=payload.email, password_hash=await hash_password_async(payload.password), role=payload.role)
     db.add(u)
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
     token = create_token(sub=str(u.id), role=u.role)
     return TokenOut(access_token=token)
 
 
 @router.post("/login", response_model=TokenOut)
-def login(payload: LoginIn, db: Session = Depends(get_db)) -> TokenOut:
-    u = db.query(User).filter(User.email == payload.email).first()
-    if not u or not verify_password(payload.password, u.password_hash):
+async def login(payload: LoginIn, db: AsyncSession = Depends(get_async_db)) -> TokenOut:
+    u = await db.scalar(select(User).where(User.email == payload.email))
+    if not u:
+        raise HTTPException(status_code=401, detail="invalid credentials")
+    ok, new_hash = await verify_password_async(payload.password, u.password_hash)
+    if not ok:
         raise HTTPException(status_code=401, detail="invalid credentials")
+    if new_hash:
+        # transparently re-hash with the current BCRYPT_ROUNDS
+        u.password_hash = new_hash
+        await db.commit()
     token = create_token(sub=str(u.id), role=u.role)
     return TokenOut(access_token=token)
-
-
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..deps import get_db, get_current_tutor_user
+from ..deps import get_async_db, get_current_tutor_user
 from ..models.entities import Classroom, ClassroomEnrollment, ClassroomAssignment, User, Form
+from ..pagination import PageParams, paginate
+from ..pubsub import broker, classroom_channel
 from ..schemas.classroom import (
     ClassroomCreate,
     ClassroomOut,
@@ -17,50 +20,50 @@ router = APIRouter(prefix="/classrooms", tags=["classrooms"], dependencies=[Depe
 
 
 @router.post("/", response_model=ClassroomOut)
-def create_classroom(payload: ClassroomCreate, db: Session = Depends(get_db)):
+async def create_classroom(payload: ClassroomCreate, db: AsyncSession = Depends(get_async_db)):
     c = Classroom(name=payload.name)
     db.add(c)
-    db.commit()
-    db.refresh(c)
+    await db.commit()
+    await db.refresh(c)
     return c
 
 
 @router.get("/", response_model=list[ClassroomOut])
-def list_classrooms(db: Session = Depends(get_db)):
-    return db.query(Classroom).order_by(Classroom.id.desc()).all()
+async def list_classrooms(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_async_db)):
+    return await paginate(db, select(Classroom), page, response, keys=(Classroom.id,))
 
 
 @router.post("/{classroom_id}/enroll", response_model=EnrollmentOut)
-def enroll_student(classroom_id: int, payload: EnrollmentCreate, db: Session = Depends(get_db)):
-    if not db.query(Classroom).filter(Classroom.id == classroom_id).first():
+async def enroll_student(classroom_id: int, payload: EnrollmentCreate, db: AsyncSession = Depends(get_async_db)):
+    if not await db.scalar(select(Classroom.id).where(Classroom.id == classroom_id)):
         raise HTTPException(status_code=404, detail="classroom not found")
-    if not db.query(User).filter(User.id == payload.user_id).first():
+    if not await db.scalar(select(User.id).where(User.id == payload.user_id)):
         raise HTTPException(status_code=404, detail="user not found")
     e = ClassroomEnrollment(classroom_id=classroom_id, user_id=payload.user_id, role="student")
     db.add(e)
     try:
-        db.commit()
+        await db.commit()
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="already enrolled or conflict")
-    db.refresh(e)
+    await db.refresh(e)
+    await broker.publish(classroom_channel(classroom_id), "classroom.enrolled", {"user_id": e.user_id})
     return e
 
 
 @router.post("/{classroom_id}/assign", response_model=AssignmentOut)
-def assign_form(classroom_id: int, payload: AssignmentCreate, db: Session = Depends(get_db)):
-    if not db.query(Classroom).filter(Classroom.id == classroom_id).first():
+async def assign_form(classroom_id: int, payload: AssignmentCreate, db: AsyncSession = Depends(get_async_db)):
+    if not await db.scalar(select(Classroom.id).where(Classroom.id == classroom_id)):
         raise HTTPException(status_code=404, detail="classroom not found")
-    if not db.query(Form).filter(Form.id == payload.form_id).first():
+    if not await db.scalar(select(Form.id).where(Form.id == payload.form_id)):
         raise HTTPException(status_code=404, detail="form not found")
     a = ClassroomAssignment(classroom_id=classroom_id, form_id=payload.form_id)
     db.add(a)
     try:
-        db.commit()
+        await db.commit()
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="already assigned or conflict")
-    db.refresh(a)
+    await db.refresh(a)
+    await broker.publish(classroom_channel(classroom_id), "classroom.assigned", {"form_id": a.form_id})
     return a
-
-
@@ -1,18 +1,25 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..deps import get_db, require_role
+from ..deps import get_async_db, require_role
+from ..fastjson import FAST_JSON, RowEncoder, rows_response
 from ..models.entities import Form
-from ..schemas.forms import FormCreate, FormOut, FormUpdate
+from ..pagination import PageParams, paginate, paginate_rows
+from ..pubsub import broker, form_channel
+from ..schemas.forms import ExamOut, FormCreate, FormOut, FormRow, FormUpdate
+from ..services import exam_cache, hint
 
 
 router = APIRouter(prefix="/forms", tags=["forms"])
 
+FORM_ROWS = RowEncoder(FormRow)
+
 
 @router.post("", response_model=FormOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_role("admin", "tutor"))])
-def create_form(payload: FormCreate, db: Session = Depends(get_db)) -> FormOut:
+async def create_form(payload: FormCreate, db: AsyncSession = Depends(get_async_db)) -> FormOut:
     form = Form(
         title=payload.title,
         description=payload.description,
@@ -20,43 +27,73 @@ def create_form(payload: FormCreate, db: Session = Depends(get_db)) -> FormOut:
         settings_json=payload.settings_json,
     )
     db.add(form)
-    db.commit()
-    db.refresh(form)
+    await db.commit()
+    await db.refresh(form)
+    await hint.queue_ladders(form_id=form.id)
     return form
 
 
 @router.get("/{form_id}", response_model=FormOut)
-def get_form(form_id: int, db: Session = Depends(get_db)) -> FormOut:
-    form = db.get(Form, form_id)
+async def get_form(form_id: int, db: AsyncSession = Depends(get_async_db)) -> FormOut:
+    form = await db.get(Form, form_id)
     if not form:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
     return form
 
 
+@router.get("/{form_id}/exam", response_model=ExamOut, responses={304: {"description": "Not modified"}})
+async def get_exam(
+    form_id: int,
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+) -> Response:
+    entry = await exam_cache.get_exam(db, form_id)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and entry.etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
 @router.get("", response_model=List[FormOut])
-def list_forms(db: Session = Depends(get_db)) -> list[FormOut]:
-    return db.query(Form).order_by(Form.created_at.desc()).all()
+async def list_forms(
+    request: Request,
+    response: Response,
+    course_id: int | None = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+) -> list[FormOut]:
+    query = select(*FORM_ROWS.columns(Form)) if FAST_JSON else select(Form)
+    if course_id is not None:
+        query = query.where(Form.course_id == course_id)
+    keys = (Form.created_at, Form.id)
+    if FAST_JSON:
+        return rows_response(request, response, FORM_ROWS, await paginate_rows(db, query, page, response, keys=keys))
+    return await paginate(db, query, page, response, keys=keys)
 
 
 @router.patch("/{form_id}", response_model=FormOut, dependencies=[Depends(require_role("admin", "tutor"))])
-def update_form(form_id: int, payload: FormUpdate, db: Session = Depends(get_db)) -> FormOut:
-    form = db.get(Form, form_id)
+async def update_form(form_id: int, payload: FormUpdate, db: AsyncSession = Depends(get_async_db)) -> FormOut:
+    form = await db.get(Form, form_id)
     if not form:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
     for field, value in payload.model_dump(exclude_unset=True).items():
         setattr(form, field, value)
-    db.commit()
-    db.refresh(form)
+    await db.commit()
+    await db.refresh(form)
+    await exam_cache.invalidate(form.id)
+    await broker.publish(form_channel(form.id), "form.updated", {"form_id": form.id})
     return form
 
 
 @router.delete("/{form_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_role("admin", "tutor"))])
-def delete_form(form_id: int, db: Session = Depends(get_db)) -> None:
-    form = db.get(Form, form_id)
+async def delete_form(form_id: int, db: AsyncSession = Depends(get_async_db)) -> None:
+    form = await db.get(Form, form_id)
     if not form:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
-    db.delete(form)
-    db.commit()
+    await db.delete(form)
+    await db.commit()
+    await exam_cache.invalidate(form_id)
+    await broker.publish(form_channel(form_id), "form.deleted", {"form_id": form_id})
     return None
-
-
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import AsyncGenerator, Optional
+
+from celery.result import AsyncResult
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sse_starlette.sse import EventSourceResponse
+
+from ..deps import get_async_db, get_current_user, get_stream_user, require_role
+from ..models.db import async_session_scope
+from ..models.entities import Answer, Form, GradingRun, Submission
+from ..pubsub import broker, grading_channel
+from ..services.grading import GRADING_CHUNK_SIZE, snapshot, snapshot_stmt
+from apps.workers.tasks import run_grading
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/grading", tags=["grading"])
+
+# SSE re-reads the run from the DB when no event arrived for this long (covers brokers that cannot
+# reach the API process, e.g. PUBSUB_BACKEND=memory with a separate worker)
+GRADING_SSE_POLL_S = float(os.getenv("GRADING_SSE_POLL_S", "2"))
+TERMINAL = ("done", "failed")
+
+tutor_only = [Depends(require_role("admin", "tutor"))]
+
+
+async def _form_or_404(db: AsyncSession, form_id: int) -> Form:
+    form = await db.get(Form, form_id)
+    if form is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
+    return form
+
+
+async def _run_snapshot(db: AsyncSession, run_id: int) -> dict:
+    run = await db.get(GradingRun, run_id)
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Grading run not found")
+    await db.refresh(run)
+    return snapshot(run, (await db.execute(snapshot_stmt(run_id))).one())
+
+
+async def _dispatch(db: AsyncSession, run_id: int) -> str:
+    """Queue ``grading.run``. Without a broker the run is marked failed (so it can be resumed) and 503 raised."""
+    try:
+        # a broker round-trip: off the event loop, so a slow broker does not stall other connections
+        return (await asyncio.to_thread(run_grading.delay, str(run_id))).id
+    except Exception:  # noqa: BLE001 - broker unreachable; never leave the run pending forever
+        logger.exception("could not queue grading run %s", run_id)
+        await db.execute(
+            update(GradingRun).where(GradingRun.id == run_id).values(status="failed", finished_at=datetime.utcnow())
+        )
+        await db.commit()
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Grading queue unavailable, try again shortly")
+
+
+@router.post("/forms/{form_id}", dependencies=tutor_only)
+async def grade_form(
+    form_id: int, chunk_size: Optional[int] = None, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)
+) -> dict:
+    """Start a grading run: the form's submitted work is graded in parallel chunks by the workers."""
+    await _form_or_404(db, form_id)
+    run = GradingRun(form_id=form_id, created_by=int(user["sub"]), chunk_size=max(1, chunk_size or GRADING_CHUNK_SIZE))
+    db.add(run)
+    await db.commit()
+    task_id = await _dispatch(db, run.id)
+    return {"status": "queued", "run_id": run.id, "task_id": task_id}
+
+
+@router.get("/forms/{form_id}", dependencies=tutor_only)
+async def grading_status(form_id: int, task_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Graded/total answer counts of submitted work and the latest run; with ``task_id`` also that task's state."""
+    await _form_or_404(db, form_id)
+    total, graded = (
+        await db.execute(
+            select(func.count(Answer.id), func.count(Answer.score))
+            .join(Submission, Submission.id == Answer.submission_id)
+            .where(Submission.form_id == form_id, Submission.submitted_at.is_not(None))
+        )
+    ).one()
+    out = {"form_id": form_id, "answers": total, "graded": graded, "latest_run": None}
+    latest = await db.scalar(select(GradingRun.id).where(GradingRun.form_id == form_id).order_by(GradingRun.id.desc()).limit(1))
+    if latest is not None:
+        out["latest_run"] = await _run_snapshot(db, latest)
+    if task_id:
+        result = AsyncResult(task_id, app=run_grading.app)
+        state, info = await asyncio.to_thread(lambda: (result.state, result.info))
+        out["task"] = {"id": task_id, "state": state, "info": info if isinstance(info, dict) else (str(info) if info else None)}
+    return out
+
+
+@router.get("/runs/{run_id}", dependencies=tutor_only)
+async def run_status(run_id: int, db: AsyncSession = Depends(get_async_db)) -> dict:
+    return await _run_snapshot(db, run_id)
+
+
+@router.post("/runs/{run_id}/resume", dependencies=tutor_only)
+async def resume_run(run_id: int, db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Re-dispatch the chunks of a failed run that are not done yet.
+
+    Only failed runs: chunks of a pending or running run may still be in a worker's hands. The
+    ``failed`` -> ``pending`` claim is atomic, so concurrent resumes dispatch the run once.
+    """
+    await _run_snapshot(db, run_id)  # 404 for unknown runs
+    claimed = await db.execute(
+        update(GradingRun).where(GradingRun.id == run_id, GradingRun.status == "failed").values(status="pending")
+    )
+    await db.commit()
+    if claimed.rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Only failed grading runs can be resumed")
+    task_id = await _dispatch(db, run_id)
+    return {"status": "queued", "run_id": run_id, "task_id": task_id}
+
+
+@router.get("/runs/{run_id}/events")
+async def run_events(request: Request, run_id: int, user: dict = Depends(get_stream_user)) -> EventSourceResponse:
+    """SSE progress of a run (pass ``?token=<jwt>`` from EventSource): the current snapshot, then
+    ``grading.progress`` per finished chunk, ending with ``grading.finished`` / ``grading.failed``."""
+    if user.get("role") not in ("tutor", "admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="forbidden")
+    # short-lived sessions: a dependency-scoped one would pin a pooled connection for the whole stream
+    async with async_session_scope() as db:
+        first = await _run_snapshot(db, run_id)
+
+    def frame(event: str, data: dict) -> dict:
+        return {"event": event, "data": json.dumps(data, default=str)}
+
+    async def event_generator() -> AsyncGenerator[dict, None]:
+        async with broker.subscribe([grading_channel(run_id)]) as sub:
+            last = frame("grading.progress", first)
+            status_ = first["status"]
+            yield last
+            while status_ not in TERMINAL and not await request.is_disconnected():
+                msg = await sub.get(timeout=GRADING_SSE_POLL_S)
+                if msg is not None:
+                    last, status_ = frame(msg["event"], msg["data"]), msg["data"]["status"]
+                    yield last
+                    continue
+                async with async_session_scope() as db:
+                    current = await _run_snapshot(db, run_id)
+                # compare serialized: pub/sub payloads carry timestamps as strings, snapshots as datetimes
+                event = {"done": "grading.finished", "failed": "grading.failed"}.get(current["status"], "grading.progress")
+                polled = frame(event, current)
+                if polled["data"] != last["data"]:
+                    last, status_ = polled, current["status"]
+                    yield last
+
+    return EventSourceResponse(event_generator(), ping=15000)
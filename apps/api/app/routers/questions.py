@@ -1,19 +1,26 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..deps import get_db, require_role
+from ..deps import get_async_db, require_role
+from ..fastjson import FAST_JSON, RowEncoder, rows_response
 from ..models.entities import Question, Form
-from ..schemas.questions import QuestionCreate, QuestionOut, QuestionUpdate
+from ..pagination import PageParams, paginate, paginate_rows
+from ..pubsub import broker, form_channel
+from ..schemas.questions import QuestionCreate, QuestionOut, QuestionRow, QuestionUpdate
+from ..services import exam_cache, hint
 
 
 router = APIRouter(prefix="/questions", tags=["questions"])
 
+QUESTION_ROWS = RowEncoder(QuestionRow)
+
 
 @router.post("", response_model=QuestionOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_role("admin", "tutor"))])
-def create_question(payload: QuestionCreate, db: Session = Depends(get_db)) -> QuestionOut:
-    if not db.get(Form, payload.form_id):
+async def create_question(payload: QuestionCreate, db: AsyncSession = Depends(get_async_db)) -> QuestionOut:
+    if not await db.get(Form, payload.form_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
     q = Question(
         form_id=payload.form_id,
@@ -23,46 +30,69 @@ def create_question(payload: QuestionCreate, db: Session = Depends(get_db)) -> Q
         metadata_json=payload.metadata_json,
     )
     db.add(q)
-    db.commit()
-    db.refresh(q)
+    await db.commit()
+    await db.refresh(q)
+    await exam_cache.invalidate(q.form_id)
+    await hint.queue_ladders(question_ids=[q.id])
+    await broker.publish(form_channel(q.form_id), "question.created", {"question_id": q.id})
     return q
 
 
 @router.get("/{question_id}", response_model=QuestionOut)
-def get_question(question_id: int, db: Session = Depends(get_db)) -> QuestionOut:
-    q = db.get(Question, question_id)
+async def get_question(question_id: int, db: AsyncSession = Depends(get_async_db)) -> QuestionOut:
+    q = await db.get(Question, question_id)
     if not q:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question not found")
     return q
 
 
 @router.get("", response_model=List[QuestionOut])
-def list_questions(form_id: int | None = None, db: Session = Depends(get_db)) -> list[QuestionOut]:
-    query = db.query(Question)
+async def list_questions(
+    request: Request,
+    response: Response,
+    form_id: int | None = None,
+    type: str | None = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+) -> list[QuestionOut]:
+    query = select(*QUESTION_ROWS.columns(Question)) if FAST_JSON else select(Question)
     if form_id is not None:
-        query = query.filter(Question.form_id == form_id)
-    return query.order_by(Question.created_at.asc()).all()
+        query = query.where(Question.form_id == form_id)
+    if type is not None:
+        query = query.where(Question.type == type)
+    keys = (Question.created_at, Question.id)
+    if FAST_JSON:
+        rows = await paginate_rows(db, query, page, response, keys=keys, descending=False)
+        return rows_response(request, response, QUESTION_ROWS, rows)
+    return await paginate(db, query, page, response, keys=keys, descending=False)
 
 
 @router.patch("/{question_id}", response_model=QuestionOut, dependencies=[Depends(require_role("admin", "tutor"))])
-def update_question(question_id: int, payload: QuestionUpdate, db: Session = Depends(get_db)) -> QuestionOut:
-    q = db.get(Question, question_id)
+async def update_question(question_id: int, payload: QuestionUpdate, db: AsyncSession = Depends(get_async_db)) -> QuestionOut:
+    q = await db.get(Question, question_id)
     if not q:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question not found")
+    hint_version = hint.question_context(q).version
     for field, value in payload.model_dump(exclude_unset=True).items():
         setattr(q, field, value)
-    db.commit()
-    db.refresh(q)
+    await db.commit()
+    await db.refresh(q)
+    await exam_cache.invalidate(q.form_id)
+    if hint.question_context(q).version != hint_version:
+        await hint.invalidate([q.id])
+        await hint.queue_ladders(question_ids=[q.id])
+    await broker.publish(form_channel(q.form_id), "question.updated", {"question_id": q.id})
     return q
 
 
 @router.delete("/{question_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_role("admin", "tutor"))])
-def delete_question(question_id: int, db: Session = Depends(get_db)) -> None:
-    q = db.get(Question, question_id)
+async def delete_question(question_id: int, db: AsyncSession = Depends(get_async_db)) -> None:
+    q = await db.get(Question, question_id)
     if not q:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question not found")
-    db.delete(q)
-    db.commit()
+    form_id = q.form_id
+    await db.delete(q)
+    await db.commit()
+    await exam_cache.invalidate(form_id)
+    await broker.publish(form_channel(form_id), "question.deleted", {"question_id": question_id})
     return None
-
-
@@ -1,84 +1,192 @@
-import asyncio
-import time
-from typing import AsyncGenerator, Dict
+import json
+import os
+from typing import AsyncGenerator, Optional
+from uuid import uuid4
 
-from fastapi import APIRouter, Depends, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import select
 from sse_starlette.sse import EventSourceResponse
 
-
-router = APIRouter(prefix="/realtime", tags=["realtime"])
+from ..deps import get_current_tutor_user, get_stream_user
+from ..models.db import async_session_scope
+from ..models.entities import Submission
+from ..pubsub import broker, classroom_channel, form_channel, submission_channel
+from ..tokens import decode_token
+from ..ratelimit import RateLimited, build_limiter, throttle
+from ..services.hint import HINT_STAGES, hint_service, load_question
+from ..services.llm import llm_enabled
+from ..ws_hub import Connection, hub
 
 
-# Simple in-memory throttle state (per-process)
-_last_event_ts: Dict[str, float] = {}
-_lock = asyncio.Lock()
-THROTTLE_WINDOW_SECONDS = 0.6  # 600ms
+router = APIRouter(prefix="/realtime", tags=["realtime"])
 
 
-async def _throttle(key: str) -> None:
-    async with _lock:
-        now = time.monotonic()
-        last = _last_event_ts.get(key, 0.0)
-        delta = now - last
-        if delta < THROTTLE_WINDOW_SECONDS:
-            await asyncio.sleep(THROTTLE_WINDOW_SECONDS - delta)
-        _last_event_ts[key] = time.monotonic()
+# Per-key token bucket: one hint burst per client every HINT_RATE_INTERVAL_MS
+HINT_RATE_INTERVAL_MS = int(os.getenv("HINT_RATE_INTERVAL_MS", "600"))
+HINT_RATE_BURST = int(os.getenv("HINT_RATE_BURST", "1"))
+# a request that would queue longer than this gets a rate-limit error frame instead
+HINT_RATE_MAX_WAIT_MS = int(os.getenv("HINT_RATE_MAX_WAIT_MS", "2000"))
+hint_limiter = build_limiter(HINT_RATE_INTERVAL_MS / 1000.0, HINT_RATE_BURST, prefix="rl:hint")
+
+
+async def _question_allowed(user: dict, question_id: Optional[int]) -> bool:
+    """Tutors may ask about any question; students only about forms they have a submission for."""
+    if question_id is None:
+        return True
+    question = await load_question(question_id)
+    if question is None:
+        return False
+    if user.get("role") in ("tutor", "admin"):
+        return True
+    async with async_session_scope() as db:
+        submission_id = await db.scalar(
+            select(Submission.id)
+            .where(Submission.form_id == question.form_id, Submission.user_id == int(user.get("sub")))
+            .limit(1)
+        )
+    return submission_id is not None
 
 
 @router.get("/hint")
-async def hint_sse(request: Request, text: str = Query("")) -> EventSourceResponse:
-    client_key = request.client.host if request.client else "anon"
+async def hint_sse(
+    text: str = Query(""),
+    question_id: Optional[int] = None,
+    stage: int = Query(1, ge=1, le=HINT_STAGES),
+    user: dict = Depends(get_stream_user),
+) -> EventSourceResponse:
+    """One hint, streamed as ``token`` events, then the whole text as ``hint`` (or an ``error`` event)."""
+    if not await _question_allowed(user, question_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question not found")
+    client_key = f"user:{user.get('sub')}"
 
     async def event_generator() -> AsyncGenerator[dict, None]:
-        await _throttle(f"sse:{client_key}")
-
-        # Demo: 3-stage nudge without revealing answer
-        stages = [
-            "Düşün: Soru ne istiyor? Ana kavramı belirle.",
-            "İpucu: Verilenleri yaz ve aradığını sembolleştir.",
-            "Yönlendirme: Bir önceki adımı kontrol et ve küçük bir örnek dene.",
-        ]
-
-        for idx, msg in enumerate(stages, start=1):
-            if await request.is_disconnected():
-                break
-            yield {"event": "hint", "data": msg}
-            await asyncio.sleep(0.4)
-
-        # Echo last truncated user text as context acknowledgement
-        preview = (text or "").strip()
-        if preview:
-            preview = (preview[:60] + "…") if len(preview) > 60 else preview
-            yield {"event": "context", "data": f"Gelen metin: {preview}"}
+        try:
+            await throttle(hint_limiter, client_key, HINT_RATE_MAX_WAIT_MS / 1000.0)
+        except RateLimited as e:
+            yield _rate_limited_frame(e)
+            return
+        # a disconnect cancels this generator; the shared generation stops once nobody else follows it
+        async for frame in _hint_frames(question_id, stage, text):
+            yield frame
 
     return EventSourceResponse(event_generator(), ping=15000)
 
 
+async def _hint_frames(question_id: Optional[int], stage: int, text: str) -> AsyncGenerator[dict, None]:
+    parts = []
+    try:
+        async for token in hint_service.stream(question_id, stage, text):
+            parts.append(token)
+            yield {"event": "token", "data": token}
+    except Exception:  # noqa: BLE001 - logged by the hint service; the client just gets no hint
+        yield {"event": "error", "data": "hint unavailable, try again shortly"}
+        return
+    yield {"event": "hint", "data": "".join(parts).strip()}
+
+
+def _rate_limited_frame(e: RateLimited) -> dict:
+    return {"event": "error", "data": f"429: too many hint requests, retry in {e.retry_after:.1f}s"}
+
+
+def _ws_user(token: Optional[str]) -> Optional[dict]:
+    """Claims of ``?token=``; an empty dict for an anonymous socket, None for an invalid token."""
+    if not token:
+        return {}
+    try:
+        claims = decode_token(token)
+    except HTTPException:
+        return None
+    return claims if claims.get("sub") else None
+
+
+async def _stream_ws_hint(conn: Connection, user: dict, text: str, question_id: Optional[int], stage: int) -> None:
+    try:
+        await throttle(hint_limiter, conn.identity, HINT_RATE_MAX_WAIT_MS / 1000.0)
+    except RateLimited as e:
+        conn.send(_rate_limited_frame(e))
+        return
+    if user:
+        allowed = await _question_allowed(user, question_id)
+    else:
+        allowed = question_id is None or await load_question(question_id) is not None
+    if not allowed:
+        conn.send({"event": "error", "data": "question not found"})
+        return
+    async for frame in _hint_frames(question_id, stage, text):
+        conn.send(frame)
+
+
 @router.websocket("/ws/hint")
-async def hint_ws(ws: WebSocket) -> None:
-    await ws.accept()
-    client_key = "ws:client"
+async def hint_ws(ws: WebSocket, token: Optional[str] = Query(None)) -> None:
+    """Messages ``{"text", "question_id"?, "stage"?}``; replies as ``token`` frames, then ``hint``.
+
+    Model-backed hints cost money, so they need ``?token=``; only the static ladder is served anonymously.
+    """
+    user = _ws_user(token)
+    if user is None or (not user and llm_enabled()):
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    # anonymous sockets only get the free static ladder, so a per-connection throttle key is enough
+    conn = await hub.connect(ws, f"user:{user['sub']}" if user else f"anon:{uuid4().hex}")
     try:
         while True:
             payload = await ws.receive_json()
             text = (payload.get("text") or "").strip()
-
-            await _throttle(client_key)
-
-            # Stream 3 lightweight messages
-            stages = [
-                "Önce kavramı düşün.",
-                "Verilenleri düzenle.",
-                "Bir ara adım dene.",
-            ]
-            for msg in stages:
-                await ws.send_json({"event": "hint", "data": msg})
-                await asyncio.sleep(0.3)
-
-            if text:
-                preview = (text[:60] + "…") if len(text) > 60 else text
-                await ws.send_json({"event": "context", "data": f"Gelen metin: {preview}"})
+            try:
+                question_id = int(payload["question_id"]) if payload.get("question_id") is not None else None
+                stage = min(max(int(payload.get("stage") or 1), 1), HINT_STAGES)
+            except (TypeError, ValueError):
+                conn.send({"event": "error", "data": "invalid question_id or stage"})
+                continue
+            # a newer request supersedes hints still queued or streaming for the previous one
+            conn.discard_pending()
+            conn.run(_stream_ws_hint(conn, user, text, question_id, stage))
     except WebSocketDisconnect:
         return
+    finally:
+        await hub.disconnect(conn)
+
+
+@router.get("/stats", dependencies=[Depends(get_current_tutor_user)])
+def realtime_stats() -> dict:
+    return {"ws": hub.stats(), "hints": hint_service.stats()}
+
+
+@router.get("/events")
+async def events_sse(
+    request: Request,
+    form_id: Optional[int] = None,
+    submission_id: Optional[int] = None,
+    classroom_id: Optional[int] = None,
+    user: dict = Depends(get_stream_user),
+) -> EventSourceResponse:
+    """Stream pub/sub events for a form, submission and/or classroom (tutors: any; students: own submission)."""
+    is_tutor = user.get("role") in ("tutor", "admin")
+    if not is_tutor and (form_id is not None or classroom_id is not None):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="forbidden")
+    if submission_id is not None and not is_tutor:
+        # short-lived session: a dependency-scoped one would pin a pooled connection for the whole stream
+        async with async_session_scope() as db:
+            owner = await db.scalar(select(Submission.user_id).where(Submission.id == submission_id))
+        if owner is None or owner != int(user.get("sub")):
+            raise HTTPException(status_code=404, detail="submission not found")
+    channels = [
+        ch
+        for ch, ok in (
+            (form_channel(form_id), form_id is not None),
+            (submission_channel(submission_id), submission_id is not None),
+            (classroom_channel(classroom_id), classroom_id is not None),
+        )
+        if ok
+    ]
+    if not channels:
+        raise HTTPException(status_code=400, detail="form_id, submission_id or classroom_id required")
 
+    async def event_generator() -> AsyncGenerator[dict, None]:
+        async with broker.subscribe(channels) as sub:
+            while not await request.is_disconnected():
+                msg = await sub.get(timeout=1.0)
+                if msg is not None:
+                    yield {"event": msg["event"], "data": json.dumps({"channel": msg["channel"], "data": msg["data"]}, default=str)}
 
+    return EventSourceResponse(event_generator(), ping=15000)
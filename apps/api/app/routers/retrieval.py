@@ -0,0 +1,43 @@
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..deps import get_async_db, get_current_user, require_role
+from ..schemas.retrieval import SearchHit, SearchOut
+from ..services.retrieval import retrieval_service, segment_texts
+
+
+router = APIRouter(prefix="/retrieval", tags=["retrieval"])
+
+
+@router.get("/search", response_model=SearchOut, dependencies=[Depends(get_current_user)])
+async def search(
+    q: str = Query(min_length=1, max_length=1000),
+    k: int = Query(default=10, ge=1, le=100),
+    video_id: Optional[int] = None,
+    alpha: Optional[float] = Query(default=None, ge=0, le=1),  # 1 = vector only, 0 = BM25 only
+    db: AsyncSession = Depends(get_async_db),
+) -> SearchOut:
+    started = time.perf_counter()
+    mode, hits = await retrieval_service.search(db, q, k=k, alpha=alpha, video_id=video_id)
+    texts = await segment_texts(db, [h.segment_id for h in hits])
+    return SearchOut(
+        query=q,
+        mode=mode,
+        took_ms=round((time.perf_counter() - started) * 1000, 2),
+        hits=[
+            SearchHit(
+                segment_id=h.segment_id, video_id=h.video_id, start_ms=h.start_ms, end_ms=h.end_ms,
+                score=round(h.score, 6), text=texts[h.segment_id],
+            )
+            for h in hits
+            if h.segment_id in texts
+        ],
+    )
+
+
+@router.get("/stats", dependencies=[Depends(require_role("admin", "tutor"))])
+def stats() -> dict:
+    return retrieval_service.stats()
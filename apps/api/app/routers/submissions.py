@@ -1,75 +1,259 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import json
+from typing import AsyncGenerator, Optional
 
-from ..deps import get_db, get_current_user, get_current_tutor_user
-from ..models.entities import Submission, Answer, Form, Question
-from ..schemas.submissions import StartSubmissionIn, SubmissionOut, UpsertAnswerIn, SubmitIn, SubmissionDetailOut, AnswerOut
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sse_starlette.sse import EventSourceResponse
+
+from ..deps import get_async_db, get_current_user, get_current_tutor_user, get_stream_user
+from ..fastjson import FAST_JSON, RowEncoder, rows_response
+from ..models.db import async_session_scope
+from ..models.entities import Submission, Answer, ClassroomAssignment, ClassroomEnrollment, Form, Question
+from ..pagination import PageParams, paginate, paginate_rows
+from ..pubsub import broker, form_channel
+from ..schemas.submissions import (
+    ActiveSubmissionRow,
+    AnswerOut,
+    BatchAnswerResult,
+    BatchAnswersIn,
+    BatchAnswersOut,
+    StartSubmissionIn,
+    SubmissionDetailOut,
+    SubmissionOut,
+    SubmissionRow,
+    SubmitIn,
+    UpsertAnswerIn,
+)
+from ..services.autosave import (
+    answer_buffer,
+    bulk_upsert_answers,
+    flush_submission,
+    next_seq,
+    seq_to_datetime,
+    validated_keys,
+)
+from ..services.monitor import LiveExamMonitor
 
 
 router = APIRouter(prefix="/submissions", tags=["submissions"])
 
+SUBMISSION_ROWS = RowEncoder(SubmissionRow)
+ACTIVE_ROWS = RowEncoder(ActiveSubmissionRow)
+
+
+async def _own_submission(db: AsyncSession, submission_id: int, user: dict) -> Submission:
+    sub = await db.scalar(
+        select(Submission).where(Submission.id == submission_id, Submission.user_id == int(user.get("sub")))
+    )
+    if not sub:
+        raise HTTPException(status_code=404, detail="submission not found")
+    return sub
+
+
+def _check_open(sub: Submission) -> None:
+    # a buffered autosave is written later and must not replace what was submitted
+    if answer_buffer is not None and sub.submitted_at is not None:
+        raise HTTPException(status_code=409, detail="submission already submitted")
+
 
 @router.post("/start", response_model=SubmissionOut)
-def start_submission(payload: StartSubmissionIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
+async def start_submission(payload: StartSubmissionIn, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
     # ensure form exists
-    if not db.query(Form).filter(Form.id == payload.form_id).first():
+    if not await db.scalar(select(Form.id).where(Form.id == payload.form_id)):
         raise HTTPException(status_code=404, detail="form not found")
     sub = Submission(form_id=payload.form_id, user_id=int(user.get("sub")))
     db.add(sub)
-    db.commit()
-    db.refresh(sub)
+    await db.commit()
+    await db.refresh(sub)
+    await broker.publish(
+        form_channel(sub.form_id),
+        "submission.started",
+        {"submission_id": sub.id, "form_id": sub.form_id, "user_id": sub.user_id, "started_at": sub.started_at.isoformat()},
+    )
     return sub
 
 
 @router.post("/answer")
-def upsert_answer(payload: UpsertAnswerIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    sub = db.query(Submission).filter(Submission.id == payload.submission_id, Submission.user_id == int(user.get("sub"))).first()
-    if not sub:
-        raise HTTPException(status_code=404, detail="submission not found")
-    if not db.query(Question).filter(Question.id == payload.question_id, Question.form_id == sub.form_id).first():
-        raise HTTPException(status_code=400, detail="invalid question")
-    ans = db.query(Answer).filter(Answer.submission_id == sub.id, Answer.question_id == payload.question_id).first()
-    if ans:
-        ans.content = payload.content
+async def upsert_answer(payload: UpsertAnswerIn, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
+    key = (payload.submission_id, int(user.get("sub")), payload.question_id)
+    form_id = validated_keys.get(key)
+    if form_id is None:
+        sub = await _own_submission(db, payload.submission_id, user)
+        _check_open(sub)
+        if not await db.scalar(select(Question.id).where(Question.id == payload.question_id, Question.form_id == sub.form_id)):
+            raise HTTPException(status_code=400, detail="invalid question")
+        form_id = sub.form_id
+        validated_keys.add(key, form_id)
+    if answer_buffer is not None:
+        # write-behind: coalesced in the buffer, persisted by the periodic flush or on submit; a cached
+        # key may be stale after a submit on another worker, but the flush drops saves made after it
+        await answer_buffer.put(payload.submission_id, payload.question_id, payload.content)
     else:
-        ans = Answer(submission_id=sub.id, question_id=payload.question_id, content=payload.content)
-        db.add(ans)
-    db.commit()
+        row = {
+            "submission_id": payload.submission_id,
+            "question_id": payload.question_id,
+            "content": payload.content,
+            "save_seq": await next_seq(),
+        }
+        await bulk_upsert_answers(db, [row])
+        await db.commit()
+    await _publish_answers(form_id, payload.submission_id, key[1], [payload.question_id])
     return {"ok": True}
 
 
+async def _publish_answers(form_id: int, submission_id: int, user_id: int, question_ids: list[int]) -> None:
+    await broker.publish(
+        form_channel(form_id),
+        "answer.saved",
+        {"submission_id": submission_id, "user_id": user_id, "question_ids": question_ids},
+    )
+
+
+@router.post("/{submission_id}/answers:batch", response_model=BatchAnswersOut)
+async def upsert_answers_batch(
+    submission_id: int,
+    payload: BatchAnswersIn,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    sub = await _own_submission(db, submission_id, user)
+    _check_open(sub)
+    # last occurrence wins when the client sends the same question twice
+    contents = {item.question_id: item.content for item in payload.answers}
+    valid = set(
+        (await db.scalars(select(Question.id).where(Question.form_id == sub.form_id, Question.id.in_(contents)))).all()
+    )
+    # stamped after every autosave accepted so far: an older buffered save can never overwrite it
+    save_seq = await next_seq()
+    rows = [
+        {"submission_id": sub.id, "question_id": q, "content": c, "save_seq": save_seq}
+        for q, c in contents.items()
+        if q in valid
+    ]
+    if answer_buffer is not None:
+        await flush_submission(db, sub.id)
+    await bulk_upsert_answers(db, rows)
+    await db.commit()
+    uid = int(user.get("sub"))
+    for q in valid:
+        validated_keys.add((sub.id, uid, q), sub.form_id)
+    if rows:
+        await _publish_answers(sub.form_id, sub.id, uid, [r["question_id"] for r in rows])
+    results = [
+        BatchAnswerResult(question_id=q, status="saved" if q in valid else "invalid_question") for q in contents
+    ]
+    return BatchAnswersOut(saved=len(rows), results=results)
+
+
 @router.post("/submit")
-def submit(payload: SubmitIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    sub = db.query(Submission).filter(Submission.id == payload.submission_id, Submission.user_id == int(user.get("sub"))).first()
-    if not sub:
-        raise HTTPException(status_code=404, detail="submission not found")
-    sub.submitted_at = __import__("datetime").datetime.utcnow()
-    db.commit()
+async def submit(payload: SubmitIn, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
+    sub = await _own_submission(db, payload.submission_id, user)
+    # buffered autosaves land in the same transaction that closes the submission
+    await flush_submission(db, sub.id)
+    # same clock as autosave stamps: flushes drop saves stamped after this
+    sub.submitted_at = seq_to_datetime(await next_seq())
+    await db.commit()
+    await broker.publish(
+        form_channel(sub.form_id),
+        "submission.submitted",
+        {"submission_id": sub.id, "user_id": sub.user_id, "submitted_at": sub.submitted_at.isoformat()},
+    )
     return {"ok": True}
 
 
 @router.get("/monitor", dependencies=[Depends(get_current_tutor_user)])
-def monitor(db: Session = Depends(get_db)):
+async def monitor(
+    request: Request,
+    response: Response,
+    form_id: int | None = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
     # Very basic monitor: list active submissions (no submitted_at yet)
-    active = db.query(Submission).filter(Submission.submitted_at.is_(None)).order_by(Submission.id.desc()).all()
+    query = select(*ACTIVE_ROWS.columns(Submission)) if FAST_JSON else select(Submission)
+    query = query.where(Submission.submitted_at.is_(None))
+    if form_id is not None:
+        query = query.where(Submission.form_id == form_id)
+    if FAST_JSON:
+        return rows_response(request, response, ACTIVE_ROWS, await paginate_rows(db, query, page, response, keys=(Submission.id,)))
+    active = await paginate(db, query, page, response, keys=(Submission.id,))
     return [
         {"id": s.id, "form_id": s.form_id, "user_id": s.user_id, "started_at": s.started_at.isoformat()}
         for s in active
     ]
 
 
+@router.get("/monitor/stream")
+async def monitor_stream(
+    request: Request,
+    form_id: Optional[int] = None,
+    classroom_id: Optional[int] = None,
+    user: dict = Depends(get_stream_user),
+) -> EventSourceResponse:
+    """SSE live monitor for one form or one classroom: a ``snapshot`` event, then incremental ``update`` events."""
+    if user.get("role") not in ("tutor", "admin"):
+        raise HTTPException(status_code=403, detail="forbidden")
+    if (form_id is None) == (classroom_id is None):
+        raise HTTPException(status_code=400, detail="exactly one of form_id or classroom_id is required")
+
+    # short-lived session: a dependency-scoped one would hold a pooled connection for the whole stream
+    async with async_session_scope() as db:
+        if form_id is not None:
+            if not await db.scalar(select(Form.id).where(Form.id == form_id)):
+                raise HTTPException(status_code=404, detail="form not found")
+            form_ids, state = [form_id], LiveExamMonitor()
+        else:
+            form_ids = list(
+                (await db.scalars(select(ClassroomAssignment.form_id).where(ClassroomAssignment.classroom_id == classroom_id))).all()
+            )
+            students = set(
+                (await db.scalars(select(ClassroomEnrollment.user_id).where(ClassroomEnrollment.classroom_id == classroom_id))).all()
+            )
+            state = LiveExamMonitor(user_ids=students)
+
+    async def event_generator() -> AsyncGenerator[dict, None]:
+        # subscribe before the snapshot so nothing between the two is missed
+        async with broker.subscribe([form_channel(f) for f in form_ids]) as sub:
+            async with async_session_scope() as db:
+                await state.load(db, form_ids)
+            yield {"event": "snapshot", "data": json.dumps({"rows": state.snapshot(), "counters": state.counters()})}
+            while not await request.is_disconnected():
+                msg = await sub.get(timeout=1.0)
+                if msg is None:
+                    continue
+                row = state.apply(msg["event"], msg["data"] or {})
+                if row is not None:
+                    yield {"event": "update", "data": json.dumps({"type": msg["event"], "row": row, "counters": state.counters()})}
+
+    return EventSourceResponse(event_generator(), ping=15000)
+
+
 @router.get("/mine", response_model=list[SubmissionOut])
-def my_submissions(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    subs = db.query(Submission).filter(Submission.user_id == int(user.get("sub"))).order_by(Submission.id.desc()).all()
-    return subs
+async def my_submissions(
+    request: Request,
+    response: Response,
+    form_id: int | None = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    query = select(*SUBMISSION_ROWS.columns(Submission)) if FAST_JSON else select(Submission)
+    query = query.where(Submission.user_id == int(user.get("sub")))
+    if form_id is not None:
+        query = query.where(Submission.form_id == form_id)
+    if FAST_JSON:
+        return rows_response(request, response, SUBMISSION_ROWS, await paginate_rows(db, query, page, response, keys=(Submission.id,)))
+    return await paginate(db, query, page, response, keys=(Submission.id,))
 
 
 @router.get("/{submission_id}", response_model=SubmissionDetailOut)
-def get_submission(submission_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    sub = db.query(Submission).filter(Submission.id == submission_id, Submission.user_id == int(user.get("sub"))).first()
-    if not sub:
-        raise HTTPException(status_code=404, detail="submission not found")
-    answers = [AnswerOut(question_id=a.question_id, content=a.content) for a in sub.answers]
+async def get_submission(submission_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
+    sub = await _own_submission(db, submission_id, user)
+    # explicit query instead of the lazy `sub.answers` relationship, which cannot load under asyncio
+    rows = (await db.scalars(select(Answer).where(Answer.submission_id == sub.id))).all()
+    contents = {a.question_id: a.content for a in rows}
+    if answer_buffer is not None and sub.submitted_at is None:
+        contents.update(await answer_buffer.pending(sub.id))
+    answers = [AnswerOut(question_id=q, content=c) for q, c in contents.items()]
     return SubmissionDetailOut(id=sub.id, form_id=sub.form_id, user_id=sub.user_id, answers=answers)
-
-
@@ -1,63 +1,392 @@
-import os
+import asyncio
+from datetime import datetime, timedelta
 from uuid import uuid4
 
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from minio import Minio
-from sqlalchemy.orm import Session
+from celery.result import AsyncResult
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Request, Response, status
+from minio.error import S3Error
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..deps import get_db, require_role
-from ..models.entities import Video
-from ..schemas.video import VideoOut
+from .. import playback, storage
+from ..deps import get_async_db, get_current_user, get_stream_user, require_role
+from ..fastjson import FAST_JSON, RowEncoder, rows_response
+from ..models.entities import UploadSession, Video
+from ..pagination import PageParams, paginate, paginate_rows
+from ..schemas.video import PlaybackOut, UploadPartOut, UploadSessionCreate, UploadSessionOut, VideoOut, VideoRow
+from ..services import video_rag, videos
+from ..storage import MINIO_BUCKET
+from ..uploads import (
+    TRANSCRIPT_MAX_BYTES,
+    UPLOAD_PART_MAX_BYTES,
+    UPLOAD_PART_SIZE,
+    UPLOAD_SESSION_TTL_H,
+    MultipartFileStream,
+    read_body,
+    run_storage,
+    stream_upload,
+    upload_metrics,
+)
 from apps.workers.tasks import index_video
 
 
 router = APIRouter(prefix="/videos", tags=["videos"])
 
+VIDEO_ROWS = RowEncoder(VideoRow)
 
-def get_minio_client() -> Minio:
-    endpoint = os.getenv("MINIO_ENDPOINT", "minio:9000")
-    access_key = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
-    secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin")
-    secure = os.getenv("MINIO_SECURE", "false").lower() == "true"
-    return Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
 
+SHA256_PATTERN = "^[0-9a-fA-F]{64}$"
+DEDUPLICATED_HEADER = "X-Deduplicated"
 
-@router.post("", response_model=VideoOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_role("admin", "tutor"))])
+
+def _deduplicated(response: Response, v: Video) -> Video:
+    """Answer an upload with the already-stored video holding identical content."""
+    response.status_code = status.HTTP_200_OK
+    response.headers[DEDUPLICATED_HEADER] = "true"
+    return v
+
+
+# the body is parsed by hand (streamed, never spooled), so describe the form for the docs
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+
+@router.post(
+    "",
+    response_model=VideoOut,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_role("admin", "tutor"))],
+    openapi_extra=UPLOAD_OPENAPI,
+)
 async def upload_video(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    content_sha256: Optional[str] = Header(None, alias="X-Content-SHA256", pattern=SHA256_PATTERN),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
 ):
-    bucket = os.getenv("MINIO_BUCKET", "videos")
-    client = get_minio_client()
-    if not client.bucket_exists(bucket):
-        client.make_bucket(bucket)
+    # a client re-sending one of its own videos skips the bytes; anyone else must upload them
+    if content_sha256 and (existing := await videos.find_own_by_hash(db, content_sha256, int(user.get("sub")))) is not None:
+        return _deduplicated(response, existing)
+
+    form = MultipartFileStream(request, field="file")
+    await form.open()
+    key = f"uploads/{uuid4()}_{form.filename}"
+    result = await stream_upload(form.chunks(), key, form.content_type)
+    if content_sha256 and content_sha256.lower() != result.sha256:
+        await run_storage(storage.remove_object, key)
+        raise HTTPException(status_code=422, detail="content does not match X-Content-SHA256")
+
+    v, deduplicated = await videos.register_upload(db, key, result.sha256, int(user.get("sub")))
+    return _deduplicated(response, v) if deduplicated else v
+
+
+@router.get("/upload-stats", dependencies=[Depends(require_role("admin", "tutor"))])
+def upload_stats() -> dict:
+    return upload_metrics.stats()
+
+
+# --- resumable uploads: create a session, PUT numbered parts (in any order, in parallel, retried
+# individually), GET the session to see which parts storage already has, then complete ---
 
-    key = f"uploads/{uuid4()}_{file.filename}"
+def _session_out(s: UploadSession, parts: list | None = None) -> UploadSessionOut:
+    return UploadSessionOut(
+        id=s.id,
+        filename=s.filename,
+        content_type=s.content_type,
+        part_size=UPLOAD_PART_SIZE,
+        min_part_size=storage.MIN_PART_SIZE,
+        max_part_size=UPLOAD_PART_MAX_BYTES,
+        max_parts=storage.MAX_PARTS,
+        expires_at=s.expires_at,
+        video_id=s.video_id,
+        parts=[UploadPartOut(part_number=p.part_number, etag=p.etag, size=p.size) for p in parts or []],
+    )
+
+
+async def _own_session(db: AsyncSession, session_id: str, user: dict, for_update: bool = False) -> UploadSession:
+    query = select(UploadSession).where(UploadSession.id == session_id, UploadSession.owner_id == int(user.get("sub")))
+    if for_update:
+        query = query.with_for_update()
+    s = await db.scalar(query)
+    if s is None:
+        raise HTTPException(status_code=404, detail="upload not found")
+    return s
+
+
+def _raise_if_gone(e: S3Error) -> None:
+    if e.code == "NoSuchUpload":  # aborted, or reaped by a bucket lifecycle rule
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="upload session expired")
+
+
+def _require_open(s: UploadSession) -> None:
+    if s.video_id is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="upload already completed")
+    if s.expires_at <= datetime.utcnow():
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="upload session expired")
+
+
+@router.post(
+    "/uploads",
+    response_model=UploadSessionOut,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_role("admin", "tutor"))],
+)
+async def create_upload(
+    payload: UploadSessionCreate,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+) -> UploadSessionOut:
+    filename = payload.filename.replace("/", "_")
+    if payload.sha256 and (existing := await videos.find_own_by_hash(db, payload.sha256, int(user.get("sub")))) is not None:
+        # the caller's own content is already stored: the session is born completed, no bytes to send
+        s = UploadSession(
+            id=str(uuid4()),
+            owner_id=int(user.get("sub")),
+            storage_key=storage.split_key(existing.storage_key)[1],
+            upload_id="",
+            filename=filename,
+            content_type=payload.content_type,
+            video_id=existing.id,
+            expires_at=datetime.utcnow(),
+        )
+        db.add(s)
+        await db.commit()
+        return _session_out(s)
+    await storage.ensure_bucket()
+    key = f"uploads/{uuid4()}_{filename}"
+    upload_id = await run_storage(storage.create_multipart_upload, key, payload.content_type)
+    s = UploadSession(
+        id=str(uuid4()),
+        owner_id=int(user.get("sub")),
+        storage_key=key,
+        upload_id=upload_id,
+        filename=filename,
+        content_type=payload.content_type,
+        expires_at=datetime.utcnow() + timedelta(hours=UPLOAD_SESSION_TTL_H),
+    )
+    db.add(s)
+    await db.commit()
+    return _session_out(s)
+
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionOut, dependencies=[Depends(require_role("admin", "tutor"))])
+async def get_upload(session_id: str, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)) -> UploadSessionOut:
+    s = await _own_session(db, session_id, user)
+    if s.video_id is not None:
+        return _session_out(s)
     try:
-        client.put_object(bucket, key, file.file, length=-1, part_size=10 * 1024 * 1024)
-    except Exception as e:  # noqa: BLE001
-        raise HTTPException(status_code=500, detail=f"upload failed: {e}")
-
-    v = Video(storage_key=f"{bucket}/{key}")
-    db.add(v)
-    db.commit()
-    db.refresh(v)
+        parts = await run_storage(storage.list_parts, s.storage_key, s.upload_id)
+    except S3Error as e:
+        _raise_if_gone(e)
+        raise
+    return _session_out(s, parts)
+
+
+@router.put(
+    "/uploads/{session_id}/parts/{part_number}",
+    response_model=UploadPartOut,
+    dependencies=[Depends(require_role("admin", "tutor"))],
+    openapi_extra={"requestBody": {"required": True, "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}}},
+)
+async def put_upload_part(
+    request: Request,
+    session_id: str,
+    part_number: int = Path(ge=1, le=storage.MAX_PARTS),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+) -> UploadPartOut:
+    s = await _own_session(db, session_id, user)
+    _require_open(s)
+    key, upload_id = s.storage_key, s.upload_id
+    await db.close()  # don't pin a pooled connection while the part is transferred
+    data = await read_body(request, UPLOAD_PART_MAX_BYTES)
+    if not data:
+        raise HTTPException(status_code=422, detail="empty part")
+    # re-sending a part number replaces it, so a failed part is simply retried
+    try:
+        etag = await run_storage(storage.upload_part, key, upload_id, part_number, data)
+    except S3Error as e:
+        _raise_if_gone(e)
+        raise
+    return UploadPartOut(part_number=part_number, etag=etag, size=len(data))
+
+
+async def _already_assembled(s: UploadSession, e: S3Error) -> bool:
+    """True when the multipart upload is gone because it was completed: its object exists."""
+    return e.code == "NoSuchUpload" and await run_storage(storage.object_exists, s.storage_key)
+
+
+@router.post(
+    "/uploads/{session_id}/complete",
+    response_model=VideoOut,
+    dependencies=[Depends(require_role("admin", "tutor"))],
+)
+async def complete_upload(session_id: str, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
+    s = await _own_session(db, session_id, user, for_update=True)
+    if s.video_id is not None:
+        return await db.get(Video, s.video_id)  # completing twice is harmless
+    _require_open(s)
+    try:
+        parts = await run_storage(storage.list_parts, s.storage_key, s.upload_id)
+    except S3Error as e:
+        # an earlier attempt assembled the object, then failed hashing or registering it: finish that
+        if not await _already_assembled(s, e):
+            _raise_if_gone(e)
+            raise
+        parts = None
+    if parts is not None:
+        numbers = [p.part_number for p in parts]
+        if not numbers:
+            raise HTTPException(status_code=422, detail="no parts uploaded")
+        if numbers != list(range(1, len(numbers) + 1)):
+            missing = sorted(set(range(1, max(numbers) + 1)) - set(numbers))
+            raise HTTPException(status_code=422, detail={"error": "missing parts", "missing": missing[:100]})
+        small = [p.part_number for p in parts[:-1] if p.size is not None and p.size < storage.MIN_PART_SIZE]
+        if small:
+            raise HTTPException(
+                status_code=422,
+                detail={"error": f"parts other than the last must be at least {storage.MIN_PART_SIZE} bytes", "parts": small[:100]},
+            )
+        try:
+            await run_storage(storage.complete_multipart_upload, s.storage_key, s.upload_id, parts)
+        except S3Error as e:
+            if not await _already_assembled(s, e):
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"upload could not be completed: {e.code}")
+
+    # parts arrive out of order, so the hash is taken from the assembled object (streamed, off the loop)
+    sha256 = await run_storage(storage.sha256_object, s.storage_key)
+    session_id, owner_id, key = s.id, s.owner_id, s.storage_key
+    v, _ = await videos.register_upload(db, key, sha256, owner_id)
+    await db.execute(update(UploadSession).where(UploadSession.id == session_id).values(video_id=v.id))
+    await db.commit()
     return v
 
 
-@router.post("/{video_id}/index", dependencies=[Depends(require_role("admin", "tutor"))])
-def index(video_id: int, db: Session = Depends(get_db)) -> dict:
-    v = db.get(Video, video_id)
+@router.delete(
+    "/uploads/{session_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_role("admin", "tutor"))],
+)
+async def abort_upload(session_id: str, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)) -> Response:
+    s = await _own_session(db, session_id, user)
+    if s.video_id is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="upload already completed")
+    try:
+        await run_storage(storage.abort_multipart_upload, s.storage_key, s.upload_id)
+    except S3Error as e:
+        if e.code != "NoSuchUpload":
+            raise
+        # completed by a request that failed before registering: the session's own object, not a video's
+        await run_storage(storage.remove_object, s.storage_key)
+    await db.delete(s)
+    await db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+async def _video_or_404(db: AsyncSession, video_id: int) -> Video:
+    v = await db.get(Video, video_id)
     if not v:
         raise HTTPException(status_code=404, detail="Video not found")
-    index_video.delay(str(video_id))
-    return {"status": "queued"}
+    return v
+
+
+@router.get("/{video_id}/playback", response_model=PlaybackOut, dependencies=[Depends(get_current_user)])
+async def playback_url(request: Request, video_id: int, db: AsyncSession = Depends(get_async_db)) -> PlaybackOut:
+    """Where to play a video from: a short-lived presigned MinIO URL, or the API stream as fallback."""
+    v = await _video_or_404(db, video_id)
+    if playback.PLAYBACK_PRESIGNED:
+        url, expires_at = playback.presigned_url(v.storage_key)
+        return PlaybackOut(url=url, expires_at=expires_at, mode="presigned")
+    # the client adds its token (Authorization header, or ?token= for a <video> element)
+    return PlaybackOut(url=str(request.url_for("stream_video", video_id=video_id)), mode="proxy")
+
+
+@router.api_route("/{video_id}/stream", methods=["GET", "HEAD"], name="stream_video")
+async def stream_video(
+    request: Request,
+    video_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_stream_user),
+) -> Response:
+    """Fallback byte stream with single-range ``Range`` support (``206``), for when MinIO isn't client-reachable."""
+    storage_key = (await _video_or_404(db, video_id)).storage_key
+    await db.close()  # the stream may run for a long time; don't hold a pooled connection
+    return await playback.range_response(request, storage_key)
+
+
+@router.put(
+    "/{video_id}/transcript",
+    dependencies=[Depends(require_role("admin", "tutor"))],
+    openapi_extra={"requestBody": {"required": True, "content": {"text/vtt": {}, "application/x-subrip": {}}}},
+)
+async def put_transcript(request: Request, video_id: int, db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Store a WebVTT/SRT transcript next to the video object (input for indexing)."""
+    v = await _video_or_404(db, video_id)
+    data = await read_body(request, TRANSCRIPT_MAX_BYTES)
+    ctype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    is_vtt = ctype == "text/vtt" or (ctype != "application/x-subrip" and data.lstrip(b"\xef\xbb\xbf").startswith(b"WEBVTT"))
+    ext, other = (".vtt", ".srt") if is_vtt else (".srt", ".vtt")
+    key = video_rag.transcript_key(v.storage_key, ext)
+    await run_storage(storage.put_bytes, key, data, "text/vtt" if is_vtt else "application/x-subrip")
+    # only one transcript per video: a leftover of the other format would win or shadow this one
+    await run_storage(storage.remove_object, video_rag.transcript_key(v.storage_key, other))
+    v.index_status = None
+    await db.commit()
+    return {"key": key, "bytes": len(data)}
+
+
+@router.post("/{video_id}/index", dependencies=[Depends(require_role("admin", "tutor"))])
+async def index(video_id: int, db: AsyncSession = Depends(get_async_db)) -> dict:
+    v = await _video_or_404(db, video_id)
+    if v.index_status != "indexed":
+        v.index_status = "pending"
+        await db.commit()
+    # a broker round-trip: off the event loop, so a slow broker does not stall other connections
+    task = await asyncio.to_thread(index_video.delay, str(video_id))
+    return {"status": "queued", "task_id": task.id}
+
+
+@router.get("/{video_id}/index", dependencies=[Depends(require_role("admin", "tutor"))])
+async def index_status(video_id: int, task_id: Optional[str] = None, db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Index state of a video; with ``task_id`` also the task's state and ``PROGRESS`` meta."""
+    v = await _video_or_404(db, video_id)
+    out = {"video_id": v.id, "status": v.index_status, "segments": v.segment_count, "indexed_at": v.indexed_at}
+    if task_id:
+        result = AsyncResult(task_id, app=index_video.app)
+        state, info = await asyncio.to_thread(lambda: (result.state, result.info))
+        out["task"] = {"id": task_id, "state": state, "info": info if isinstance(info, dict) else (str(info) if info else None)}
+    return out
 
 
 @router.get("", response_model=List[VideoOut])
-def list_videos(db: Session = Depends(get_db)) -> list[VideoOut]:
-    return db.query(Video).order_by(Video.created_at.desc()).all()
+async def list_videos(
+    request: Request,
+    response: Response,
+    owner_id: int | None = None,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+) -> list[VideoOut]:
+    query = select(*VIDEO_ROWS.columns(Video)) if FAST_JSON else select(Video)
+    if owner_id is not None:
+        query = query.where(Video.owner_id == owner_id)
+    keys = (Video.created_at, Video.id)
+    if FAST_JSON:
+        return rows_response(request, response, VIDEO_ROWS, await paginate_rows(db, query, page, response, keys=keys))
+    return await paginate(db, query, page, response, keys=keys)
 
 
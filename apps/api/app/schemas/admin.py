@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import Literal
 
 from pydantic import BaseModel, EmailStr, Field
+from typing_extensions import TypedDict
 
 
 class UserOut(BaseModel):
@@ -14,6 +15,15 @@ class UserOut(BaseModel):
         from_attributes = True
 
 
+class UserRow(TypedDict):
+    """Column-level shape of ``UserOut`` for the fast JSON path."""
+
+    id: int
+    email: str
+    role: Literal["admin", "tutor", "student"]
+    created_at: datetime
+
+
 class CreateUserIn(BaseModel):
     email: EmailStr
     password: str = Field(min_length=6)
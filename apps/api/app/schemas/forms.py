@@ -2,6 +2,9 @@ from datetime import datetime
 from typing import Any, Optional
 
 from pydantic import BaseModel, Field
+from typing_extensions import TypedDict
+
+from .questions import QuestionOut
 
 
 class FormCreate(BaseModel):
@@ -32,3 +35,24 @@ class FormOut(BaseModel):
         from_attributes = True
 
 
+
+
+class FormRow(TypedDict):
+    """Column-level shape of ``FormOut`` for the fast JSON path."""
+
+    id: int
+    title: str
+    description: Optional[str]
+    owner_id: Optional[int]
+    course_id: Optional[int]
+    settings_json: Optional[dict[str, Any]]
+    created_at: datetime
+    updated_at: datetime
+
+
+class ExamOut(BaseModel):
+    """Everything a student needs to render an exam, in question order."""
+
+    version: str
+    form: FormOut
+    questions: list[QuestionOut]
@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import Any, Literal, Optional
 
 from pydantic import BaseModel, Field
+from typing_extensions import TypedDict
 
 
 QuestionType = Literal["mcq", "short", "open", "numeric"]
@@ -36,3 +37,16 @@ class QuestionOut(BaseModel):
         from_attributes = True
 
 
+
+
+class QuestionRow(TypedDict):
+    """Column-level shape of ``QuestionOut`` for the fast JSON path."""
+
+    id: int
+    form_id: int
+    type: QuestionType
+    prompt: str
+    rubric_id: Optional[int]
+    metadata_json: Optional[dict[str, Any]]
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,19 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class SearchHit(BaseModel):
+    segment_id: int
+    video_id: int
+    start_ms: int
+    end_ms: int
+    score: float
+    text: str
+
+
+class SearchOut(BaseModel):
+    query: str
+    mode: Literal["index", "fallback"]  # fallback: in-process index not built yet
+    took_ms: float
+    hits: list[SearchHit]
@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, Field
+from typing_extensions import TypedDict
 
 
 class StartSubmissionIn(BaseModel):
@@ -14,6 +18,21 @@ class SubmissionOut(BaseModel):
         from_attributes = True
 
 
+class SubmissionRow(TypedDict):
+    """Column-level shape of ``SubmissionOut`` for the fast JSON path."""
+
+    id: int
+    form_id: int
+    user_id: int
+
+
+class ActiveSubmissionRow(TypedDict):
+    id: int
+    form_id: int
+    user_id: int
+    started_at: datetime
+
+
 class UpsertAnswerIn(BaseModel):
     submission_id: int
     question_id: int
@@ -38,3 +57,22 @@ class SubmissionDetailOut(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class BatchAnswerItem(BaseModel):
+    question_id: int
+    content: str
+
+
+class BatchAnswersIn(BaseModel):
+    answers: list[BatchAnswerItem] = Field(min_length=1, max_length=500)
+
+
+class BatchAnswerResult(BaseModel):
+    question_id: int
+    status: Literal["saved", "invalid_question"]
+
+
+class BatchAnswersOut(BaseModel):
+    saved: int
+    results: list[BatchAnswerResult]
@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing_extensions import TypedDict
 
 
 class VideoOut(BaseModel):
@@ -9,9 +10,57 @@ class VideoOut(BaseModel):
     storage_key: str
     duration: Optional[int]
     lang: Optional[str]
+    content_hash: Optional[str]
+    index_status: Optional[str]
+    segment_count: Optional[int]
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+
+
+class VideoRow(TypedDict):
+    """Column-level shape of ``VideoOut`` for the fast JSON path."""
+
+    id: int
+    storage_key: str
+    duration: Optional[int]
+    lang: Optional[str]
+    content_hash: Optional[str]
+    index_status: Optional[str]
+    segment_count: Optional[int]
+    created_at: datetime
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(min_length=1, max_length=255)
+    content_type: Optional[str] = Field(default=None, max_length=255)
+    # optional SHA-256 of the file: already-stored content completes the session immediately
+    sha256: Optional[str] = Field(default=None, pattern="^[0-9a-fA-F]{64}$")
+
+
+class UploadPartOut(BaseModel):
+    part_number: int
+    etag: str
+    size: Optional[int] = None
+
+
+class UploadSessionOut(BaseModel):
+    id: str
+    filename: str
+    content_type: Optional[str]
+    part_size: int  # recommended; every part but the last must be at least min_part_size
+    min_part_size: int
+    max_part_size: int
+    max_parts: int
+    expires_at: datetime
+    video_id: Optional[int] = None
+    parts: list[UploadPartOut] = []
+
+
+class PlaybackOut(BaseModel):
+    url: str
+    mode: Literal["presigned", "proxy"]
+    expires_at: Optional[datetime] = None  # presigned URLs only
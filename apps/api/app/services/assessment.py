@@ -0,0 +1,303 @@
+"""Auto-grading of objective questions (MCQ, numeric) for a whole form at once.
+
+Answer keys live in ``Question.metadata_json`` (the same keys ``exam_cache`` hides from students):
+
+    mcq:      {"choices": ["A", "B", "C"], "answer": 1}    # 0-based index, a list of indices, or choice text
+    numeric:  {"answer": 9.81, "tolerance": 0.05}          # absolute, or relative as "2%"
+    optional: {"points": 2}                                # default 1
+
+An MCQ answer may be the choice text, its letter (``b``) or its 0-based index. Each key is compiled
+once; a question's answers are then scored as one column: ``np.unique`` reduces the column to its
+distinct responses (a few per MCQ, usually few per numeric question), only those are parsed in
+Python, and the verdict is broadcast back through the inverse index. Scores and feedback are written
+with one executemany ``UPDATE`` per ``GRADING_BATCH_SIZE`` rows, skipping rows that already hold the
+same result, so re-grading after a key fix only touches the answers whose score changed.
+
+Short/open answers whose question carries a rubric (``{"rubric": "...", "points": 5}``) are graded by
+the language model (``grade_rubric``): only answers without a score yet, all of a chunk concurrently
+on the process's ``llm`` event loop, so throughput follows the provider's limits.
+"""
+import json
+import logging
+import math
+import re
+import os
+import string
+import time
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import select, update
+
+from ..models.entities import Answer, Question, Submission
+from . import llm
+
+
+logger = logging.getLogger(__name__)
+
+GRADING_BATCH_SIZE = int(os.getenv("GRADING_BATCH_SIZE", "5000"))  # rows per bulk UPDATE
+OBJECTIVE_TYPES = ("mcq", "numeric")
+RUBRIC_TYPES = ("short", "open")
+RUBRIC_MAX_TOKENS = int(os.getenv("RUBRIC_MAX_TOKENS", "200"))  # completion budget per rubric verdict
+
+# feedback written next to the score
+CORRECT = "correct"
+INCORRECT = "incorrect"
+NO_ANSWER = "no answer"
+NOT_A_CHOICE = "not one of the choices"
+NOT_A_NUMBER = "not a number"
+
+
+class CompiledKey(NamedTuple):
+    question_id: int
+    type: str
+    points: int
+    # mcq
+    correct: Optional[np.ndarray] = None  # bool per choice
+    lookup: Optional[dict[str, int]] = None  # normalised choice text / letter / index -> choice
+    # numeric
+    value: float = 0.0
+    tolerance: float = 0.0
+
+
+def _norm(value) -> str:
+    return " ".join(str(value).split()).casefold()
+
+
+def _number(text: str) -> float:
+    try:
+        return float(text.replace(",", "").replace(" ", ""))
+    except ValueError:
+        return math.nan
+
+
+def compile_key(q: Question) -> Optional[CompiledKey]:
+    """``None`` for non-objective questions; ``ValueError`` for a missing or malformed key."""
+    if q.type not in OBJECTIVE_TYPES:
+        return None
+    meta = q.metadata_json or {}
+    answer = meta.get("answer", meta.get("answers", meta.get("answer_key")))
+    if answer is None:
+        raise ValueError("no answer key")
+    points = int(meta.get("points", 1))
+    if q.type == "numeric":
+        value = float(answer)
+        tol = meta.get("tolerance", 0)
+        if isinstance(tol, str) and tol.strip().endswith("%"):
+            tolerance = abs(value) * float(tol.strip()[:-1]) / 100
+        else:
+            tolerance = float(tol)
+        # float noise in either the key or a typed answer must not flip an exact match
+        return CompiledKey(q.id, q.type, points, value=value, tolerance=max(tolerance, 1e-9 * max(1.0, abs(value))))
+
+    choices = [_norm(c) for c in meta.get("choices") or []]
+    if not choices:
+        raise ValueError("mcq without choices")
+    lookup: dict[str, int] = {}
+    for i in range(len(choices)):  # weakest first: choice text wins over a letter or index
+        lookup[str(i)] = i
+        if i < len(string.ascii_lowercase):
+            lookup[string.ascii_lowercase[i]] = i
+    lookup.update({c: i for i, c in enumerate(choices)})
+    correct = np.zeros(len(choices), dtype=bool)
+    for a in answer if isinstance(answer, list) else [answer]:
+        i = a if isinstance(a, int) else lookup.get(_norm(a))
+        if i is None or not 0 <= i < len(choices):
+            raise ValueError(f"answer {a!r} is not a choice")
+        correct[i] = True
+    return CompiledKey(q.id, q.type, points, correct=correct, lookup=lookup)
+
+
+def grade_column(key: CompiledKey, contents: list[Optional[str]]) -> tuple[np.ndarray, np.ndarray]:
+    """``(scores, feedback)`` arrays for one question's answers."""
+    distinct, inverse = np.unique(np.asarray([_norm(c) if c else "" for c in contents], dtype=str), return_inverse=True)
+    blank = distinct == ""
+    if key.type == "mcq":
+        picked = np.asarray([key.lookup.get(d, -1) for d in distinct], dtype=np.int64)
+        valid = picked >= 0
+        right = valid & key.correct[np.maximum(picked, 0)]
+        invalid_text = NOT_A_CHOICE
+    else:
+        values = np.asarray([_number(d) for d in distinct], dtype=np.float64)
+        valid = ~np.isnan(values)
+        with np.errstate(invalid="ignore"):
+            right = valid & (np.abs(values - key.value) <= key.tolerance)
+        invalid_text = NOT_A_NUMBER
+    verdict = np.where(blank, NO_ANSWER, np.where(right, CORRECT, np.where(valid, INCORRECT, invalid_text)))
+    scores = np.where(right, key.points, 0)
+    return scores[inverse], verdict[inverse]
+
+
+Progress = Callable[[dict], None]
+
+
+def grade_form(
+    db,
+    form_id: int,
+    progress: Optional[Progress] = None,
+    submission_ids: Optional[list[int]] = None,
+    commit: bool = True,
+) -> dict:
+    """Grade every submitted MCQ/numeric answer of a form; ``db`` is a sync ``Session``.
+
+    ``submission_ids`` restricts grading to those submissions (one orchestrator chunk); with
+    ``commit=False`` the caller commits, e.g. together with its own checkpoint.
+    """
+    started = time.perf_counter()
+    keys: dict[int, CompiledKey] = {}
+    invalid: dict[int, str] = {}
+    for q in db.scalars(select(Question).where(Question.form_id == form_id)):
+        try:
+            key = compile_key(q)
+        except (ValueError, TypeError) as e:
+            invalid[q.id] = str(e)
+            continue
+        if key is not None:
+            keys[q.id] = key
+    if invalid:
+        logger.warning("form %s: questions with unusable answer keys: %s", form_id, invalid)
+
+    rows = []
+    if keys:
+        stmt = (
+            select(Answer.id, Answer.question_id, Answer.content, Answer.score, Answer.feedback)
+            .join(Submission, Submission.id == Answer.submission_id)
+            .where(Submission.form_id == form_id, Submission.submitted_at.is_not(None), Answer.question_id.in_(list(keys)))
+        )
+        if submission_ids is not None:
+            stmt = stmt.where(Submission.id.in_(submission_ids))
+        rows = db.execute(stmt).all()
+    n = len(rows)
+    ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=n)
+    question_ids = np.fromiter((r.question_id for r in rows), dtype=np.int64, count=n)
+    scores = np.zeros(n, dtype=np.int64)
+    feedback = np.empty(n, dtype=object)
+
+    order = np.argsort(question_ids, kind="stable")
+    groups, starts = np.unique(question_ids[order], return_index=True)
+    for qid, lo, hi in zip(groups.tolist(), starts.tolist(), [*starts[1:].tolist(), n]):
+        idx = order[lo:hi]
+        col_scores, col_feedback = grade_column(keys[qid], [rows[i].content for i in idx])
+        scores[idx] = col_scores
+        feedback[idx] = col_feedback
+
+    old_scores = np.fromiter((-1 if r.score is None else r.score for r in rows), dtype=np.int64, count=n)
+    old_feedback = np.asarray([r.feedback for r in rows], dtype=object)
+    changed = np.flatnonzero((old_scores != scores) | (old_feedback != feedback))
+
+    for lo in range(0, changed.size, GRADING_BATCH_SIZE):
+        chunk = changed[lo : lo + GRADING_BATCH_SIZE]
+        db.execute(
+            update(Answer),
+            [
+                {"id": i, "score": s, "feedback": f}
+                for i, s, f in zip(ids[chunk].tolist(), scores[chunk].tolist(), feedback[chunk].tolist())
+            ],
+        )
+        if progress is not None:
+            progress({"form_id": form_id, "answers": n, "written": min(lo + GRADING_BATCH_SIZE, changed.size), "to_write": int(changed.size)})
+    if commit:
+        db.commit()
+
+    summary = {
+        "form_id": form_id,
+        "questions": len(keys),
+        "answers": n,
+        "updated": int(changed.size),
+        "correct": int(np.count_nonzero(feedback == CORRECT)) if n else 0,
+        "invalid_keys": {str(k): v for k, v in invalid.items()},
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.debug("graded form %s: %s", form_id, summary)
+    return summary
+
+
+RUBRIC_SYSTEM = (
+    "You grade a student's answer to an exam question against the tutor's rubric. "
+    'Reply with JSON only: {"score": <integer from 0 to the maximum>, "feedback": "<one or two sentences to the student>"}'
+)
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def rubric_messages(prompt: str, rubric: str, points: int, answer: str) -> list[llm.Message]:
+    return [
+        {"role": "system", "content": RUBRIC_SYSTEM},
+        {
+            "role": "user",
+            "content": f"Question:\n{prompt}\n\nRubric (maximum {points} points):\n{rubric}\n\nStudent answer:\n{answer}",
+        },
+    ]
+
+
+def parse_verdict(text: str, points: int) -> tuple[int, str]:
+    """``(score, feedback)`` from the model's reply; ``ValueError`` when it is not the requested JSON."""
+    match = _JSON_OBJECT.search(text)
+    if match is None:
+        raise ValueError(f"no JSON object in reply: {text[:200]!r}")
+    data = json.loads(match.group(0))
+    score = int(round(float(data["score"])))
+    return max(0, min(points, score)), str(data.get("feedback") or "")[:2000]
+
+
+async def _rubric_verdicts(items: list[tuple[str, str, int, str]]) -> list:
+    client = llm.get_llm()
+
+    async def one(prompt: str, rubric: str, points: int, answer: str) -> tuple[int, str]:
+        reply = await client.complete(rubric_messages(prompt, rubric, points, answer), max_tokens=RUBRIC_MAX_TOKENS, temperature=0)
+        return parse_verdict(reply.text, points)
+
+    return await llm.gather_limited([lambda item=item: one(*item) for item in items])
+
+
+def grade_rubric(db, form_id: int, submission_ids: Optional[list[int]] = None, commit: bool = True) -> dict:
+    """LLM-grade the unscored short/open answers of a form whose question has a rubric.
+
+    Blank answers score 0 without a call. A verdict that fails (provider errors after retries, an
+    unparsable reply) leaves its answer unscored, so the next grading run picks it up again.
+    """
+    summary = {"form_id": form_id, "answers": 0, "graded": 0, "failed": 0}
+    if not llm.llm_enabled():
+        return summary
+    started = time.perf_counter()
+    questions = {
+        q.id: q
+        for q in db.scalars(select(Question).where(Question.form_id == form_id, Question.type.in_(RUBRIC_TYPES)))
+        if (q.metadata_json or {}).get("rubric")
+    }
+    if not questions:
+        return summary
+    stmt = (
+        select(Answer.id, Answer.question_id, Answer.content)
+        .join(Submission, Submission.id == Answer.submission_id)
+        .where(
+            Submission.form_id == form_id,
+            Submission.submitted_at.is_not(None),
+            Answer.question_id.in_(list(questions)),
+            Answer.score.is_(None),
+        )
+    )
+    if submission_ids is not None:
+        stmt = stmt.where(Submission.id.in_(submission_ids))
+    rows = db.execute(stmt).all()
+
+    updates = [{"id": r.id, "score": 0, "feedback": NO_ANSWER} for r in rows if not (r.content or "").strip()]
+    asked = [r for r in rows if (r.content or "").strip()]
+    items = []
+    for r in asked:
+        q = questions[r.question_id]
+        meta = q.metadata_json
+        items.append((q.prompt, str(meta["rubric"]), int(meta.get("points", 1)), r.content))
+    verdicts = llm.run(_rubric_verdicts(items)) if items else []
+    for r, verdict in zip(asked, verdicts):
+        if isinstance(verdict, Exception):
+            summary["failed"] += 1
+            logger.warning("rubric grading of answer %s failed: %r", r.id, verdict)
+            continue
+        updates.append({"id": r.id, "score": verdict[0], "feedback": verdict[1]})
+    for lo in range(0, len(updates), GRADING_BATCH_SIZE):
+        db.execute(update(Answer), updates[lo : lo + GRADING_BATCH_SIZE])
+    if commit:
+        db.commit()
+    summary.update(answers=len(rows), graded=len(updates), seconds=round(time.perf_counter() - started, 3))
+    logger.debug("rubric-graded form %s: %s", form_id, summary)
+    return summary
@@ -0,0 +1,371 @@
+"""Write-behind buffer for answer autosave.
+
+Autosaves are coalesced per (submission_id, question_id) — last write wins — and flushed
+to Postgres in bulk with ``INSERT ... ON CONFLICT DO UPDATE`` every ``AUTOSAVE_FLUSH_INTERVAL_MS``.
+
+Every write is stamped with a ``save_seq`` when it is accepted (microseconds, strictly increasing:
+from the Redis server clock in ``redis`` mode, else this process's clock). The upsert only replaces
+an answer whose stored stamp is older, so two flushes of the same submission — the periodic flusher
+of any worker and ``flush_submission`` on submit — may commit in either order. Submit takes its
+``submitted_at`` from the same clock and flushes drop rows stamped after it, so a late autosave
+never replaces a submitted answer.
+
+Modes (``AUTOSAVE_MODE``):
+- ``direct``: no buffer, every autosave is written immediately (previous behaviour)
+- ``memory``: per-process buffer; only safe with a single uvicorn worker
+- ``redis``: buffer shared by all workers/replicas through Redis
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from ..models.db import async_session_scope, engine
+from ..models.entities import Answer, Submission
+
+
+logger = logging.getLogger(__name__)
+
+AUTOSAVE_MODE = os.getenv("AUTOSAVE_MODE", "direct").lower()
+AUTOSAVE_FLUSH_INTERVAL_MS = int(os.getenv("AUTOSAVE_FLUSH_INTERVAL_MS", "1000"))
+AUTOSAVE_MAX_BATCH = int(os.getenv("AUTOSAVE_MAX_BATCH", "5000"))
+
+Row = dict  # {"submission_id": int, "question_id": int, "content": str, "save_seq": int}
+
+_last_seq = 0
+
+
+def local_seq() -> int:
+    """Microseconds since the epoch, strictly increasing within this process."""
+    global _last_seq
+    _last_seq = max(_last_seq + 1, time.time_ns() // 1000)
+    return _last_seq
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def seq_to_datetime(seq: int) -> datetime:
+    """Naive UTC time of a stamp (``submitted_at`` is taken from the autosave clock)."""
+    return _EPOCH + seq * _MICROSECOND
+
+
+def datetime_to_seq(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _rows(submission_id: int, items: dict) -> list[Row]:
+    """``items``: ``{question_id: (save_seq, content)}``."""
+    return [
+        {"submission_id": submission_id, "question_id": int(q), "content": c, "save_seq": int(seq)}
+        for q, (seq, c) in items.items()
+    ]
+
+
+class MemoryAnswerBuffer:
+    """In-process buffer: ``{submission_id: {question_id: (save_seq, content)}}``."""
+
+    def __init__(self) -> None:
+        self._pending: dict[int, dict[int, tuple[int, str]]] = {}
+
+    async def clock(self) -> int:
+        return local_seq()
+
+    async def put(self, submission_id: int, question_id: int, content: str) -> None:
+        self._pending.setdefault(submission_id, {})[question_id] = (local_seq(), content)
+
+    async def pending(self, submission_id: int) -> dict[int, str]:
+        return {q: c for q, (_, c) in self._pending.get(submission_id, {}).items()}
+
+    async def pending_questions(self, submission_ids: list[int]) -> dict[int, set[int]]:
+        return {sid: set(self._pending[sid]) for sid in submission_ids if self._pending.get(sid)}
+
+    async def drain(self, limit: int = AUTOSAVE_MAX_BATCH) -> list[Row]:
+        rows: list[Row] = []
+        while self._pending and len(rows) < limit:
+            sid = next(iter(self._pending))
+            rows.extend(_rows(sid, self._pending.pop(sid)))
+        return rows
+
+    async def drain_submission(self, submission_id: int) -> list[Row]:
+        return _rows(submission_id, self._pending.pop(submission_id, {}))
+
+    async def restore(self, rows: list[Row]) -> None:
+        # put back after a failed flush without clobbering writes that arrived meanwhile
+        for r in rows:
+            self._pending.setdefault(r["submission_id"], {}).setdefault(r["question_id"], (r["save_seq"], r["content"]))
+
+
+# KEYS[1]: clock. Redis server time in microseconds, bumped past the last stamp handed out.
+_CLOCK_LUA = """
+local t = redis.call('TIME')
+local seq = tonumber(t[1]) * 1000000 + tonumber(t[2])
+local last = tonumber(redis.call('GET', KEYS[1]) or '0')
+if seq <= last then seq = last + 1 end
+local stamp = string.format('%d', seq)
+redis.call('SET', KEYS[1], stamp)
+"""
+
+# KEYS: clock, submission hash, dirty set; ARGV: question id, content, submission id
+_PUT_LUA = _CLOCK_LUA + """
+redis.call('HSET', KEYS[2], ARGV[1], stamp .. ':' .. ARGV[2])
+redis.call('SADD', KEYS[3], ARGV[3])
+return stamp
+"""
+
+
+def _unstamp(value: str) -> tuple[int, str]:
+    seq, _, content = value.partition(":")
+    return int(seq), content
+
+
+class RedisAnswerBuffer:
+    """Redis buffer shared across workers: one hash per submission plus a set of dirty submissions.
+
+    Hash values are ``"<save_seq>:<content>"``; stamps come from one Redis clock so they order writes
+    accepted by different workers.
+    """
+
+    DIRTY_KEY = "autosave:dirty"
+    CLOCK_KEY = "autosave:clock"
+
+    def __init__(self, redis) -> None:
+        self._redis = redis
+
+    @staticmethod
+    def _key(submission_id: int) -> str:
+        return f"autosave:sub:{submission_id}"
+
+    async def clock(self) -> int:
+        return int(await self._redis.eval(_CLOCK_LUA + "return stamp", 1, self.CLOCK_KEY))
+
+    async def put(self, submission_id: int, question_id: int, content: str) -> None:
+        await self._redis.eval(
+            _PUT_LUA, 3, self.CLOCK_KEY, self._key(submission_id), self.DIRTY_KEY, str(question_id), content, submission_id
+        )
+
+    async def pending(self, submission_id: int) -> dict[int, str]:
+        items = await self._redis.hgetall(self._key(submission_id))
+        return {int(q): _unstamp(v)[1] for q, v in items.items()}
+
+    async def pending_questions(self, submission_ids: list[int]) -> dict[int, set[int]]:
+        """Buffered question ids per submission (HKEYS only: the monitor needs no contents)."""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for sid in submission_ids:
+                pipe.hkeys(self._key(sid))
+            found = await pipe.execute()
+        return {sid: {int(q) for q in qids} for sid, qids in zip(submission_ids, found) if qids}
+
+    async def _take(self, submission_id: int) -> list[Row]:
+        # HGETALL + DEL in one MULTI so no write can slip in between and be lost
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self._key(submission_id))
+            pipe.delete(self._key(submission_id))
+            items, _ = await pipe.execute()
+        return _rows(submission_id, {q: _unstamp(v) for q, v in items.items()})
+
+    async def drain(self, limit: int = AUTOSAVE_MAX_BATCH) -> list[Row]:
+        rows: list[Row] = []
+        while len(rows) < limit:
+            sids = await self._redis.spop(self.DIRTY_KEY, 100)
+            if not sids:
+                break
+            for sid in sids:
+                rows.extend(await self._take(int(sid)))
+        return rows
+
+    async def drain_submission(self, submission_id: int) -> list[Row]:
+        await self._redis.srem(self.DIRTY_KEY, submission_id)
+        return await self._take(submission_id)
+
+    async def restore(self, rows: list[Row]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for r in rows:
+                pipe.hsetnx(self._key(r["submission_id"]), str(r["question_id"]), f"{r['save_seq']}:{r['content']}")
+                pipe.sadd(self.DIRTY_KEY, r["submission_id"])
+            await pipe.execute()
+
+
+def build_buffer(mode: str = AUTOSAVE_MODE):
+    if mode == "memory":
+        return MemoryAnswerBuffer()
+    if mode == "redis":
+        from ..redis_client import get_redis
+
+        return RedisAnswerBuffer(get_redis())
+    return None
+
+
+answer_buffer = build_buffer()
+
+
+async def next_seq() -> int:
+    """``save_seq`` for an answer written straight to the database (same clock as buffered writes)."""
+    if answer_buffer is not None:
+        return await answer_buffer.clock()
+    return local_seq()
+
+
+def answers_upsert_stmt(rows: list[Row]):
+    """``INSERT ... ON CONFLICT (submission_id, question_id) DO UPDATE`` for the active dialect.
+
+    The update only applies when the incoming ``save_seq`` is newer than the stored one.
+    """
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        insert = postgresql.insert
+    elif dialect == "sqlite":
+        insert = sqlite.insert
+    else:
+        raise RuntimeError(f"bulk answer upsert not supported on {dialect}")
+    stmt = insert(Answer).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[Answer.submission_id, Answer.question_id],
+        set_={"content": stmt.excluded.content, "save_seq": stmt.excluded.save_seq},
+        where=Answer.save_seq.is_(None) | (Answer.save_seq < stmt.excluded.save_seq),
+    )
+
+
+async def bulk_upsert_answers(db, rows: list[Row]) -> None:
+    """Upsert ``rows`` in a single statement; the caller commits."""
+    if rows:
+        await db.execute(answers_upsert_stmt(rows))
+
+
+async def flush_submission(db, submission_id: int) -> None:
+    """Move any buffered answers of one submission into ``db``'s transaction (used by submit)."""
+    if answer_buffer is None:
+        return
+    rows = await answer_buffer.drain_submission(submission_id)
+    try:
+        await bulk_upsert_answers(db, rows)
+    except Exception:
+        await answer_buffer.restore(rows)
+        raise
+
+
+async def flush_all() -> int:
+    """Drain the buffer into the database; returns the number of rows written."""
+    if answer_buffer is None:
+        return 0
+    written = 0
+    while True:
+        rows = await answer_buffer.drain()
+        if not rows:
+            return written
+        try:
+            written += await _write_batch(rows)
+        except Exception:
+            await answer_buffer.restore(rows)
+            raise
+
+
+async def _open_rows(db, rows: list[Row]) -> list[Row]:
+    """``rows`` minus autosaves stamped after their submission was submitted."""
+    submitted = dict(
+        (
+            await db.execute(
+                select(Submission.id, Submission.submitted_at).where(
+                    Submission.id.in_({r["submission_id"] for r in rows}), Submission.submitted_at.is_not(None)
+                )
+            )
+        ).all()
+    )
+    if not submitted:
+        return rows
+    cutoff = {sid: datetime_to_seq(at) for sid, at in submitted.items()}
+    kept = [r for r in rows if r["save_seq"] <= cutoff.get(r["submission_id"], r["save_seq"])]
+    if len(kept) < len(rows):
+        logger.info("dropping %s autosaves made after submit", len(rows) - len(kept))
+    return kept
+
+
+async def _write_batch(rows: list[Row]) -> int:
+    try:
+        async with async_session_scope() as db:
+            rows = await _open_rows(db, rows)
+            await bulk_upsert_answers(db, rows)
+            await db.commit()
+        return len(rows)
+    except IntegrityError:
+        pass
+    # A question or submission was deleted after the answer was buffered: retry row by row
+    # and drop the orphans instead of re-buffering them forever.
+    written = 0
+    async with async_session_scope() as db:
+        for row in rows:
+            try:
+                await bulk_upsert_answers(db, [row])
+                await db.commit()
+                written += 1
+            except IntegrityError:
+                await db.rollback()
+                logger.warning("dropping orphaned autosave %s/%s", row["submission_id"], row["question_id"])
+    return written
+
+
+class AutosaveFlusher:
+    """Background task that flushes the buffer on a fixed interval."""
+
+    def __init__(self, interval_ms: int = AUTOSAVE_FLUSH_INTERVAL_MS) -> None:
+        self.interval = interval_ms / 1000.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await flush_all()
+            except Exception:  # noqa: BLE001
+                logger.exception("autosave flush failed; rows re-buffered")
+
+    def start(self) -> None:
+        if answer_buffer is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await flush_all()
+
+
+flusher = AutosaveFlusher()
+
+
+class ValidatedAnswerKeys:
+    """Small LRU mapping (submission_id, user_id, question_id) already checked against the DB to the form id.
+
+    Lets repeated autosaves of the same field skip the ownership/question SELECTs.
+    """
+
+    def __init__(self, maxsize: int = 50_000) -> None:
+        self.maxsize = maxsize
+        self._keys: "OrderedDict[tuple[int, int, int], int]" = OrderedDict()
+
+    def get(self, key: tuple[int, int, int]) -> Optional[int]:
+        form_id = self._keys.get(key)
+        if form_id is not None:
+            self._keys.move_to_end(key)
+        return form_id
+
+    def add(self, key: tuple[int, int, int], form_id: int) -> None:
+        self._keys[key] = form_id
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+
+
+validated_keys = ValidatedAnswerKeys()
@@ -0,0 +1,346 @@
+"""Text embeddings for transcript segments and retrieval queries.
+
+``HashingEmbedder`` is a deterministic, dependency-free model: lower-cased word unigrams and
+bigrams are hashed into ``EMBEDDING_DIM`` signed buckets, weighted by ``1 + log(tf)`` and
+L2-normalised, so cosine similarity behaves like a sparse TF bag-of-words overlap. It needs no
+model download and gives identical vectors on every worker, which keeps indexing reproducible.
+Other models plug in through ``register_backend`` and are selected with ``EMBED_MODEL``.
+
+``EmbeddingService`` sits in front of the backend:
+
+- vectors are cached by a hash of ``(model, normalised text)``: a bounded in-process LRU, plus an
+  optional Redis tier (``EMBED_CACHE_REDIS``) shared by API and Celery workers and surviving
+  restarts, so re-indexing a mostly unchanged transcript or a repeated query costs a lookup;
+- concurrent ``embed()`` calls on the event loop are coalesced into micro-batches of at most
+  ``EMBED_BATCH_SIZE`` texts, flushed when full or ``EMBED_BATCH_WAIT_MS`` after the first
+  request; identical texts already queued or being computed share one result.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Optional, Protocol, Sequence
+
+import numpy as np
+
+from ..models.entities import EMBEDDING_DIM
+
+
+logger = logging.getLogger(__name__)
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "hashing-v1")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_MAX_INFLIGHT_BATCHES = int(os.getenv("EMBED_MAX_INFLIGHT_BATCHES", "2"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "20000"))
+EMBED_CACHE_REDIS = os.getenv("EMBED_CACHE_REDIS", "false").lower() == "true"
+EMBED_CACHE_REDIS_TTL_S = int(os.getenv("EMBED_CACHE_REDIS_TTL_S", str(7 * 24 * 3600)))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased word tokens; shared with the lexical (BM25) side of retrieval."""
+    return _WORD.findall(text.lower())
+
+
+def normalize(text: str) -> str:
+    """NFKC and collapsed whitespace: texts differing only in those embed (and cache) identically."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class EmbeddingBackend(Protocol):
+    name: str
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """``(len(texts), dim)`` float32 matrix of unit vectors."""
+        ...
+
+
+class HashingEmbedder:
+    name = "hashing-v1"
+
+    def __init__(self, dim: int = EMBEDDING_DIM) -> None:
+        self.dim = dim
+
+    def _features(self, text: str) -> dict[int, float]:
+        words = tokenize(text)
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        counts: dict[int, float] = {}
+        for g in grams:
+            h = int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "little")
+            bucket, sign = h % self.dim, 1.0 if (h >> 63) & 1 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        return counts
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """``(len(texts), dim)`` float32 matrix of unit vectors (all-zero rows for empty texts)."""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for bucket, tf in self._features(text).items():
+                out[i, bucket] = np.sign(tf) * (1.0 + np.log(abs(tf))) if tf else 0.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+_BACKENDS: dict[str, Callable[[], EmbeddingBackend]] = {HashingEmbedder.name: HashingEmbedder}
+
+
+def register_backend(name: str, factory: Callable[[], EmbeddingBackend]) -> None:
+    """Make ``EMBED_MODEL=<name>`` build its backend with ``factory``."""
+    _BACKENDS[name] = factory
+
+
+_embedder: Optional[EmbeddingBackend] = None
+
+
+def get_embedder() -> EmbeddingBackend:
+    global _embedder
+    if _embedder is None:
+        factory = _BACKENDS.get(EMBED_MODEL)
+        if factory is None:
+            raise RuntimeError(f"unknown EMBED_MODEL {EMBED_MODEL!r}")
+        _embedder = factory()
+    return _embedder
+
+
+# --- cache ---
+
+def cache_key(model: str, text: str) -> str:
+    """Content address of a (normalised) text's vector under ``model``."""
+    return hashlib.blake2b(f"{model}\0{text}".encode(), digest_size=16).hexdigest()
+
+
+class VectorCache:
+    """Thread-safe LRU of ``key -> vector``; hit from the event loop and from flush threads."""
+
+    def __init__(self, maxsize: int = EMBED_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        vector.flags.writeable = False  # shared between callers
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _redis_key(key: str) -> str:
+    return f"emb:{key}"
+
+
+class EmbeddingService:
+    def __init__(
+        self,
+        backend: Optional[EmbeddingBackend] = None,
+        batch_size: int = EMBED_BATCH_SIZE,
+        batch_wait_ms: float = EMBED_BATCH_WAIT_MS,
+        cache_size: int = EMBED_CACHE_SIZE,
+        use_redis: bool = EMBED_CACHE_REDIS,
+    ) -> None:
+        self._backend = backend
+        self.batch_size = batch_size
+        self.batch_wait_s = batch_wait_ms / 1000
+        self.use_redis = use_redis
+        self.cache = VectorCache(cache_size)
+        self.counts = dict.fromkeys(
+            ("requests", "texts", "hits", "redis_hits", "computed", "coalesced", "batches", "batched"), 0
+        )
+        # micro-batching state (event loop only)
+        self._inflight: dict[str, asyncio.Future] = {}  # queued or being computed
+        self._queue: list[tuple[str, str]] = []  # (key, normalised text) awaiting a flush
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def backend(self) -> EmbeddingBackend:
+        if self._backend is None:
+            self._backend = get_embedder()
+        return self._backend
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    def _keys(self, texts: Sequence[str]) -> list[tuple[str, str]]:
+        name = self.name
+        pairs = []
+        for text in texts:
+            norm = normalize(text)
+            pairs.append((cache_key(name, norm), norm))
+        return pairs
+
+    # --- computing misses (blocking; runs in a worker thread or a Celery task) ---
+
+    def _redis_get(self, keys: list[str]) -> list[Optional[bytes]]:
+        from ..redis_client import get_sync_redis
+
+        try:
+            return get_sync_redis().mget([_redis_key(k) for k in keys])
+        except Exception:  # noqa: BLE001 - cache is an optimisation
+            logger.exception("embedding cache read failed")
+            return [None] * len(keys)
+
+    def _redis_put(self, items: list[tuple[str, np.ndarray]]) -> None:
+        from ..redis_client import get_sync_redis
+
+        try:
+            pipe = get_sync_redis().pipeline(transaction=False)
+            for key, vector in items:
+                pipe.set(_redis_key(key), vector.astype(np.float32).tobytes(), ex=EMBED_CACHE_REDIS_TTL_S)
+            pipe.execute()
+        except Exception:  # noqa: BLE001
+            logger.exception("embedding cache write failed")
+
+    def _compute(self, pairs: list[tuple[str, str]]) -> list[np.ndarray]:
+        """Vectors for distinct ``(key, text)`` pairs missing from the LRU: Redis, then the model."""
+        out: list[Optional[np.ndarray]] = [None] * len(pairs)
+        todo = list(range(len(pairs)))
+        if self.use_redis and todo:
+            blobs = self._redis_get([k for k, _ in pairs])
+            todo = []
+            for i, blob in enumerate(blobs):
+                if blob is not None and len(blob) == 4 * self.backend.dim:
+                    out[i] = np.frombuffer(blob, dtype=np.float32).copy()
+                    self.counts["redis_hits"] += 1
+                else:
+                    todo.append(i)
+        computed = []
+        for lo in range(0, len(todo), self.batch_size):
+            chunk = todo[lo : lo + self.batch_size]
+            vectors = self.backend.embed([pairs[i][1] for i in chunk])
+            for i, vector in zip(chunk, vectors):
+                out[i] = vector
+                computed.append((pairs[i][0], vector))
+        self.counts["computed"] += len(computed)
+        if self.use_redis and computed:
+            self._redis_put(computed)
+        for (key, _), vector in zip(pairs, out):
+            self.cache.put(key, vector)
+        return out
+
+    def embed_sync(self, texts: Sequence[str]) -> np.ndarray:
+        """Blocking ``embed`` for the indexing pipeline (no micro-batching: callers already batch)."""
+        pairs = self._keys(texts)
+        self.counts["requests"] += 1
+        self.counts["texts"] += len(pairs)
+        found: dict[str, np.ndarray] = {}
+        missing: dict[str, str] = {}
+        for key, text in pairs:
+            if key in found or key in missing:
+                continue
+            vector = self.cache.get(key)
+            if vector is not None:
+                found[key] = vector
+                self.counts["hits"] += 1
+            else:
+                missing[key] = text
+        if missing:
+            found.update(zip(missing, self._compute(list(missing.items()))))
+        return self._stack([found[k] for k, _ in pairs])
+
+    def _stack(self, vectors: list[np.ndarray]) -> np.ndarray:
+        if not vectors:
+            return np.zeros((0, self.backend.dim), dtype=np.float32)
+        return np.stack(vectors)
+
+    # --- micro-batching (event loop) ---
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """``(len(texts), dim)`` float32 vectors; cache misses join the next micro-batch."""
+        pairs = self._keys(texts)
+        self.counts["requests"] += 1
+        self.counts["texts"] += len(pairs)
+        loop = asyncio.get_running_loop()
+        results: list = []
+        for key, text in pairs:
+            vector = self.cache.get(key)
+            if vector is not None:
+                self.counts["hits"] += 1
+                results.append(vector)
+                continue
+            future = self._inflight.get(key)
+            if future is None or future.get_loop() is not loop:
+                future = loop.create_future()
+                self._inflight[key] = future
+                self._queue.append((key, text))
+            else:
+                self.counts["coalesced"] += 1
+            results.append(future)
+        if len(self._queue) >= self.batch_size:
+            self._flush()
+        elif self._queue and self._timer is None:
+            self._timer = loop.call_later(self.batch_wait_s, self._flush)
+        waiting = [r for r in results if isinstance(r, asyncio.Future)]
+        if waiting:
+            # the futures are shared with other callers: cancelling this one must not cancel them
+            await asyncio.gather(*(asyncio.shield(f) for f in waiting))
+        return self._stack([r.result() if isinstance(r, asyncio.Future) else r for r in results])
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            batch, self._queue = self._queue[: self.batch_size], self._queue[self.batch_size :]
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list[tuple[str, str]]) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(EMBED_MAX_INFLIGHT_BATCHES)
+        try:
+            async with self._slots:
+                self.counts["batches"] += 1
+                self.counts["batched"] += len(batch)
+                vectors = await asyncio.to_thread(self._compute, batch)
+        except BaseException as e:  # noqa: BLE001 - every waiter must be released
+            for key, _ in batch:
+                future = self._inflight.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for (key, _), vector in zip(batch, vectors):
+            future = self._inflight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        counts = dict(self.counts)
+        return {
+            "model": self.name,
+            **counts,
+            "hit_rate": round((counts["hits"] + counts["redis_hits"] + counts["coalesced"]) / counts["texts"], 3)
+            if counts["texts"]
+            else None,
+            "mean_batch": round(counts["batched"] / counts["batches"], 1) if counts["batches"] else None,
+            "cached": len(self.cache),
+            "inflight": len(self._inflight),
+        }
+
+
+embedding_service = EmbeddingService()
@@ -0,0 +1,192 @@
+"""Cached exam payloads for ``GET /forms/{id}/exam``.
+
+The payload (form + ordered questions) is serialized once and kept in-process and in Redis. Its
+version/ETag is derived from ``Form.updated_at``, the newest ``Question.updated_at`` and the question
+count. Form/question mutations call ``invalidate``; other workers hear about it on the
+``cache:invalidate`` pub/sub channel. Local entries also expire after ``EXAM_CACHE_TTL_S`` as a
+safety net for edits made outside the API.
+
+A build that overlaps an invalidation must not be cached. In-process a generation counter guards
+``_local``; in Redis ``invalidate`` bumps ``exam:<id>:gen`` and the payload is only written if that
+counter still has the value read before the build (compare-and-set in a Lua script).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import select
+
+from ..models.entities import Form, Question
+from ..pubsub import broker
+from ..schemas.forms import ExamOut, FormOut
+from ..schemas.questions import QuestionOut
+
+
+logger = logging.getLogger(__name__)
+
+EXAM_CACHE_TTL_S = float(os.getenv("EXAM_CACHE_TTL_S", "300"))
+EXAM_CACHE_REDIS = os.getenv("EXAM_CACHE_REDIS", "false").lower() == "true"
+INVALIDATE_CHANNEL = "cache:invalidate"
+
+# answer keys and grading rubrics live in Question.metadata_json and must never reach students
+EXAM_HIDDEN_METADATA_KEYS = ("answer", "answers", "answer_key", "tolerance", "rubric")
+
+
+class ExamEntry:
+    __slots__ = ("etag", "body", "expires_at")
+
+    def __init__(self, etag: str, body: bytes) -> None:
+        self.etag = etag
+        self.body = body
+        self.expires_at = time.monotonic() + EXAM_CACHE_TTL_S
+
+
+_local: dict[int, ExamEntry] = {}
+# bumped on every invalidation so a build that raced with an edit is not cached
+_generation: dict[int, int] = {}
+
+
+def _redis_key(form_id: int) -> str:
+    return f"exam:{form_id}"
+
+
+def _redis_gen_key(form_id: int) -> str:
+    return f"exam:{form_id}:gen"
+
+
+# KEYS: payload, generation; ARGV: generation read before the build, etag, body, ttl
+_STORE_IF_CURRENT_LUA = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'etag', ARGV[2], 'body', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+def _public_metadata(meta: Optional[dict]) -> Optional[dict]:
+    if not meta:
+        return meta
+    return {k: v for k, v in meta.items() if k not in EXAM_HIDDEN_METADATA_KEYS}
+
+
+async def _build(db, form_id: int) -> Optional[ExamEntry]:
+    form = await db.get(Form, form_id)
+    if form is None:
+        return None
+    questions = (
+        await db.scalars(
+            select(Question).where(Question.form_id == form_id).order_by(Question.created_at.asc(), Question.id.asc())
+        )
+    ).all()
+    newest = max([form.updated_at] + [q.updated_at for q in questions])
+    version = hashlib.sha1(f"{form_id}:{newest.isoformat()}:{len(questions)}".encode()).hexdigest()[:16]
+    payload = ExamOut(
+        version=version,
+        form=FormOut.model_validate(form),
+        questions=[
+            QuestionOut.model_validate(q).model_copy(update={"metadata_json": _public_metadata(q.metadata_json)})
+            for q in questions
+        ],
+    )
+    return ExamEntry(etag=f'W/"{version}"', body=payload.model_dump_json().encode())
+
+
+async def get_exam(db, form_id: int) -> Optional[ExamEntry]:
+    entry = _local.get(form_id)
+    if entry is not None and entry.expires_at > time.monotonic():
+        return entry
+    generation = _generation.get(form_id, 0)
+    redis_generation: Optional[str] = None
+    if EXAM_CACHE_REDIS:
+        from ..redis_client import get_redis
+
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                cached, redis_generation = await pipe.hgetall(_redis_key(form_id)).get(_redis_gen_key(form_id)).execute()
+            if cached:
+                entry = ExamEntry(cached["etag"], cached["body"].encode())
+                _local[form_id] = entry
+                return entry
+        except Exception:  # noqa: BLE001 - cache is an optimisation
+            logger.exception("exam cache read failed")
+    entry = await _build(db, form_id)
+    if entry is None or _generation.get(form_id, 0) != generation:
+        return entry
+    _local[form_id] = entry
+    if EXAM_CACHE_REDIS:
+        from ..redis_client import get_redis
+
+        try:
+            await get_redis().eval(
+                _STORE_IF_CURRENT_LUA,
+                2,
+                _redis_key(form_id),
+                _redis_gen_key(form_id),
+                redis_generation or "0",
+                entry.etag,
+                entry.body.decode(),
+                int(EXAM_CACHE_TTL_S),
+            )
+        except Exception:  # noqa: BLE001
+            logger.exception("exam cache write failed")
+    return entry
+
+
+def _drop_local(form_id: int) -> None:
+    _generation[form_id] = _generation.get(form_id, 0) + 1
+    _local.pop(form_id, None)
+
+
+async def invalidate(form_id: int) -> None:
+    _drop_local(form_id)
+    if EXAM_CACHE_REDIS:
+        from ..redis_client import get_redis
+
+        try:
+            # bump first: a build that read the old generation can no longer store its payload
+            async with get_redis().pipeline(transaction=True) as pipe:
+                await pipe.incr(_redis_gen_key(form_id)).delete(_redis_key(form_id)).execute()
+        except Exception:  # noqa: BLE001
+            logger.exception("exam cache delete failed")
+    await broker.publish(INVALIDATE_CHANNEL, "exam.invalidated", {"form_id": form_id})
+
+
+class InvalidationListener:
+    """Drops local entries when any worker invalidates a form (or a question's hint context)."""
+
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        async with broker.subscribe([INVALIDATE_CHANNEL]) as sub:
+            async for msg in sub:
+                if msg["event"] == "exam.invalidated":
+                    form_id = (msg["data"] or {}).get("form_id")
+                    if form_id is not None:
+                        _drop_local(form_id)
+                elif msg["event"] == "hint.invalidated":
+                    from . import hint
+
+                    for question_id in (msg["data"] or {}).get("question_ids") or []:
+                        hint.forget_question(question_id)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+invalidation_listener = InvalidationListener()
@@ -0,0 +1,137 @@
+"""Chunked grading runs: plan, checkpoint and report progress.
+
+A ``GradingRun`` splits a form's submitted submissions into ``GradingChunk``s of
+``GRADING_CHUNK_SIZE``. The Celery side (``apps.workers.tasks``) fans the pending chunks out as a
+chord: one ``grading.chunk`` task per chunk, then ``grading.finalize``. A chunk's scores and its
+``done`` mark are committed in one transaction. A worker that dies mid-chunk therefore leaves
+nothing half-recorded: ``acks_late`` redelivers just that chunk, and a resumed run dispatches only
+the chunks that are not done.
+
+After every chunk the aggregated snapshot is published on ``grading_channel(run_id)``; the API
+streams it to tutors over SSE.
+"""
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import case, func, select, update
+
+from ..models.entities import GradingChunk, GradingRun, Submission
+from ..pubsub import broker, grading_channel
+from . import assessment
+
+
+logger = logging.getLogger(__name__)
+
+GRADING_CHUNK_SIZE = int(os.getenv("GRADING_CHUNK_SIZE", "200"))  # submissions per chunk task
+
+
+def plan_chunks(db, run_id: int) -> list[GradingChunk]:
+    """The run's chunks, creating them on first call (later calls reuse the plan)."""
+    run = db.get(GradingRun, run_id)
+    if run is None:
+        raise LookupError(f"grading run {run_id} not found")
+    chunks = db.scalars(select(GradingChunk).where(GradingChunk.run_id == run_id).order_by(GradingChunk.seq)).all()
+    if not chunks:
+        ids = db.scalars(
+            select(Submission.id)
+            .where(Submission.form_id == run.form_id, Submission.submitted_at.is_not(None))
+            .order_by(Submission.id)
+        ).all()
+        chunks = [
+            GradingChunk(run_id=run_id, seq=i, submission_ids=list(ids[lo : lo + run.chunk_size]))
+            for i, lo in enumerate(range(0, len(ids), run.chunk_size))
+        ]
+        db.add_all(chunks)
+        run.chunks_total = len(chunks)
+    run.status = "running"
+    run.finished_at = None
+    db.commit()
+    return chunks
+
+
+def snapshot_stmt(run_id: int):
+    """Aggregate progress of a run (``chunks_done``, ``chunks_failed``, answers/updated/correct)."""
+    done = GradingChunk.status == "done"
+    return select(
+        func.count(case((done, 1))).label("chunks_done"),
+        func.count(case((GradingChunk.status == "failed", 1))).label("chunks_failed"),
+        func.coalesce(func.sum(case((done, GradingChunk.answers), else_=0)), 0).label("answers"),
+        func.coalesce(func.sum(case((done, GradingChunk.updated), else_=0)), 0).label("updated"),
+        func.coalesce(func.sum(case((done, GradingChunk.correct), else_=0)), 0).label("correct"),
+    ).where(GradingChunk.run_id == run_id)
+
+
+def snapshot(run: GradingRun, agg) -> dict:
+    total = run.chunks_total or 0
+    return {
+        "run_id": run.id,
+        "form_id": run.form_id,
+        "status": run.status,
+        "chunks_total": total,
+        "chunks_done": agg.chunks_done,
+        "chunks_failed": agg.chunks_failed,
+        "percent": round(100 * agg.chunks_done / total, 1) if total else (100.0 if run.status == "done" else 0.0),
+        "answers": int(agg.answers),
+        "updated": int(agg.updated),
+        "correct": int(agg.correct),
+        "created_at": run.created_at,
+        "finished_at": run.finished_at,
+    }
+
+
+def publish_progress(db, run_id: int, event: str = "grading.progress") -> dict:
+    run = db.get(GradingRun, run_id)
+    db.refresh(run)
+    data = snapshot(run, db.execute(snapshot_stmt(run_id)).one())
+    broker.publish_sync(grading_channel(run_id), event, data)
+    return data
+
+
+def grade_chunk(db, chunk_id: int) -> dict:
+    """Grade one chunk; a chunk already ``done`` (redelivery, resumed run) is not graded again."""
+    chunk = db.get(GradingChunk, chunk_id)
+    if chunk is None:
+        raise LookupError(f"grading chunk {chunk_id} not found")
+    if chunk.status != "done":
+        run = db.get(GradingRun, chunk.run_id)
+        chunk.attempts += 1
+        result = assessment.grade_form(db, run.form_id, submission_ids=chunk.submission_ids, commit=False)
+        rubric = assessment.grade_rubric(db, run.form_id, submission_ids=chunk.submission_ids, commit=False)
+        if rubric["failed"]:
+            logger.warning("grading chunk %s: %s rubric answers left unscored", chunk_id, rubric["failed"])
+        chunk.status = "done"
+        chunk.answers = result["answers"] + rubric["answers"]
+        chunk.updated = result["updated"] + rubric["graded"]
+        chunk.correct = result["correct"]
+        chunk.error = None
+        chunk.finished_at = datetime.utcnow()
+        db.commit()  # scores + checkpoint together
+    publish_progress(db, chunk.run_id)
+    return {"chunk_id": chunk.id, "seq": chunk.seq, "answers": chunk.answers, "updated": chunk.updated}
+
+
+def fail_chunk(db, chunk_id: int, error: str) -> None:
+    """Record a chunk that ran out of retries; the run is failed and can be resumed."""
+    db.rollback()
+    chunk = db.get(GradingChunk, chunk_id)
+    if chunk is None:
+        return
+    chunk.status = "failed"
+    chunk.error = error[:2000]
+    db.execute(update(GradingRun).where(GradingRun.id == chunk.run_id).values(status="failed", finished_at=datetime.utcnow()))
+    db.commit()
+    publish_progress(db, chunk.run_id, "grading.failed")
+
+
+def finish_run(db, run_id: int) -> dict:
+    run = db.get(GradingRun, run_id)
+    agg = db.execute(snapshot_stmt(run_id)).one()
+    run.status = "done" if agg.chunks_done == run.chunks_total else "failed"
+    run.finished_at = datetime.utcnow()
+    run.summary_json = {k: int(v) for k, v in agg._mapping.items()}
+    db.commit()
+    data = publish_progress(db, run_id, "grading.finished")
+    logger.info("grading run %s (form %s): %s", run_id, run.form_id, run.summary_json)
+    return data
+
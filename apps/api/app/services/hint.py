@@ -0,0 +1,354 @@
+"""Hint generation for ``/realtime/hint`` (SSE) and ``/realtime/ws/hint``.
+
+A hint is written by the language model from the question (prompt and, for MCQ, its choices), the
+stage of the hint ladder (1: what the question asks, 2: a strategy, 3: a pointer at the student's
+own work) and the student's partial answer. It is streamed token by token, and answer keys and
+rubrics never enter the prompt.
+
+Identical requests in flight share one generation. The key is the question, the stage and the
+answer text with case, whitespace and punctuation folded away, so 200 students stuck on the same
+question with the same (often empty) answer cost one model call. A subscriber replays the tokens
+generated so far, then follows live. When the last subscriber goes away (client disconnected,
+superseded WS request), the generation is cancelled, which closes the provider stream.
+
+The first ``HINT_PRECOMPUTED_STAGES`` stages ignore the student's answer, so they are the same for
+everyone. ``precompute_ladders`` (Celery ``hints.precompute``, queued when a form or question is
+created or a question's hint-relevant content changes) generates them ahead of time and stores a
+``HintLadder`` keyed by the question's ``hint_version``, a hash of its type, prompt and choices and of
+the hint prompt template and model. Those stages are then served from the cached ladder; live
+generation is left to the personalised later stages and to questions whose ladder is not ready yet.
+An edit changes the version, so an outdated ladder never matches. The edit also drops the
+question's cached context on every API process (``hint.invalidated`` on ``cache:invalidate``), and
+the next pipeline run deletes the outdated rows.
+
+Without a model (``LLM_PROVIDER=none``) the fixed ladder in ``STATIC_HINTS`` is streamed instead.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import AsyncIterator, Iterable, NamedTuple, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from ..models.db import async_session_scope
+from ..models.entities import HintLadder, Question
+from ..pubsub import broker
+from . import llm
+from .exam_cache import INVALIDATE_CHANNEL
+
+
+logger = logging.getLogger(__name__)
+
+HINT_STAGES = 3
+HINT_MAX_TOKENS = int(os.getenv("HINT_MAX_TOKENS", "120"))
+HINT_MAX_INPUT_CHARS = int(os.getenv("HINT_MAX_INPUT_CHARS", "2000"))  # of the student's answer
+HINT_QUESTION_TTL_S = float(os.getenv("HINT_QUESTION_TTL_S", "60"))
+HINT_PRECOMPUTED_STAGES = int(os.getenv("HINT_PRECOMPUTED_STAGES", "2"))  # stages that ignore the answer
+
+STATIC_HINTS = (
+    "Düşün: Soru ne istiyor? Ana kavramı belirle.",
+    "İpucu: Verilenleri yaz ve aradığını sembolleştir.",
+    "Yönlendirme: Bir önceki adımı kontrol et ve küçük bir örnek dene.",
+)
+
+STAGE_INSTRUCTIONS = (
+    "Stage 1 of 3: only help the student see what the question is asking and which concept it is about.",
+    "Stage 2 of 3: suggest a strategy or first step, without carrying it out.",
+    "Stage 3 of 3: look at the student's answer so far and point at the next step or the mistake in it.",
+)
+
+HINT_SYSTEM = (
+    "You are a patient tutor giving a student a hint during an exam. Never state the answer or a "
+    "value that gives it away. Reply in the language of the question, in at most two short sentences."
+)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class QuestionContext(NamedTuple):
+    id: int
+    form_id: int
+    type: str
+    prompt: str
+    choices: tuple[str, ...]
+    version: str  # hint_version()
+    ladder: tuple[str, ...] = ()  # precomputed stages for this version, stage 1 first
+
+
+def hint_version(type_: str, prompt: str, choices: Iterable[str]) -> str:
+    """Changes whenever a precomputed hint could: question content, hint prompt template or model."""
+    raw = json.dumps([type_, prompt, list(choices), HINT_SYSTEM, STAGE_INSTRUCTIONS, llm.LLM_MODEL])
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def question_context(q: Question, ladder: tuple[str, ...] = ()) -> QuestionContext:
+    choices = tuple(str(c) for c in ((q.metadata_json or {}).get("choices") or ())) if q.type == "mcq" else ()
+    return QuestionContext(q.id, q.form_id, q.type, q.prompt, choices, hint_version(q.type, q.prompt, choices), ladder)
+
+
+def fold(text: str) -> str:
+    """Answer text as far as coalescing cares: case, whitespace and punctuation removed."""
+    return " ".join(_WORD.findall(text[:HINT_MAX_INPUT_CHARS].casefold()))
+
+
+def coalesce_key(question_id: Optional[int], stage: int, text: str) -> str:
+    raw = f"{question_id}\0{stage}\0{fold(text)}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+_questions: dict[int, tuple[float, Optional[QuestionContext]]] = {}
+_loading: dict[int, asyncio.Task] = {}
+
+
+async def _read_question(question_id: int) -> Optional[QuestionContext]:
+    async with async_session_scope() as db:
+        q = await db.get(Question, question_id)
+        if q is None:
+            return None
+        context = question_context(q)
+        stages = await db.scalar(
+            select(HintLadder.stages).where(HintLadder.question_id == question_id, HintLadder.version == context.version)
+        )
+    return context._replace(ladder=tuple(stages or ()))
+
+
+async def _load(question_id: int) -> Optional[QuestionContext]:
+    try:
+        context = await _read_question(question_id)
+    finally:
+        del _loading[question_id]
+    _questions[question_id] = (time.monotonic() + HINT_QUESTION_TTL_S, context)
+    return context
+
+
+async def load_question(question_id: int) -> Optional[QuestionContext]:
+    """The question's hint context, cached for ``HINT_QUESTION_TTL_S``; concurrent misses share one read.
+
+    The read runs in a task no caller owns: a caller that goes away (closed WebSocket) only stops
+    waiting, and the others still get the context. A failed read fails its waiters; the next call retries.
+    """
+    cached = _questions.get(question_id)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    task = _loading.get(question_id)
+    if task is None:
+        task = _loading[question_id] = asyncio.create_task(_load(question_id))
+        # retrieved: no "never retrieved" warning when every waiter went away before a failure
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return await asyncio.shield(task)
+
+
+def forget_question(question_id: int) -> None:
+    _questions.pop(question_id, None)
+
+
+async def invalidate(question_ids: list[int]) -> None:
+    """Drop cached question contexts here and, via ``cache:invalidate``, on every other API process."""
+    for question_id in question_ids:
+        forget_question(question_id)
+    await broker.publish(INVALIDATE_CHANNEL, "hint.invalidated", {"question_ids": question_ids})
+
+
+async def queue_ladders(form_id: Optional[int] = None, question_ids: Optional[list[int]] = None) -> None:
+    """Queue ``hints.precompute``; a no-op without a model. Editing must not fail on a broker outage."""
+    if not llm.llm_enabled():
+        return
+    from apps.workers.tasks import precompute_hints
+
+    try:
+        # a broker round-trip: off the event loop, so a slow broker does not stall other connections
+        await asyncio.to_thread(precompute_hints.delay, form_id=form_id, question_ids=question_ids)
+    except Exception:  # noqa: BLE001 - hints fall back to live generation
+        logger.exception("could not queue hint ladders (form %s, questions %s)", form_id, question_ids)
+
+
+def hint_messages(question: Optional[QuestionContext], stage: int, text: str) -> list[llm.Message]:
+    parts = []
+    if question is not None:
+        parts.append(f"Question:\n{question.prompt}")
+        if question.choices:
+            parts.append("Choices:\n" + "\n".join(f"{chr(65 + i)}) {c}" for i, c in enumerate(question.choices)))
+    answer = text[:HINT_MAX_INPUT_CHARS].strip()
+    parts.append(f"Student's answer so far:\n{answer}" if answer else "The student has not written anything yet.")
+    parts.append(STAGE_INSTRUCTIONS[stage - 1])
+    return [{"role": "system", "content": HINT_SYSTEM}, {"role": "user", "content": "\n\n".join(parts)}]
+
+
+def _tokens(text: str) -> Iterable[str]:
+    """Stored text in the shape of a model stream: word by word, spaces leading."""
+    for i, word in enumerate(text.split(" ")):
+        yield (" " if i else "") + word
+
+
+class _Generation:
+    """One hint being generated; any number of subscribers follow its tokens."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.tokens: list[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def push(self, token: str) -> None:
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self) -> AsyncIterator[str]:
+        sent = 0
+        while True:
+            while sent < len(self.tokens):
+                sent += 1
+                yield self.tokens[sent - 1]
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class HintService:
+    def __init__(self) -> None:
+        self._inflight: dict[str, _Generation] = {}
+        self.counts = {"requests": 0, "precomputed": 0, "generations": 0, "coalesced": 0, "cancelled": 0, "failed": 0}
+
+    async def stream(self, question_id: Optional[int], stage: int, text: str) -> AsyncIterator[str]:
+        """Hint tokens for this request, sharing the generation of an identical one in flight."""
+        stage = min(max(stage, 1), HINT_STAGES)
+        self.counts["requests"] += 1
+        if stage <= HINT_PRECOMPUTED_STAGES:
+            text = ""  # the same hint for everyone, and one coalescing key per question
+            question = await load_question(question_id) if question_id is not None else None
+            if question is not None and len(question.ladder) >= stage:
+                self.counts["precomputed"] += 1
+                for token in _tokens(question.ladder[stage - 1]):
+                    yield token
+                return
+        key = coalesce_key(question_id, stage, text)
+        gen = self._inflight.get(key)
+        if gen is None:
+            gen = self._inflight[key] = _Generation(key)
+            gen.task = asyncio.create_task(self._generate(gen, question_id, stage, text))
+            self.counts["generations"] += 1
+        else:
+            self.counts["coalesced"] += 1
+        gen.subscribers += 1
+        try:
+            async for token in gen.follow():
+                yield token
+        finally:
+            gen.subscribers -= 1
+            if gen.subscribers == 0 and not gen.done:
+                # nobody is listening any more: stop paying for tokens, and let new requests start afresh
+                self._forget(gen)
+                gen.task.cancel()
+                self.counts["cancelled"] += 1
+
+    def _forget(self, gen: _Generation) -> None:
+        if self._inflight.get(gen.key) is gen:
+            del self._inflight[gen.key]
+
+    async def _generate(self, gen: _Generation, question_id: Optional[int], stage: int, text: str) -> None:
+        try:
+            if not llm.llm_enabled():
+                for token in _tokens(STATIC_HINTS[stage - 1]):
+                    gen.push(token)
+                    await asyncio.sleep(0)
+            else:
+                question = await load_question(question_id) if question_id is not None else None
+                messages = hint_messages(question, stage, text)
+                async for token in llm.get_llm().stream(messages, max_tokens=HINT_MAX_TOKENS, temperature=0.3):
+                    gen.push(token)
+            gen.finish()
+        except asyncio.CancelledError as e:
+            gen.finish(e)
+            raise
+        except Exception as e:  # noqa: BLE001 - surfaced to every subscriber
+            self.counts["failed"] += 1
+            logger.warning("hint generation failed (question %s, stage %s): %r", question_id, stage, e)
+            gen.finish(e)
+        finally:
+            self._forget(gen)
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), **self.counts}
+
+
+hint_service = HintService()
+
+
+async def _generate_ladders(questions: list[QuestionContext]) -> list:
+    client = llm.get_llm()
+
+    async def ladder(question: QuestionContext) -> list[str]:
+        replies = await asyncio.gather(
+            *(
+                client.complete(hint_messages(question, stage, ""), max_tokens=HINT_MAX_TOKENS, temperature=0.3)
+                for stage in range(1, HINT_PRECOMPUTED_STAGES + 1)
+            )
+        )
+        return [r.text.strip() for r in replies]
+
+    return await llm.gather_limited([lambda q=q: ladder(q) for q in questions])
+
+
+def precompute_ladders(db, form_id: Optional[int] = None, question_ids: Optional[list[int]] = None) -> dict:
+    """Generate the missing ladders of a form's (or the given) questions; ``db`` is a sync ``Session``.
+
+    Questions whose current version already has a ladder cost nothing, so re-running after any edit
+    is cheap. Ladders of outdated versions are deleted.
+    """
+    summary = {"questions": 0, "generated": 0, "failed": 0}
+    if not llm.llm_enabled() or HINT_PRECOMPUTED_STAGES < 1 or (form_id is None and not question_ids):
+        return summary
+    stmt = select(Question)
+    if form_id is not None:
+        stmt = stmt.where(Question.form_id == form_id)
+    if question_ids:
+        stmt = stmt.where(Question.id.in_(question_ids))
+    contexts = [question_context(q) for q in db.scalars(stmt)]
+    summary["questions"] = len(contexts)
+    if not contexts:
+        return summary
+    ids = [c.id for c in contexts]
+    have = set(db.execute(select(HintLadder.question_id, HintLadder.version).where(HintLadder.question_id.in_(ids))).all())
+    for c in contexts:
+        db.execute(delete(HintLadder).where(HintLadder.question_id == c.id, HintLadder.version != c.version))
+    db.commit()
+
+    todo = [c for c in contexts if (c.id, c.version) not in have]
+    results = llm.run(_generate_ladders(todo)) if todo else []
+    written = []
+    for c, stages in zip(todo, results):
+        if isinstance(stages, Exception):
+            summary["failed"] += 1
+            logger.warning("hint ladder for question %s failed: %r", c.id, stages)
+            continue
+        db.add(HintLadder(question_id=c.id, version=c.version, stages=stages, model=llm.LLM_MODEL))
+        try:
+            db.commit()
+        except IntegrityError:  # a concurrent run stored this version first, or the question is gone
+            db.rollback()
+            continue
+        written.append(c.id)
+    summary["generated"] = len(written)
+    if written:
+        broker.publish_sync(INVALIDATE_CHANNEL, "hint.invalidated", {"question_ids": written})
+    logger.info("hint ladders (form %s, questions %s): %s", form_id, question_ids, summary)
+    return summary
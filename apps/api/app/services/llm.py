@@ -0,0 +1,473 @@
+"""Async client for the language model behind rubric grading and hints.
+
+Grading an open answer or writing a hint is one HTTP round trip that mostly waits on the provider.
+``LLMClient`` runs those calls as coroutines, so one process keeps many of them in flight:
+
+- providers plug in through ``register_provider`` and are selected with ``LLM_PROVIDER``;
+  ``openai`` speaks the OpenAI-compatible ``/chat/completions`` API (also served by vLLM, Ollama,
+  LiteLLM and the local fake in ``apps.api.benchmarks.fake_llm``); ``none`` disables model features;
+- two ``TokenBucket``s cap requests (``LLM_RPM``) and tokens (``LLM_TPM``) per minute. A call
+  reserves its prompt estimate plus ``max_tokens`` and settles against the reported usage;
+- ``AdaptiveLimiter`` bounds calls in flight: +1 per window of successes, halved when the provider
+  pushes back (429/503/timeout), so concurrency settles just under what the provider accepts,
+  whatever the number of processes sharing its quota;
+- retryable failures back off exponentially with full jitter, at least ``Retry-After``; a stream
+  is retried only until its first text delta has been handed out.
+
+The buckets, limiter and HTTP pool belong to one event loop: ``get_llm()`` returns the running
+loop's client. Sync callers (Celery prefork tasks) use ``run()``, which submits a coroutine to the
+process's single background loop, so one task can ``gather`` hundreds of calls instead of blocking
+a whole worker process per call.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, NamedTuple, Optional, Protocol, TypeVar
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "none").lower()
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:8089/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+LLM_RPM = float(os.getenv("LLM_RPM", "500"))  # 0 = unlimited
+LLM_TPM = float(os.getenv("LLM_TPM", "200000"))  # 0 = unlimited
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "8"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_S = float(os.getenv("LLM_RETRY_BASE_S", "0.5"))
+LLM_RETRY_MAX_S = float(os.getenv("LLM_RETRY_MAX_S", "30"))
+BUCKET_BURST_S = 10  # buckets hold this many seconds of budget
+
+Message = dict[str, str]
+T = TypeVar("T")
+
+
+class LLMError(Exception):
+    """The provider rejected the call, or it kept failing after retries."""
+
+
+class LLMUnavailable(LLMError):
+    """No provider configured (``LLM_PROVIDER=none``)."""
+
+
+class RetryableError(LLMError):
+    """A failure worth retrying; ``overload`` ones (429, 503, timeouts) also shrink concurrency."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, overload: bool = False) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.overload = overload
+
+
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    model: str
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for budgeting before the provider reports usage."""
+    return len(text) // 4 + 1
+
+
+class Provider(Protocol):
+    name: str
+
+    async def complete(
+        self, http: httpx.AsyncClient, messages: list[Message], max_tokens: int, temperature: float
+    ) -> Completion: ...
+
+    def stream(
+        self, http: httpx.AsyncClient, messages: list[Message], max_tokens: int, temperature: float
+    ) -> AsyncIterator[str]:
+        """Text deltas as the model produces them."""
+        ...
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:  # HTTP-date form: not worth parsing, the jittered backoff applies
+        return None
+
+
+def raise_for_status(response: httpx.Response) -> None:
+    if response.status_code < 400:
+        return
+    message = f"{response.status_code} from provider: {response.text[:300]}"
+    retry_after = _retry_after(response.headers.get("retry-after"))
+    if response.status_code in (429, 503, 529):
+        raise RetryableError(message, retry_after, overload=True)
+    if response.status_code in (408, 409) or response.status_code >= 500:
+        raise RetryableError(message, retry_after)
+    raise LLMError(message)
+
+
+class OpenAICompatibleProvider:
+    name = "openai"
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str = LLM_API_KEY, model: str = LLM_MODEL) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    async def complete(
+        self, http: httpx.AsyncClient, messages: list[Message], max_tokens: int, temperature: float
+    ) -> Completion:
+        payload = {"model": self.model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+        try:
+            response = await http.post(f"{self.base_url}/chat/completions", json=payload, headers=self.headers)
+        except httpx.TimeoutException as e:
+            raise RetryableError(f"timeout: {e!r}", overload=True) from e
+        except httpx.TransportError as e:
+            raise RetryableError(f"transport: {e!r}") from e
+        raise_for_status(response)
+        body = response.json()
+        text = body["choices"][0]["message"].get("content") or ""
+        usage = body.get("usage") or {}
+        return Completion(
+            text,
+            int(usage.get("prompt_tokens") or sum(estimate_tokens(m["content"]) for m in messages)),
+            int(usage.get("completion_tokens") or estimate_tokens(text)),
+            body.get("model") or self.model,
+        )
+
+    async def stream(
+        self, http: httpx.AsyncClient, messages: list[Message], max_tokens: int, temperature: float
+    ) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature, "stream": True}
+        try:
+            async with http.stream("POST", f"{self.base_url}/chat/completions", json=payload, headers=self.headers) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    raise_for_status(response)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        return
+                    choices = json.loads(data).get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+        except httpx.TimeoutException as e:
+            raise RetryableError(f"timeout: {e!r}", overload=True) from e
+        except httpx.TransportError as e:
+            raise RetryableError(f"transport: {e!r}") from e
+
+
+_PROVIDERS: dict[str, Callable[[], Provider]] = {"openai": OpenAICompatibleProvider}
+
+
+def register_provider(name: str, factory: Callable[[], Provider]) -> None:
+    _PROVIDERS[name] = factory
+
+
+def get_provider(name: str = LLM_PROVIDER) -> Optional[Provider]:
+    if name in ("", "none"):
+        return None
+    try:
+        return _PROVIDERS[name]()
+    except KeyError:
+        raise ValueError(f"unknown LLM_PROVIDER {name!r}; registered: {sorted(_PROVIDERS)}") from None
+
+
+class TokenBucket:
+    """``rate`` units per second, holding at most ``capacity``; ``rate <= 0`` means unlimited.
+
+    Waiters are served in arrival order, so a large reservation is not starved by small ones.
+    ``settle`` corrects a reservation once the real cost is known and may leave the level negative,
+    which simply delays later callers.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> None:
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)  # more than the bucket holds would wait forever
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                await asyncio.sleep((amount - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+
+    def settle(self, delta: float) -> None:
+        """Charge ``delta`` more (or refund, if negative) than was acquired."""
+        if self.rate > 0:
+            self._refill()
+            self.level = min(self.capacity, self.level - delta)
+
+
+class AdaptiveLimiter:
+    """AIMD bound on calls in flight, between ``minimum`` and ``maximum``.
+
+    Every success adds ``1 / limit`` (about +1 per window of calls); an overload signal halves the
+    limit, at most once per typical call latency, so one burst of 429s counts as one signal.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.inflight = 0
+        self.latency = 1.0  # EWMA seconds
+        self._quiet_until = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        while self.inflight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._wake()  # pass on a wake-up this waiter may have consumed
+                raise
+        self.inflight += 1
+
+    def release(self, outcome: str, latency: float) -> None:
+        """``outcome``: ``ok``, ``overload`` or anything else (neutral)."""
+        self.inflight -= 1
+        now = time.monotonic()
+        if outcome == "ok":
+            self.latency += 0.2 * (latency - self.latency)
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        elif outcome == "overload" and now >= self._quiet_until:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._quiet_until = now + self.latency
+        self._wake()
+
+    def _wake(self) -> None:
+        free = int(self.limit) - self.inflight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class LLMClient:
+    def __init__(
+        self,
+        provider: Optional[Provider] = None,
+        rpm: float = LLM_RPM,
+        tpm: float = LLM_TPM,
+        concurrency: tuple[int, int, int] = (LLM_CONCURRENCY_INITIAL, LLM_CONCURRENCY_MIN, LLM_CONCURRENCY_MAX),
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base: float = LLM_RETRY_BASE_S,
+        retry_max: float = LLM_RETRY_MAX_S,
+        timeout: float = LLM_TIMEOUT_S,
+    ) -> None:
+        self.provider = provider if provider is not None else get_provider()
+        self.requests = TokenBucket(rpm / 60, rpm / 60 * BUCKET_BURST_S)
+        self.tokens = TokenBucket(tpm / 60, tpm / 60 * BUCKET_BURST_S)
+        self.limiter = AdaptiveLimiter(*concurrency)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.timeout = timeout
+        self._http: Optional[httpx.AsyncClient] = None
+        self.counts = {"calls": 0, "ok": 0, "failed": 0, "retries": 0, "throttled": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.provider is not None
+
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.limiter.maximum, max_keepalive_connections=self.limiter.maximum),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def complete(self, messages: list[Message], max_tokens: int = 256, temperature: float = 0.2) -> Completion:
+        if self.provider is None:
+            raise LLMUnavailable("no LLM provider configured (LLM_PROVIDER)")
+        self.counts["calls"] += 1
+        reserved = sum(estimate_tokens(m["content"]) for m in messages) + max_tokens
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(reserved)
+            await self.limiter.acquire()
+            started = time.monotonic()
+            outcome, charged = "error", 0
+            try:
+                result = await self.provider.complete(self.http(), messages, max_tokens, temperature)
+                outcome, charged = "ok", result.prompt_tokens + result.completion_tokens
+            except RetryableError as e:
+                outcome = "overload" if e.overload else "error"
+                error = e
+            except LLMError:
+                self.counts["failed"] += 1
+                raise
+            finally:  # also on cancellation: free the slot, refund what the provider did not use
+                self.limiter.release(outcome, time.monotonic() - started)
+                self.tokens.settle(charged - reserved)
+            if outcome == "ok":
+                self.counts["ok"] += 1
+                self.counts["prompt_tokens"] += result.prompt_tokens
+                self.counts["completion_tokens"] += result.completion_tokens
+                return result
+            if outcome == "overload":
+                self.counts["throttled"] += 1
+            if attempt == self.max_retries:
+                break
+            self.counts["retries"] += 1
+            delay = random.uniform(0, min(self.retry_max, self.retry_base * 2**attempt))
+            await asyncio.sleep(max(delay, error.retry_after or 0))
+        self.counts["failed"] += 1
+        raise LLMError(f"gave up after {self.max_retries + 1} attempts: {error}") from error
+
+    async def stream(self, messages: list[Message], max_tokens: int = 256, temperature: float = 0.2) -> AsyncIterator[str]:
+        """Like ``complete`` but yields text deltas. Closing the iterator early closes the provider stream."""
+        if self.provider is None:
+            raise LLMUnavailable("no LLM provider configured (LLM_PROVIDER)")
+        self.counts["calls"] += 1
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        reserved = prompt_tokens + max_tokens
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(reserved)
+            await self.limiter.acquire()
+            started = time.monotonic()
+            outcome, produced = "error", []
+            try:
+                async for delta in self.provider.stream(self.http(), messages, max_tokens, temperature):
+                    produced.append(delta)
+                    yield delta
+                outcome = "ok"
+            except RetryableError as e:
+                if produced:  # text already went out: a retry would repeat it
+                    self.counts["failed"] += 1
+                    raise LLMError(f"stream broke off: {e}") from e
+                outcome = "overload" if e.overload else "error"
+                error = e
+            except LLMError:
+                self.counts["failed"] += 1
+                raise
+            finally:
+                completion_tokens = estimate_tokens("".join(produced)) if produced else 0
+                self.limiter.release(outcome, time.monotonic() - started)
+                self.tokens.settle((prompt_tokens + completion_tokens if produced or outcome == "ok" else 0) - reserved)
+            if outcome == "ok":
+                self.counts["ok"] += 1
+                self.counts["prompt_tokens"] += prompt_tokens
+                self.counts["completion_tokens"] += completion_tokens
+                return
+            if outcome == "overload":
+                self.counts["throttled"] += 1
+            if attempt == self.max_retries:
+                break
+            self.counts["retries"] += 1
+            delay = random.uniform(0, min(self.retry_max, self.retry_base * 2**attempt))
+            await asyncio.sleep(max(delay, error.retry_after or 0))
+        self.counts["failed"] += 1
+        raise LLMError(f"gave up after {self.max_retries + 1} attempts: {error}") from error
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider.name if self.provider else None,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "inflight": self.limiter.inflight,
+            "latency_ewma_s": round(self.limiter.latency, 3),
+            **self.counts,
+        }
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMClient]" = weakref.WeakKeyDictionary()
+
+
+def get_llm() -> LLMClient:
+    """The running event loop's client (its limits, HTTP pool and asyncio primitives belong to that loop)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = LLMClient()
+    return client
+
+
+async def close_llm() -> None:
+    """Close the running loop's client, if one was created (API shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def llm_enabled() -> bool:
+    return LLM_PROVIDER not in ("", "none")
+
+
+async def gather_limited(calls: list[Callable[[], Awaitable[T]]]) -> list[Any]:
+    """Run every call concurrently (the client's limiter does the bounding); exceptions are returned."""
+    return await asyncio.gather(*(call() for call in calls), return_exceptions=True)
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _worker_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def serve() -> None:
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            threading.Thread(target=serve, name="llm-loop", daemon=True).start()
+            ready.wait()
+            _loop = loop
+        return _loop
+
+
+def _after_fork() -> None:
+    # the loop thread does not survive fork (Celery prefork children): start a fresh one on demand
+    global _loop, _loop_lock
+    _loop, _loop_lock = None, threading.Lock()
+    _clients.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def run(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Run ``coro`` on this process's background event loop and block until it finishes (sync callers)."""
+    return asyncio.run_coroutine_threadsafe(coro, _worker_loop()).result(timeout)
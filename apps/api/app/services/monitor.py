@@ -0,0 +1,73 @@
+"""Live exam monitor state.
+
+A stream starts from one snapshot query and is then kept current purely from submission events
+(``submission.started``, ``answer.saved``, ``submission.submitted``) on the form channels, so
+per-student answered counts are maintained incrementally instead of recomputed per poll. The
+snapshot also counts answers still waiting in the autosave write-behind buffer.
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from ..models.entities import Answer, Submission
+from .autosave import answer_buffer
+
+
+class LiveExamMonitor:
+    def __init__(self, user_ids: Optional[set[int]] = None) -> None:
+        # restrict to these students (classroom view); None means everyone
+        self.user_ids = user_ids
+        self._active: dict[int, dict] = {}
+        self._answered: dict[int, set[int]] = {}
+
+    def _row(self, sid: int) -> dict:
+        return {**self._active[sid], "answered": len(self._answered[sid])}
+
+    async def load(self, db, form_ids: Iterable[int]) -> None:
+        query = select(Submission).where(Submission.form_id.in_(list(form_ids)), Submission.submitted_at.is_(None))
+        if self.user_ids is not None:
+            query = query.where(Submission.user_id.in_(self.user_ids))
+        for s in (await db.scalars(query)).all():
+            self._track(s.id, s.form_id, s.user_id, s.started_at)
+        if self._active:
+            rows = await db.execute(
+                select(Answer.submission_id, Answer.question_id).where(Answer.submission_id.in_(list(self._active)))
+            )
+            for sid, qid in rows:
+                self._answered[sid].add(qid)
+            if answer_buffer is not None:
+                for sid, qids in (await answer_buffer.pending_questions(list(self._active))).items():
+                    self._answered[sid].update(qids)
+
+    def _track(self, sid: int, form_id: int, user_id: int, started_at) -> None:
+        if isinstance(started_at, datetime):
+            started_at = started_at.isoformat()
+        self._active[sid] = {"id": sid, "form_id": form_id, "user_id": user_id, "started_at": started_at}
+        self._answered.setdefault(sid, set())
+
+    def snapshot(self) -> list[dict]:
+        return [self._row(sid) for sid in sorted(self._active, reverse=True)]
+
+    def apply(self, event: str, data: dict) -> Optional[dict]:
+        """Fold one event into the state; returns the row to push, or None if it is not ours."""
+        if self.user_ids is not None and data.get("user_id") not in self.user_ids:
+            return None
+        sid = data.get("submission_id")
+        if event == "submission.started":
+            self._track(sid, data["form_id"], data["user_id"], data.get("started_at"))
+            return self._row(sid)
+        if sid not in self._active:
+            return None
+        if event == "answer.saved":
+            self._answered[sid].update(data.get("question_ids") or [])
+            return self._row(sid)
+        if event == "submission.submitted":
+            row = {**self._row(sid), "submitted_at": data.get("submitted_at")}
+            del self._active[sid]
+            del self._answered[sid]
+            return row
+        return None
+
+    def counters(self) -> dict:
+        return {"active": len(self._active), "answers": sum(len(a) for a in self._answered.values())}
@@ -0,0 +1,458 @@
+"""Hybrid retrieval over indexed video segments (``video_segments``).
+
+A query is scored two ways and fused over the union of both sides' top candidates:
+
+    score = alpha * max(cosine, 0) + (1 - alpha) * bm25 / max(bm25 over candidates)
+
+``SegmentIndex`` is the in-process index. Per segment it keeps only ids, timestamps, the embedding
+(int8 codes plus one float scale, ~400 B at 384 dims) and BM25 postings in CSR arrays; texts are
+fetched from the DB for the final top-k only. Vector candidates come from an IVF index: a k-means
+coarse quantiser, rows stored grouped by list, ``nprobe`` lists scanned per query. Lexical scores
+are summed over the postings of the query terms only, with BM25 weights precomputed per posting. A search restricted to one video scans
+that video's segments exactly.
+
+``RetrievalService`` builds the index in a background thread and rebuilds it when the segment table
+changes (checked every ``RETRIEVAL_REFRESH_S``). While no index is loaded ("cold"), queries fall
+back to pgvector (``ORDER BY embedding <=> q``, vector-only), or to an exact NumPy scan on
+databases without pgvector.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter, deque
+from typing import Iterable, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+
+from ..models.db import SessionLocal, engine
+from ..models.entities import Video, VideoSegment
+from .embeddings import embedding_service, tokenize
+
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_IN_PROCESS = os.getenv("RETRIEVAL_IN_PROCESS", "true").lower() == "true"
+RETRIEVAL_ALPHA = float(os.getenv("RETRIEVAL_ALPHA", "0.5"))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "100"))  # per side, before fusion
+RETRIEVAL_NLIST = int(os.getenv("RETRIEVAL_NLIST", "0"))  # 0 = sqrt(segments)
+RETRIEVAL_NPROBE = int(os.getenv("RETRIEVAL_NPROBE", "8"))
+RETRIEVAL_KMEANS_ITERS = int(os.getenv("RETRIEVAL_KMEANS_ITERS", "8"))
+RETRIEVAL_REFRESH_S = float(os.getenv("RETRIEVAL_REFRESH_S", "300"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+LOAD_BATCH = 5000
+
+
+class Hit(NamedTuple):
+    segment_id: int
+    video_id: int
+    start_ms: int
+    end_ms: int
+    score: float
+    cosine: float
+    bm25: float
+
+
+# (segment id, video id, start_ms, end_ms, text, embedding)
+SegmentRow = tuple[int, int, int, int, str, Sequence[float]]
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` largest ``scores``, best first."""
+    if scores.size <= k:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def _quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantisation: ``vectors ~= codes * scales[:, None]``."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    # int8 -> float32 is a cheap vectorised cast, and float32 matmul goes through BLAS
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def _kmeans(sample: np.ndarray, nlist: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    """Spherical k-means (unit vectors, dot-product assignment)."""
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        if empty.any():  # re-seed empty lists from random points
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+class SegmentIndex:
+    def __init__(
+        self,
+        segment_ids: np.ndarray,
+        video_ids: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        codes: np.ndarray,
+        scales: np.ndarray,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        vocab: dict[str, int],
+        post_offsets: np.ndarray,
+        post_docs: np.ndarray,
+        post_weights: np.ndarray,
+        build_seconds: float = 0.0,
+    ) -> None:
+        self.segment_ids = segment_ids
+        self.video_ids = video_ids
+        self.starts = starts
+        self.ends = ends
+        self.codes = codes
+        self.scales = scales
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.vocab = vocab
+        self.post_offsets = post_offsets
+        self.post_docs = post_docs
+        self.post_weights = post_weights
+        self.build_seconds = build_seconds
+        # rows grouped by video, for exact per-video search
+        self._by_video = np.argsort(video_ids, kind="stable")
+        self._video_sorted = video_ids[self._by_video]
+
+    def __len__(self) -> int:
+        return len(self.segment_ids)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (
+            self.segment_ids, self.video_ids, self.starts, self.ends, self.codes, self.scales, self.centroids,
+            self.list_offsets, self.post_offsets, self.post_docs, self.post_weights, self._by_video,
+            self._video_sorted,
+        )
+        return sum(a.nbytes for a in arrays)
+
+    @classmethod
+    def build(
+        cls,
+        batches: Iterable[Sequence[SegmentRow]],
+        nlist: int = RETRIEVAL_NLIST,
+        kmeans_iters: int = RETRIEVAL_KMEANS_ITERS,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        seed: int = 0,
+    ) -> Optional["SegmentIndex"]:
+        """Build from row batches (streamed; texts are tokenised and dropped batch by batch)."""
+        started = time.perf_counter()
+        ids, vids, starts, ends, code_blocks, scale_blocks = [], [], [], [], [], []
+        vocab: dict[str, int] = {}
+        term_parts, doc_parts, tf_parts = [], [], []
+        doc_len: list[int] = []
+        n = 0
+        for batch in batches:
+            if not batch:
+                continue
+            terms, docs, tfs = [], [], []
+            for i, (sid, vid, start, end, text, _) in enumerate(batch):
+                counts = Counter(tokenize(text))
+                doc_len.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    terms.append(vocab.setdefault(term, len(vocab)))
+                    docs.append(n + i)
+                    tfs.append(tf)
+            term_parts.append(np.asarray(terms, dtype=np.int32))
+            doc_parts.append(np.asarray(docs, dtype=np.int32))
+            tf_parts.append(np.asarray(tfs, dtype=np.float32))
+            ids.append(np.fromiter((r[0] for r in batch), dtype=np.int64, count=len(batch)))
+            vids.append(np.fromiter((r[1] for r in batch), dtype=np.int32, count=len(batch)))
+            starts.append(np.fromiter((r[2] for r in batch), dtype=np.int32, count=len(batch)))
+            ends.append(np.fromiter((r[3] for r in batch), dtype=np.int32, count=len(batch)))
+            codes, scales = _quantize(np.asarray([r[5] for r in batch], dtype=np.float32))
+            code_blocks.append(codes)
+            scale_blocks.append(scales)
+            n += len(batch)
+        if n == 0:
+            return None
+
+        codes = np.concatenate(code_blocks)
+        scales = np.concatenate(scale_blocks)
+        del code_blocks, scale_blocks
+
+        # --- IVF: train on a sample, assign every row, store rows grouped by list ---
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(nlist or int(math.sqrt(n)), n))
+        sample_idx = rng.choice(n, min(n, max(nlist * 32, 1024)), replace=False)
+        centroids = _kmeans(_dequantize(codes[sample_idx], scales[sample_idx]), nlist, kmeans_iters, rng)
+        assign = np.empty(n, dtype=np.int32)
+        for lo in range(0, n, 65536):
+            block = _dequantize(codes[lo : lo + 65536], scales[lo : lo + 65536])
+            assign[lo : lo + 65536] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=list_offsets[1:])
+        rank = np.empty(n, dtype=np.int32)  # old row -> position in IVF order
+        rank[order] = np.arange(n, dtype=np.int32)
+
+        # --- BM25: per-posting weights, CSR by term, doc ids in IVF order ---
+        term_ids = np.concatenate(term_parts)
+        post_docs = rank[np.concatenate(doc_parts)]
+        tf = np.concatenate(tf_parts)
+        del term_parts, doc_parts, tf_parts
+        lengths = np.asarray(doc_len, dtype=np.float32)
+        avgdl = float(lengths.mean()) or 1.0
+        df = np.bincount(term_ids, minlength=len(vocab)).astype(np.float32)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        dl = np.empty(n, dtype=np.float32)
+        dl[rank] = lengths
+        weights = idf[term_ids] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl[post_docs] / avgdl))
+        by_term = np.argsort(term_ids, kind="stable")
+        post_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=post_offsets[1:])
+
+        return cls(
+            segment_ids=np.concatenate(ids)[order],
+            video_ids=np.concatenate(vids)[order],
+            starts=np.concatenate(starts)[order],
+            ends=np.concatenate(ends)[order],
+            codes=codes[order],
+            scales=scales[order],
+            centroids=centroids,
+            list_offsets=list_offsets,
+            vocab=vocab,
+            post_offsets=post_offsets,
+            post_docs=post_docs[by_term],
+            post_weights=weights[by_term].astype(np.float32),
+            build_seconds=time.perf_counter() - started,
+        )
+
+    # --- scoring ---
+
+    def bm25(self, terms: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+        """``(rows, scores)`` for the rows matching any query term; ``rows`` is sorted."""
+        slices = [
+            (self.post_offsets[t], self.post_offsets[t + 1]) for t in {self.vocab.get(term) for term in terms} if t is not None
+        ]
+        if not slices:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        docs = np.concatenate([self.post_docs[a:b] for a, b in slices])
+        weights = np.concatenate([self.post_weights[a:b] for a, b in slices])
+        rows, inverse = np.unique(docs, return_inverse=True)
+        return rows, np.bincount(inverse, weights=weights).astype(np.float32)
+
+    def cosine(self, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        return (self.codes[rows].astype(np.float32) @ q) * self.scales[rows]
+
+    def ann(self, q: np.ndarray, k: int, nprobe: int = RETRIEVAL_NPROBE) -> np.ndarray:
+        """Approximate top-``k`` rows by cosine (IVF, ``nprobe`` lists)."""
+        probe = _top(self.centroids @ q, min(nprobe, len(self.centroids)))
+        rows = np.concatenate([np.arange(self.list_offsets[p], self.list_offsets[p + 1]) for p in probe])
+        if rows.size == 0:
+            return rows
+        # probed lists are contiguous row ranges: slice them instead of gathering row by row
+        codes = np.concatenate([self.codes[self.list_offsets[p] : self.list_offsets[p + 1]] for p in probe])
+        scales = np.concatenate([self.scales[self.list_offsets[p] : self.list_offsets[p + 1]] for p in probe])
+        return rows[_top((codes.astype(np.float32) @ q) * scales, k)]
+
+    def video_rows(self, video_id: int) -> np.ndarray:
+        lo, hi = np.searchsorted(self._video_sorted, [video_id, video_id + 1])
+        return self._by_video[lo:hi]
+
+    def search(
+        self,
+        q: np.ndarray,
+        terms: Sequence[str],
+        k: int,
+        alpha: float = RETRIEVAL_ALPHA,
+        video_id: Optional[int] = None,
+        candidates: int = RETRIEVAL_CANDIDATES,
+        nprobe: int = RETRIEVAL_NPROBE,
+    ) -> list[Hit]:
+        lex_rows, lex_scores = self.bm25(terms) if alpha < 1 else (np.empty(0, dtype=np.int32), None)
+        if video_id is not None:
+            rows = self.video_rows(video_id)
+        else:
+            parts = [lex_rows[_top(lex_scores, max(candidates, k))]] if lex_rows.size else []
+            if alpha > 0 or not parts:
+                parts.append(self.ann(q, max(candidates, k), nprobe))
+            rows = np.unique(np.concatenate(parts))
+        if rows.size == 0:
+            return []
+        cosine = self.cosine(rows, q)
+        bm = np.zeros(rows.size, dtype=np.float32)
+        if lex_rows.size:
+            pos = np.minimum(np.searchsorted(lex_rows, rows), lex_rows.size - 1)
+            found = lex_rows[pos] == rows
+            bm[found] = lex_scores[pos[found]]
+        peak = float(bm.max()) if bm.size else 0.0
+        fused = alpha * np.clip(cosine, 0, None) + (1 - alpha) * (bm / peak if peak > 0 else bm)
+        best = _top(fused, k)
+        return [
+            Hit(
+                int(self.segment_ids[r]), int(self.video_ids[r]), int(self.starts[r]), int(self.ends[r]),
+                float(fused[i]), float(cosine[i]), float(bm[i]),
+            )
+            for i, r in ((i, rows[i]) for i in best)
+        ]
+
+
+# --- DB-backed service ---
+
+def _segment_rows(db) -> Iterable[list[SegmentRow]]:
+    stmt = select(
+        VideoSegment.id, VideoSegment.video_id, VideoSegment.start_ms, VideoSegment.end_ms,
+        VideoSegment.text, VideoSegment.embedding,
+    ).execution_options(yield_per=LOAD_BATCH)
+    for part in db.execute(stmt).partitions(LOAD_BATCH):
+        yield [tuple(r) for r in part]
+
+
+async def segment_texts(db, segment_ids: Sequence[int]) -> dict[int, str]:
+    """Texts of the given segments; ids deleted since the index was built are absent."""
+    if not segment_ids:
+        return {}
+    rows = await db.execute(select(VideoSegment.id, VideoSegment.text).where(VideoSegment.id.in_(segment_ids)))
+    return {r.id: r.text for r in rows}
+
+
+def _signature(db) -> tuple:
+    count, max_id = db.execute(select(func.count(VideoSegment.id), func.max(VideoSegment.id))).one()
+    return count, max_id, db.scalar(select(func.max(Video.indexed_at)))
+
+
+class RetrievalService:
+    def __init__(self) -> None:
+        self.index: Optional[SegmentIndex] = None
+        self.signature: Optional[tuple] = None
+        self.building = False
+        self.queries = Counter()
+        self._latencies: deque[float] = deque(maxlen=4096)
+        self._task: Optional[asyncio.Task] = None
+
+    # --- index lifecycle ---
+
+    def _build_sync(self) -> Optional[SegmentIndex]:
+        with SessionLocal() as db:
+            return SegmentIndex.build(_segment_rows(db))
+
+    def _signature_sync(self) -> tuple:
+        with SessionLocal() as db:
+            return _signature(db)
+
+    async def refresh(self) -> None:
+        """Rebuild (in a thread) if the segment table changed since the current index was built."""
+        signature = await asyncio.to_thread(self._signature_sync)
+        if signature == self.signature:
+            return
+        self.building = True
+        try:
+            index = await asyncio.to_thread(self._build_sync)
+        finally:
+            self.building = False
+        self.index, self.signature = index, signature  # swap: queries never see a half-built index
+        if index is not None:
+            logger.info("retrieval index: %d segments in %.1fs (%.0f MiB)", len(index), index.build_seconds, index.nbytes / 2**20)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001 - keep serving from the old index / fallback
+                logger.exception("retrieval index refresh failed")
+            await asyncio.sleep(RETRIEVAL_REFRESH_S)
+
+    def start(self) -> None:
+        if RETRIEVAL_IN_PROCESS and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- queries ---
+
+    async def _fallback(self, db, q: np.ndarray, k: int, video_id: Optional[int]) -> list[Hit]:
+        if engine.dialect.name == "postgresql":
+            distance = VideoSegment.embedding.cosine_distance(q)
+            stmt = select(
+                VideoSegment.id, VideoSegment.video_id, VideoSegment.start_ms, VideoSegment.end_ms, distance.label("d")
+            ).order_by(distance).limit(k)
+            if video_id is not None:
+                stmt = stmt.where(VideoSegment.video_id == video_id)
+            rows = (await db.execute(stmt)).all()
+            return [Hit(r.id, r.video_id, r.start_ms, r.end_ms, 1 - r.d, 1 - r.d, 0.0) for r in rows]
+        return await asyncio.to_thread(self._scan_sync, q, k, video_id)
+
+    def _scan_sync(self, q: np.ndarray, k: int, video_id: Optional[int]) -> list[Hit]:
+        """Exact cosine scan streamed from the DB (for databases without pgvector)."""
+        best: list[Hit] = []
+        with SessionLocal() as db:
+            for batch in _segment_rows(db):
+                if video_id is not None:
+                    batch = [r for r in batch if r[1] == video_id]
+                if not batch:
+                    continue
+                scores = np.asarray([r[5] for r in batch], dtype=np.float32) @ q
+                for i in _top(scores, k):
+                    r = batch[i]
+                    best.append(Hit(r[0], r[1], r[2], r[3], float(scores[i]), float(scores[i]), 0.0))
+                best = sorted(best, key=lambda h: -h.score)[:k]
+        return best
+
+    async def search(
+        self, db, query: str, k: int = 10, alpha: Optional[float] = None, video_id: Optional[int] = None
+    ) -> tuple[str, list[Hit]]:
+        """Returns ``(mode, hits)``; mode is ``index`` or ``fallback``."""
+        started = time.perf_counter()
+        alpha = RETRIEVAL_ALPHA if alpha is None else alpha
+        q = (await embedding_service.embed([query]))[0]
+        index = self.index
+        if index is not None:
+            mode = "index"
+            hits = await asyncio.to_thread(index.search, q, tokenize(query), k, alpha, video_id)
+        else:
+            mode = "fallback"
+            hits = await self._fallback(db, q, k, video_id)
+        self.queries[mode] += 1
+        self._latencies.append(time.perf_counter() - started)
+        return mode, hits
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+
+        def pct(p: float) -> Optional[float]:
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2) if lat else None
+
+        index = self.index
+        return {
+            "in_process": RETRIEVAL_IN_PROCESS,
+            "segments": len(index) if index is not None else 0,
+            "index_mib": round(index.nbytes / 2**20, 1) if index is not None else 0,
+            "build_seconds": round(index.build_seconds, 2) if index is not None else None,
+            "building": self.building,
+            "lists": len(index.centroids) if index is not None else 0,
+            "queries": dict(self.queries),
+            "latency_ms_p50": pct(0.5),
+            "latency_ms_p99": pct(0.99),
+            "embeddings": embedding_service.stats(),
+        }
+
+
+retrieval_service = RetrievalService()
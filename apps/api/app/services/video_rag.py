@@ -0,0 +1,285 @@
+"""Video indexing: transcript -> overlapping timestamped segments -> embeddings -> ``video_segments``.
+
+The transcript is a WebVTT or SRT file stored next to the video object (``lecture.mp4`` ->
+``lecture.vtt`` / ``lecture.srt``, or ``lecture.mp4.vtt``), so no ASR service is involved. The
+pipeline is a chain of generators over the object stream, so memory stays bounded by one
+segmentation window plus one embedding batch however long the lecture is:
+
+    object bytes -> lines -> cues -> segments -> batches of INDEX_BATCH_SIZE -> bulk upsert + commit
+
+Each committed batch is a checkpoint. Segmentation is deterministic, so a re-run of the same
+transcript and settings (same ``index_source``) skips everything up to the last stored ``seq`` and
+upserts the rest; a changed transcript drops the old segments first. Re-running a finished video is
+a no-op.
+"""
+import codecs
+import logging
+import os
+import re
+from collections import deque
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+from minio.error import S3Error
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .. import storage
+from ..models.db import engine
+from ..models.entities import Video, VideoSegment
+from .embeddings import embedding_service
+
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_EXTS = (".vtt", ".srt")
+SEGMENT_WINDOW_S = float(os.getenv("SEGMENT_WINDOW_S", "30"))
+SEGMENT_OVERLAP_S = float(os.getenv("SEGMENT_OVERLAP_S", "5"))
+SEGMENT_MAX_CHARS = int(os.getenv("SEGMENT_MAX_CHARS", "1200"))
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "64"))
+TRANSCRIPT_READ_BYTES = 64 * 1024
+
+
+class Cue(NamedTuple):
+    start_ms: int
+    end_ms: int
+    text: str
+
+
+class Segment(NamedTuple):
+    seq: int
+    start_ms: int
+    end_ms: int
+    text: str
+
+
+# --- parsing ---
+
+_TIMESTAMP = re.compile(r"^(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{1,3})$")
+_TAG = re.compile(r"<[^>]*>")
+
+
+def parse_timestamp(value: str) -> int:
+    """``01:02:03.456`` / ``02:03,456`` / ``1:02:03,4`` -> milliseconds."""
+    m = _TIMESTAMP.match(value.strip())
+    if m is None:
+        raise ValueError(f"bad timestamp {value!r}")
+    hours, minutes, seconds, frac = m.groups()
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(frac.ljust(3, "0"))
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode a UTF-8 (BOM tolerated) byte stream into lines without reading it whole."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def parse_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    """Cues of a WebVTT or SRT transcript (both are blank-line separated blocks with a ``-->`` line).
+
+    Cue identifiers/sequence numbers, ``NOTE``/``STYLE``/``REGION`` blocks, cue settings and inline
+    tags are dropped; malformed blocks are skipped.
+    """
+    timing: Optional[tuple[int, int]] = None
+    text: list[str] = []
+    for line in lines:
+        if not line.strip():
+            if timing is not None and text:
+                yield Cue(timing[0], timing[1], " ".join(text))
+            timing, text = None, []
+            continue
+        if timing is None:
+            if "-->" in line:
+                start, _, rest = line.partition("-->")
+                try:
+                    timing = (parse_timestamp(start), parse_timestamp(rest.split()[0]))
+                except (ValueError, IndexError):
+                    timing = None
+            continue  # header, identifier or a NOTE/STYLE line
+        cleaned = _TAG.sub("", line).strip()
+        if cleaned:
+            text.append(cleaned)
+    if timing is not None and text:
+        yield Cue(timing[0], timing[1], " ".join(text))
+
+
+def segment_cues(
+    cues: Iterable[Cue],
+    window_ms: int = int(SEGMENT_WINDOW_S * 1000),
+    overlap_ms: int = int(SEGMENT_OVERLAP_S * 1000),
+    max_chars: int = SEGMENT_MAX_CHARS,
+) -> Iterator[Segment]:
+    """Group cues into windows of about ``window_ms`` / ``max_chars``; consecutive windows share the
+    cues of their last ``overlap_ms`` so an answer spanning a boundary is whole in one of them."""
+    buf: deque[Cue] = deque()
+    chars = 0
+    seq = 0
+
+    def emit() -> Segment:
+        return Segment(seq, buf[0].start_ms, max(c.end_ms for c in buf), " ".join(c.text for c in buf))
+
+    for cue in cues:
+        if buf and (cue.end_ms - buf[0].start_ms > window_ms or chars + len(cue.text) > max_chars):
+            segment = emit()
+            yield segment
+            seq += 1
+            # keep the tail for overlap, but always drop at least one cue so windows advance
+            buf.popleft()
+            while buf and buf[0].start_ms < segment.end_ms - overlap_ms:
+                buf.popleft()
+            chars = sum(len(c.text) for c in buf)
+        buf.append(cue)
+        chars += len(cue.text)
+    if buf:
+        yield emit()
+
+
+# --- storage ---
+
+def _stem(key: str) -> str:
+    return key.rsplit(".", 1)[0] if "." in key.rsplit("/", 1)[-1] else key
+
+
+def transcript_key(storage_key: str, ext: str) -> str:
+    """Object key a transcript with extension ``ext`` is stored under, next to the video."""
+    return _stem(storage.split_key(storage_key)[1]) + ext
+
+
+def find_transcript(storage_key: str) -> Optional[tuple[str, str, int]]:
+    """``(object key, etag, size)`` of the transcript stored next to the video, if any."""
+    bucket, key = storage.split_key(storage_key)
+    stem = _stem(key)
+    client = storage.get_client()
+    for candidate in [stem + ext for ext in TRANSCRIPT_EXTS] + [key + ext for ext in TRANSCRIPT_EXTS]:
+        try:
+            stat = client.stat_object(bucket, candidate)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject", "NoSuchBucket"):
+                continue
+            raise
+        return candidate, stat.etag, stat.size
+    return None
+
+
+def _read_chunks(bucket: str, key: str, counter: list[int]) -> Iterator[bytes]:
+    resp = storage.get_client().get_object(bucket, key)
+    try:
+        for chunk in resp.stream(TRANSCRIPT_READ_BYTES):
+            counter[0] += len(chunk)
+            yield chunk
+    finally:
+        resp.close()
+        resp.release_conn()
+
+
+# --- writing ---
+
+def segments_upsert_stmt(rows: list[dict]):
+    """``INSERT ... ON CONFLICT (video_id, seq) DO UPDATE`` for the active dialect."""
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        insert = postgresql.insert
+    elif dialect == "sqlite":
+        insert = sqlite.insert
+    else:
+        raise RuntimeError(f"bulk segment upsert not supported on {dialect}")
+    stmt = insert(VideoSegment).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[VideoSegment.video_id, VideoSegment.seq],
+        set_={c: getattr(stmt.excluded, c) for c in ("start_ms", "end_ms", "text", "embedding")},
+    )
+
+
+def _write_batch(db, video_id: int, batch: list[Segment]) -> None:
+    vectors = embedding_service.embed_sync([s.text for s in batch])  # unchanged texts are cache hits
+    rows = [
+        {"video_id": video_id, "seq": s.seq, "start_ms": s.start_ms, "end_ms": s.end_ms, "text": s.text, "embedding": v}
+        for s, v in zip(batch, vectors)
+    ]
+    db.execute(segments_upsert_stmt(rows))
+    db.commit()  # checkpoint
+
+
+Progress = Callable[[dict], None]
+
+
+def index_video(db, video_id: int, progress: Optional[Progress] = None) -> dict:
+    """Build (or finish building) the segments of one video; ``db`` is a sync ``Session``."""
+    video = db.get(Video, video_id)
+    if video is None:
+        raise LookupError(f"video {video_id} not found")
+    found = find_transcript(video.storage_key)
+    if found is None:
+        video.index_status = "no_transcript"
+        db.commit()
+        return {"video_id": video_id, "status": "no_transcript", "segments": 0}
+    tkey, etag, total_bytes = found
+    # everything that shapes the segments: resuming is only valid if none of it changed
+    source = f"{tkey}@{etag}#{SEGMENT_WINDOW_S}/{SEGMENT_OVERLAP_S}/{SEGMENT_MAX_CHARS}/{embedding_service.name}"
+    if video.index_status == "indexed" and video.index_source == source:
+        return {"video_id": video_id, "status": "already_indexed", "segments": video.segment_count}
+
+    if video.index_source != source:
+        db.execute(delete(VideoSegment).where(VideoSegment.video_id == video_id))
+        video.index_source = source
+    done = db.scalar(select(func.max(VideoSegment.seq)).where(VideoSegment.video_id == video_id))
+    resume_after = -1 if done is None else done
+    video.index_status = "indexing"
+    db.commit()
+
+    bucket, _ = storage.split_key(video.storage_key)
+    read = [0]
+    batch: list[Segment] = []
+    count = written = 0
+
+    def report() -> None:
+        if progress is not None:
+            progress(
+                {
+                    "video_id": video_id,
+                    "segments": count,
+                    "written": written,
+                    "resumed_after": resume_after,
+                    "bytes_read": read[0],
+                    "total_bytes": total_bytes,
+                    "percent": round(100 * read[0] / total_bytes, 1) if total_bytes else 100.0,
+                }
+            )
+
+    try:
+        for segment in segment_cues(parse_cues(iter_lines(_read_chunks(bucket, tkey, read)))):
+            count = segment.seq + 1
+            if segment.seq <= resume_after:
+                continue  # stored by an earlier, interrupted run
+            batch.append(segment)
+            if len(batch) >= INDEX_BATCH_SIZE:
+                _write_batch(db, video_id, batch)
+                written += len(batch)
+                batch = []
+                report()
+        if batch:
+            _write_batch(db, video_id, batch)
+            written += len(batch)
+        # defensive: never leave segments past the end of the current build
+        db.execute(delete(VideoSegment).where(VideoSegment.video_id == video_id, VideoSegment.seq >= count))
+        video = db.get(Video, video_id)
+        video.index_status = "indexed"
+        video.segment_count = count
+        video.indexed_at = datetime.utcnow()
+        db.commit()
+    except Exception:
+        db.rollback()
+        db.execute(update(Video).where(Video.id == video_id).values(index_status="failed"))
+        db.commit()
+        raise
+    report()
+    logger.info("indexed video %s: %d segments (%d written, resumed after %d)", video_id, count, written, resume_after)
+    return {"video_id": video_id, "status": "indexed", "segments": count, "written": written}
@@ -0,0 +1,57 @@
+"""Registering uploaded videos, deduplicated by content hash.
+
+A finished upload is looked up by its SHA-256; if the content is already stored, the fresh object
+is deleted and the existing ``Video`` (with its storage object and index) is returned instead, so
+storage and indexing scale with distinct content rather than with upload count. The unique index
+on ``Video.content_hash`` settles races between concurrent identical uploads.
+
+A hash the client merely claims, before sending any bytes, proves nothing about having the content:
+it only short-cuts to the caller's own videos (``find_own_by_hash``). Anyone else uploads, and the
+hash the server computes from the received stream decides.
+"""
+import logging
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from .. import storage
+from ..models.entities import Video
+from ..uploads import run_storage
+
+
+logger = logging.getLogger(__name__)
+
+
+async def find_by_hash(db, sha256: str) -> Optional[Video]:
+    return await db.scalar(select(Video).where(Video.content_hash == sha256.lower()))
+
+
+async def find_own_by_hash(db, sha256: str, owner_id: int) -> Optional[Video]:
+    return await db.scalar(select(Video).where(Video.content_hash == sha256.lower(), Video.owner_id == owner_id))
+
+
+async def _discard(key: str) -> None:
+    try:
+        await run_storage(storage.remove_object, key)
+    except Exception:  # noqa: BLE001 - an orphan object is wasted space, not an error
+        logger.exception("could not remove duplicate object %s", key)
+
+
+async def register_upload(db, key: str, sha256: str, owner_id: Optional[int]) -> tuple[Video, bool]:
+    """Create the ``Video`` for an object just stored at ``key``; returns ``(video, deduplicated)``."""
+    existing = await find_by_hash(db, sha256)
+    if existing is None:
+        v = Video(owner_id=owner_id, storage_key=f"{storage.MINIO_BUCKET}/{key}", content_hash=sha256)
+        db.add(v)
+        try:
+            await db.commit()
+            await db.refresh(v)
+            return v, False
+        except IntegrityError:
+            await db.rollback()  # an identical upload finished first
+            existing = await find_by_hash(db, sha256)
+            if existing is None:
+                raise
+    await _discard(key)
+    return existing, True
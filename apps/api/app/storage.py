@@ -0,0 +1,359 @@
+"""Object storage (MinIO / S3) shared by the API process.
+
+One client per process, backed by a single bounded urllib3 connection pool; the bucket check runs
+once (kicked off at startup, retried lazily by the first upload if MinIO was not up yet). All calls
+on the client are blocking and must run off the event loop.
+
+Resumable uploads use the S3 multipart primitives directly (``create_multipart_upload`` ...
+``complete_multipart_upload``); the storage server is the source of truth for which parts exist.
+
+``STORAGE_BACKEND=memory`` swaps in ``MemoryS3Client``, an in-process stand-in implementing the
+subset of the MinIO client API used here, for local runs and tests without MinIO.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+import certifi
+import urllib3
+from minio import Minio
+from minio.datatypes import Part
+from minio.error import S3Error
+
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "minio").lower()  # minio | memory
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "videos")
+MINIO_POOL_SIZE = int(os.getenv("MINIO_POOL_SIZE", "16"))
+MINIO_TIMEOUT_S = float(os.getenv("MINIO_TIMEOUT_S", "60"))
+
+# S3 limits for multipart uploads
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+class _MemoryObject:
+    __slots__ = ("data", "content_type", "etag", "last_modified")
+
+    def __init__(self, data: bytes, content_type: str, etag: str) -> None:
+        self.data = data
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = datetime.now(timezone.utc)
+
+
+class _MemoryStat:
+    def __init__(self, bucket_name: str, object_name: str, obj: _MemoryObject) -> None:
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.size = len(obj.data)
+        self.etag = obj.etag
+        self.content_type = obj.content_type
+        self.last_modified = obj.last_modified
+
+
+class _MemoryResponse:
+    """Enough of urllib3's response for ``get_object`` callers."""
+
+    def __init__(self, data: bytes) -> None:
+        self._buf = io.BytesIO(data)
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._buf.read(amt)
+
+    def stream(self, amt: int = 65536):
+        while True:
+            chunk = self._buf.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        self._buf.close()
+
+    def release_conn(self) -> None:
+        pass
+
+
+class _WriteResult:
+    def __init__(self, bucket_name: str, object_name: str, etag: str) -> None:
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.etag = etag
+        self.version_id = None
+
+
+class _ListPartsResult:
+    def __init__(self, parts: list[Part]) -> None:
+        self.parts = parts
+        self.is_truncated = False
+        self.next_part_number_marker = None
+
+
+class MemoryS3Client:
+    """Thread-safe in-memory stand-in for the ``Minio`` client methods this app calls."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: dict[str, dict[str, _MemoryObject]] = {}
+        # upload_id -> (bucket, key, content_type, {part_number: bytes})
+        self._multipart: dict[str, tuple[str, str, str, dict[int, bytes]]] = {}
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        with self._lock:
+            return bucket_name in self._buckets
+
+    def make_bucket(self, bucket_name: str) -> None:
+        with self._lock:
+            self._buckets.setdefault(bucket_name, {})
+
+    def _bucket(self, bucket_name: str) -> dict[str, _MemoryObject]:
+        bucket = self._buckets.get(bucket_name)
+        if bucket is None:
+            raise S3Error("NoSuchBucket", "bucket does not exist", bucket_name, "", "", None, bucket_name=bucket_name)
+        return bucket
+
+    def put_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data,
+        length: int,
+        content_type: str = "application/octet-stream",
+        part_size: int = 0,
+        **_: object,
+    ) -> _WriteResult:
+        # read the way the real client does (part by part) so streaming callers behave the same
+        step = part_size or 5 * 1024 * 1024
+        buf = io.BytesIO()
+        remaining = length
+        while remaining != 0:
+            chunk = data.read(step if remaining < 0 else min(step, remaining))
+            if not chunk:
+                break
+            buf.write(chunk)
+            if remaining > 0:
+                remaining -= len(chunk)
+        body = buf.getvalue()
+        etag = f"{len(body):x}-{hash(body) & 0xFFFFFFFF:08x}"
+        with self._lock:
+            self._bucket(bucket_name)[object_name] = _MemoryObject(body, content_type, etag)
+        return _WriteResult(bucket_name, object_name, etag)
+
+    def _object(self, bucket_name: str, object_name: str) -> _MemoryObject:
+        obj = self._bucket(bucket_name).get(object_name)
+        if obj is None:
+            raise S3Error("NoSuchKey", "object does not exist", object_name, "", "", None, bucket_name=bucket_name)
+        return obj
+
+    def stat_object(self, bucket_name: str, object_name: str, **_: object) -> _MemoryStat:
+        with self._lock:
+            return _MemoryStat(bucket_name, object_name, self._object(bucket_name, object_name))
+
+    def get_object(self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0, **_: object) -> _MemoryResponse:
+        with self._lock:
+            data = self._object(bucket_name, object_name).data
+        return _MemoryResponse(data[offset : offset + length] if length else data[offset:])
+
+    def remove_object(self, bucket_name: str, object_name: str) -> None:
+        with self._lock:
+            self._bucket(bucket_name).pop(object_name, None)
+
+    # the multipart primitives are private on ``Minio`` too; same names and signatures
+
+    def _upload(self, upload_id: str) -> tuple[str, str, str, dict[int, bytes]]:
+        upload = self._multipart.get(upload_id)
+        if upload is None:
+            raise S3Error("NoSuchUpload", "upload does not exist", upload_id, "", "", None)
+        return upload
+
+    def _create_multipart_upload(self, bucket_name: str, object_name: str, headers: dict) -> str:
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._bucket(bucket_name)
+            self._multipart[upload_id] = (bucket_name, object_name, headers.get("Content-Type", ""), {})
+        return upload_id
+
+    def _upload_part(self, bucket_name, object_name, data: bytes, headers, upload_id: str, part_number: int) -> str:
+        with self._lock:
+            self._upload(upload_id)[3][part_number] = bytes(data)
+        return hashlib.md5(data).hexdigest()
+
+    def _list_parts(self, bucket_name, object_name, upload_id: str, max_parts=None, part_number_marker=None, **_) -> _ListPartsResult:
+        with self._lock:
+            parts = dict(self._upload(upload_id)[3])
+        return _ListPartsResult(
+            [Part(n, hashlib.md5(d).hexdigest(), size=len(d)) for n, d in sorted(parts.items())]
+        )
+
+    def _complete_multipart_upload(self, bucket_name, object_name, upload_id: str, parts: list[Part]) -> _WriteResult:
+        with self._lock:
+            bucket, key, content_type, stored = self._upload(upload_id)
+            body = b"".join(stored[p.part_number] for p in parts)
+            etag = f"{hashlib.md5(body).hexdigest()}-{len(parts)}"
+            self._bucket(bucket)[key] = _MemoryObject(body, content_type or "application/octet-stream", etag)
+            del self._multipart[upload_id]
+        return _WriteResult(bucket, key, etag)
+
+    def _abort_multipart_upload(self, bucket_name, object_name, upload_id: str) -> None:
+        with self._lock:
+            self._upload(upload_id)  # NoSuchUpload, as S3 answers for an unknown or completed upload
+            del self._multipart[upload_id]
+
+
+_client = None
+_pool: Optional[urllib3.PoolManager] = None
+_client_lock = threading.Lock()
+_bucket_ready = False
+_warm_up_task: Optional[asyncio.Task] = None
+
+
+def _build_client():
+    global _pool
+    if STORAGE_BACKEND == "memory":
+        return MemoryS3Client()
+    _pool = urllib3.PoolManager(
+        maxsize=MINIO_POOL_SIZE,
+        block=True,  # at most MINIO_POOL_SIZE sockets; extra callers wait for a free one
+        timeout=urllib3.Timeout(connect=5, read=MINIO_TIMEOUT_S),
+        retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.getenv("SSL_CERT_FILE") or certifi.where(),
+    )
+    return Minio(
+        MINIO_ENDPOINT,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=MINIO_SECURE,
+        http_client=_pool,
+    )
+
+
+def get_client():
+    """Process-wide storage client (blocking API; call it from a worker thread)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+def _ensure_bucket_sync() -> None:
+    global _bucket_ready
+    client = get_client()
+    if not client.bucket_exists(MINIO_BUCKET):
+        try:
+            client.make_bucket(MINIO_BUCKET)
+        except S3Error as e:
+            # another worker won the race
+            if e.code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+                raise
+    _bucket_ready = True
+
+
+async def ensure_bucket() -> None:
+    if not _bucket_ready:
+        await asyncio.to_thread(_ensure_bucket_sync)
+
+
+def split_key(storage_key: str) -> tuple[str, str]:
+    """``Video.storage_key`` is ``"<bucket>/<object key>"``."""
+    bucket, _, key = storage_key.partition("/")
+    return bucket, key
+
+
+def sha256_object(key: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a stored object, streamed back in ``chunk_size`` pieces."""
+    hasher = hashlib.sha256()
+    resp = get_client().get_object(MINIO_BUCKET, key)
+    try:
+        for chunk in resp.stream(chunk_size):
+            hasher.update(chunk)
+    finally:
+        resp.close()
+        resp.release_conn()
+    return hasher.hexdigest()
+
+
+def object_exists(key: str) -> bool:
+    try:
+        get_client().stat_object(MINIO_BUCKET, key)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            return False
+        raise
+    return True
+
+
+def put_bytes(key: str, data: bytes, content_type: str) -> None:
+    get_client().put_object(MINIO_BUCKET, key, io.BytesIO(data), length=len(data), content_type=content_type)
+
+
+def remove_object(key: str) -> None:
+    get_client().remove_object(MINIO_BUCKET, key)
+
+
+def create_multipart_upload(key: str, content_type: Optional[str]) -> str:
+    return get_client()._create_multipart_upload(
+        MINIO_BUCKET, key, {"Content-Type": content_type or "application/octet-stream"}
+    )
+
+
+def upload_part(key: str, upload_id: str, part_number: int, data: bytes) -> str:
+    return get_client()._upload_part(MINIO_BUCKET, key, data, None, upload_id, part_number)
+
+
+def list_parts(key: str, upload_id: str) -> list[Part]:
+    client, parts, marker = get_client(), [], None
+    while True:
+        page = client._list_parts(MINIO_BUCKET, key, upload_id, max_parts=1000, part_number_marker=marker)
+        parts.extend(page.parts)
+        if not page.is_truncated:
+            return parts
+        marker = page.next_part_number_marker
+
+
+def complete_multipart_upload(key: str, upload_id: str, parts: list[Part]) -> None:
+    get_client()._complete_multipart_upload(MINIO_BUCKET, key, upload_id, parts)
+
+
+def abort_multipart_upload(key: str, upload_id: str) -> None:
+    get_client()._abort_multipart_upload(MINIO_BUCKET, key, upload_id)
+
+
+async def _warm_up() -> None:
+    try:
+        await ensure_bucket()
+    except Exception:  # noqa: BLE001 - storage may come up after the API; uploads retry
+        logger.warning("object storage not ready at startup (bucket %s)", MINIO_BUCKET, exc_info=True)
+
+
+def warm_up() -> None:
+    """Build the client and check the bucket in the background so startup never waits on MinIO."""
+    global _warm_up_task
+    if _warm_up_task is None:
+        _warm_up_task = asyncio.create_task(_warm_up())
+
+
+async def close() -> None:
+    global _client, _pool, _bucket_ready, _warm_up_task
+    if _warm_up_task is not None:
+        _warm_up_task.cancel()
+        _warm_up_task = None
+    if _pool is not None:
+        _pool.clear()
+        _pool = None
+    _client = None
+    _bucket_ready = False
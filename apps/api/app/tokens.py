@@ -0,0 +1,81 @@
+"""JWT issuing and verification — the single home of the signing secret.
+
+Verified claims are kept in a bounded LRU keyed by a hash of the token, and each entry dies at
+the token's own ``exp``, so a hot token is signature-checked once rather than on every request.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+
+
+SECRET_KEY = os.getenv("JWT_SECRET", "devsecret_change_me")
+ALGO = "HS256"
+ACCESS_TOKEN_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "60"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+def create_token(*, sub: str, role: str) -> str:
+    exp = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_MINUTES)
+    to_encode = {"sub": sub, "role": role, "exp": exp}
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGO)
+
+
+class VerifiedTokenCache:
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, tuple[float, dict]]" = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        k = self.key(token)
+        entry = self._entries.get(k)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, claims = entry
+        if time.time() >= expires_at:
+            del self._entries[k]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(k)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict) -> None:
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)):
+            return  # no expiry: always verify
+        k = self.key(token)
+        self._entries[k] = (float(exp), claims)
+        self._entries.move_to_end(k)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+token_cache = VerifiedTokenCache()
+
+
+def decode_token(token: str) -> dict:
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGO])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token")
+    token_cache.put(token, claims)
+    return claims
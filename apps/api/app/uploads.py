@@ -0,0 +1,360 @@
+"""Streaming media uploads into object storage.
+
+The request body is never spooled: ``MultipartFileStream`` pulls the file field out of a
+``multipart/form-data`` body chunk by chunk, and ``stream_upload`` pushes those chunks through a
+bounded ``UploadPipe`` that a storage worker thread drains into a multipart ``put_object``. Memory
+per upload is about ``UPLOAD_PART_SIZE`` plus ``UPLOAD_PIPE_CHUNKS`` network chunks; when storage
+is slower than the client the pipe fills and backpressure reaches the client's TCP window instead
+of the event loop. The pipe also SHA-256-hashes the bytes as the storage thread reads them, so
+the content hash costs the event loop nothing. ``upload_metrics`` tracks duration and throughput.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, NamedTuple, Optional
+
+import multipart
+from fastapi import HTTPException, Request, status
+from multipart.multipart import parse_options_header
+
+from . import storage
+
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PART_SIZE = max(storage.MIN_PART_SIZE, int(os.getenv("UPLOAD_PART_SIZE", str(10 * 1024 * 1024))))
+UPLOAD_PIPE_CHUNKS = int(os.getenv("UPLOAD_PIPE_CHUNKS", "32"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(8 * 1024**3)))  # 0 = unlimited
+# resumable uploads: largest accepted PUT part (held in memory while it is sent on) and session lifetime
+UPLOAD_PART_MAX_BYTES = max(storage.MIN_PART_SIZE, int(os.getenv("UPLOAD_PART_MAX_BYTES", str(64 * 1024 * 1024))))
+UPLOAD_SESSION_TTL_H = float(os.getenv("UPLOAD_SESSION_TTL_H", "24"))
+TRANSCRIPT_MAX_BYTES = int(os.getenv("TRANSCRIPT_MAX_BYTES", str(20 * 1024 * 1024)))
+
+_EOF = object()
+_ABORT = object()
+
+
+class UploadAborted(IOError):
+    pass
+
+
+class UploadPipe:
+    """File-like bridge: the event loop ``write``s chunks, a storage thread ``read``s them."""
+
+    def __init__(self, max_chunks: int = UPLOAD_PIPE_CHUNKS) -> None:
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_chunks)
+        self._rest = b""
+        self._eof = False
+        self._aborted = False
+        self._reader_gone = False
+        # the writer waits for queue space on this loop instead of blocking a thread on ``put``
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._space = asyncio.Event()
+        self.bytes_read = 0
+        self.hasher = hashlib.sha256()
+
+    # -- event loop side --
+
+    async def _put(self, item) -> None:
+        self._loop = self._loop or asyncio.get_running_loop()
+        # stops once the upload ended (its future carries the outcome) or was aborted
+        while not (self._aborted or self._reader_gone):
+            self._space.clear()
+            try:
+                self._q.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            try:
+                await asyncio.wait_for(self._space.wait(), 0.2)  # the timeout covers a wake-up sent before clear()
+            except asyncio.TimeoutError:
+                pass
+
+    async def write(self, chunk: bytes) -> None:
+        if chunk:
+            await self._put(chunk)
+
+    async def close(self) -> None:
+        await self._put(_EOF)
+
+    def abort(self) -> None:
+        self._aborted = True
+        while True:
+            try:
+                self._q.put_nowait(_ABORT)
+                return
+            except queue.Full:
+                try:
+                    self._q.get_nowait()
+                except queue.Empty:
+                    pass
+
+    # -- storage thread side --
+
+    def _wake_writer(self) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._space.set)
+
+    def reader_done(self) -> None:
+        self._reader_gone = True
+        self._wake_writer()
+
+    def read(self, size: int = -1) -> bytes:
+        # fill the whole request in one go: the MinIO client concatenates what read() returns,
+        # so handing it network-sized pieces would make every part a quadratic copy
+        out, have = [], 0
+        if self._rest:
+            out.append(self._rest)
+            have = len(self._rest)
+            self._rest = b""
+        while (size < 0 or have < size) and not self._eof:
+            item = self._q.get()
+            self._wake_writer()
+            if item is _ABORT or self._aborted:
+                raise UploadAborted("upload aborted")
+            if item is _EOF:
+                self._eof = True
+                break
+            out.append(item)
+            have += len(item)
+        data = b"".join(out)
+        if 0 <= size < len(data):
+            data, self._rest = data[:size], data[size:]
+        self.bytes_read += len(data)
+        self.hasher.update(data)  # releases the GIL for large buffers
+        return data
+
+
+class UploadMetrics:
+    def __init__(self, window: int = 256) -> None:
+        self.uploads = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.bytes_total = 0
+        self.seconds_total = 0.0
+        self._recent: deque[tuple[float, int]] = deque(maxlen=window)
+
+    def record(self, size: int, seconds: float, ok: bool) -> None:
+        if not ok:
+            self.failed += 1
+            return
+        self.uploads += 1
+        self.bytes_total += size
+        self.seconds_total += seconds
+        self._recent.append((seconds, size))
+
+    def stats(self) -> dict:
+        durations = sorted(s for s, _ in self._recent)
+        rates = sorted(b / s / 2**20 for s, b in self._recent if s > 0)
+
+        def pct(values: list[float], p: float) -> Optional[float]:
+            return round(values[min(len(values) - 1, int(p * len(values)))], 3) if values else None
+
+        return {
+            "uploads": self.uploads,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "bytes_total": self.bytes_total,
+            "avg_mib_per_s": round(self.bytes_total / self.seconds_total / 2**20, 2) if self.seconds_total else None,
+            "recent_duration_s_p50": pct(durations, 0.5),
+            "recent_duration_s_p95": pct(durations, 0.95),
+            "recent_mib_per_s_p50": pct(rates, 0.5),
+        }
+
+
+upload_metrics = UploadMetrics()
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # dedicated threads: long uploads must not exhaust the default pool used for sync endpoints
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+    return _executor
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_storage(fn, *args):
+    """Run a blocking storage call on the upload threads."""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+async def read_body(request: Request, limit: int) -> bytes:
+    """Read a raw (non-form) request body, rejecting it with 413 as soon as it exceeds ``limit``."""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="body too large")
+    out, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="body too large")
+        out.append(chunk)
+    return b"".join(out)
+
+
+def _put_object(key: str, pipe: UploadPipe, content_type: str):
+    try:
+        # one part in flight: parallel part uploads would queue unbounded part buffers
+        return storage.get_client().put_object(
+            storage.MINIO_BUCKET,
+            key,
+            pipe,
+            length=-1,
+            part_size=UPLOAD_PART_SIZE,
+            num_parallel_uploads=1,
+            content_type=content_type,
+        )
+    finally:
+        pipe.reader_done()
+
+
+class UploadResult(NamedTuple):
+    size: int
+    sha256: str
+
+
+async def stream_upload(chunks: AsyncIterator[bytes], key: str, content_type: Optional[str] = None) -> UploadResult:
+    """Upload ``chunks`` to ``MINIO_BUCKET/key`` without buffering the object."""
+    await storage.ensure_bucket()
+    pipe = UploadPipe()
+    upload_metrics.in_flight += 1
+    started = time.perf_counter()
+    future = asyncio.get_running_loop().run_in_executor(
+        _get_executor(), _put_object, key, pipe, content_type or "application/octet-stream"
+    )
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if UPLOAD_MAX_BYTES and size > UPLOAD_MAX_BYTES:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="upload too large")
+            if future.done():
+                break  # storage gave up early; its error is raised below
+            await pipe.write(chunk)
+        await pipe.close()
+        await future
+    except BaseException as e:
+        pipe.abort()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())  # the thread unwinds on its own
+        upload_metrics.record(size, time.perf_counter() - started, ok=False)
+        if isinstance(e, (HTTPException, asyncio.CancelledError)) or not isinstance(e, Exception):
+            raise
+        logger.exception("upload of %s failed after %d bytes", key, size)
+        # storage errors name endpoints, buckets and S3 codes: those stay in the log
+        raise HTTPException(status_code=500, detail="upload failed")
+    finally:
+        upload_metrics.in_flight -= 1
+    seconds = time.perf_counter() - started
+    upload_metrics.record(size, seconds, ok=True)
+    logger.info("uploaded %s: %d bytes in %.2fs (%.1f MiB/s)", key, size, seconds, size / max(seconds, 1e-9) / 2**20)
+    return UploadResult(size, pipe.hasher.hexdigest())
+
+
+class MultipartFileStream:
+    """Streams one file field out of a ``multipart/form-data`` request body without spooling it.
+
+    ``await open()`` reads until the file part's headers are parsed (``filename``/``content_type``
+    become available), then ``chunks()`` yields its bytes. Other fields are ignored.
+    """
+
+    def __init__(self, request: Request, field: str = "file") -> None:
+        self.request = request
+        self.field = field
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self._body = request.stream()
+        self._pending: deque[bytes] = deque()
+        self._header_name = b""
+        self._header_value = b""
+        self._headers: dict[bytes, bytes] = {}
+        self._in_file = False
+        self._done = False
+        self._parser = None
+
+    # -- python-multipart callbacks --
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        if name == self.field and b"filename" in options and self.filename is None:
+            self._in_file = True
+            self.filename = os.path.basename(options[b"filename"].decode("utf-8", "replace")) or "upload"
+            ctype = self._headers.get(b"content-type")
+            self.content_type = ctype.decode("latin-1") if ctype else None
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file = False
+            self._done = True
+
+    # -- driving the parser --
+
+    async def _feed(self) -> bool:
+        try:
+            chunk = await self._body.__anext__()
+        except StopAsyncIteration:
+            self._parser.finalize()
+            return False
+        if chunk:
+            self._parser.write(chunk)
+        return True
+
+    async def open(self) -> None:
+        ctype, params = parse_options_header(self.request.headers.get("content-type", ""))
+        if ctype != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="expected multipart/form-data")
+        self._parser = multipart.MultipartParser(
+            params[b"boundary"],
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+            },
+        )
+        while self.filename is None:
+            if not await self._feed():
+                raise HTTPException(status_code=422, detail=f"missing file field '{self.field}'")
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            while self._pending:
+                yield self._pending.popleft()
+            if self._done or not await self._feed():
+                return
@@ -0,0 +1,123 @@
+"""WebSocket connection hub.
+
+Every socket gets its own ``Connection`` with a bounded outbound queue drained by a dedicated
+sender task, so handlers never await a slow client's socket. When a queue is full the oldest
+droppable message (a stale hint) is discarded; a client that cannot accept a single frame within
+``WS_SEND_TIMEOUT_S`` is disconnected.
+"""
+import asyncio
+import logging
+import os
+from collections import Counter, deque
+from typing import Any, Optional
+from uuid import uuid4
+
+from fastapi import WebSocket
+
+
+logger = logging.getLogger(__name__)
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "32"))
+WS_SEND_TIMEOUT_S = float(os.getenv("WS_SEND_TIMEOUT_S", "5"))
+
+
+class Connection:
+    def __init__(self, ws: WebSocket, identity: str, maxsize: int = WS_QUEUE_SIZE) -> None:
+        self.id = uuid4().hex
+        self.ws = ws
+        self.identity = identity
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+        self._queue: deque[tuple[Any, bool]] = deque()
+        self._ready = asyncio.Event()
+        self._sender: Optional[asyncio.Task] = None
+        self._work: Optional[asyncio.Task] = None
+
+    def send(self, message: Any, droppable: bool = True) -> bool:
+        """Queue ``message`` without blocking; returns False if it was dropped."""
+        if self.closed:
+            return False
+        if len(self._queue) >= self.maxsize:
+            for i, (_, can_drop) in enumerate(self._queue):
+                if can_drop:
+                    del self._queue[i]
+                    self.dropped += 1
+                    break
+            else:
+                self.dropped += 1
+                return False
+        self._queue.append((message, droppable))
+        self._ready.set()
+        return True
+
+    def discard_pending(self) -> None:
+        """Drop queued droppable messages, e.g. hints for a question the student has moved past."""
+        kept = deque(item for item in self._queue if not item[1])
+        self.dropped += len(self._queue) - len(kept)
+        self._queue = kept
+
+    def run(self, coro) -> asyncio.Task:
+        """Run per-connection work, cancelling whatever the previous request was still doing."""
+        if self._work is not None and not self._work.done():
+            self._work.cancel()
+        self._work = asyncio.create_task(coro)
+        return self._work
+
+    async def _send_loop(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    message, _ = self._queue.popleft()
+                    await asyncio.wait_for(self.ws.send_json(message), WS_SEND_TIMEOUT_S)
+                self._ready.clear()
+        except asyncio.TimeoutError:
+            logger.info("closing slow websocket %s (%s)", self.id, self.identity)
+            self.closed = True
+            try:
+                await self.ws.close(code=1013)
+            except Exception:  # noqa: BLE001
+                pass
+        except Exception:  # noqa: BLE001 - socket already gone
+            self.closed = True
+
+    def start(self) -> None:
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def stop(self) -> None:
+        self.closed = True
+        for task in (self._work, self._sender):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+class ConnectionHub:
+    def __init__(self) -> None:
+        self._connections: dict[str, Connection] = {}
+
+    async def connect(self, ws: WebSocket, identity: str) -> Connection:
+        await ws.accept()
+        conn = Connection(ws, identity)
+        conn.start()
+        self._connections[conn.id] = conn
+        return conn
+
+    async def disconnect(self, conn: Connection) -> None:
+        self._connections.pop(conn.id, None)
+        await conn.stop()
+
+    def for_identity(self, identity: str) -> list[Connection]:
+        return [c for c in self._connections.values() if c.identity == identity]
+
+    def stats(self) -> dict:
+        per_identity = Counter(c.identity for c in self._connections.values())
+        return {
+            "connections": len(self._connections),
+            "identities": len(per_identity),
+            "queued": sum(len(c._queue) for c in self._connections.values()),
+            "dropped": sum(c.dropped for c in self._connections.values()),
+        }
+
+
+hub = ConnectionHub()
@@ -0,0 +1,170 @@
+"""A local OpenAI-compatible model server with provider-like limits, for tests and benchmarks.
+
+``POST /v1/chat/completions`` answers after ``latency`` (+ jitter) seconds. Requests and tokens
+per minute are enforced with token buckets and, like hosted providers, rejected with ``429`` and
+``Retry-After`` when exhausted; more than ``max_concurrency`` requests in flight get ``503``.
+Replies are deterministic: a prompt that asks for a ``"score"`` gets a JSON verdict, anything else
+a short canned text. With ``"stream": true`` the reply is sent as SSE chunks, one word every
+``token_delay`` seconds.
+
+    python -m apps.api.benchmarks.fake_llm [--port 8089] [--latency 0.2] [--rpm 600] [--tpm 0]
+
+Point the API at it with ``LLM_PROVIDER=openai LLM_BASE_URL=http://localhost:8089/v1``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class _Bucket:
+    def __init__(self, per_minute: float) -> None:
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * 10)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, amount: float) -> Optional[float]:
+        """``None`` when taken, else seconds until ``amount`` is available."""
+        if self.rate <= 0:
+            return None
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            self.level -= amount
+            return None
+        return (amount - self.level) / self.rate
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def reply_for(messages: list[dict]) -> str:
+    text = "\n".join(m.get("content", "") for m in messages)
+    digest = int(hashlib.blake2b(text.encode(), digest_size=4).hexdigest(), 16)
+    if '"score"' in text:
+        return json.dumps({"score": digest % 6, "feedback": "Covers the main idea; add a concrete example."})
+    return "Think about which quantity stays the same, then write the relation down before solving it."
+
+
+def create_app(
+    latency: float = 0.2,
+    jitter: float = 0.05,
+    rpm: float = 0,
+    tpm: float = 0,
+    max_concurrency: int = 0,
+    token_delay: float = 0.02,
+) -> FastAPI:
+    app = FastAPI(title="fake llm")
+    requests, tokens = _Bucket(rpm), _Bucket(tpm)
+    stats = {"requests": 0, "ok": 0, "429": 0, "503": 0, "inflight": 0, "peak_inflight": 0, "streams": 0, "aborted": 0}
+    app.state.stats = stats
+
+    def reject(status: int, retry_after: float) -> JSONResponse:
+        stats[str(status)] += 1
+        return JSONResponse(
+            {"error": {"message": "rate limit exceeded" if status == 429 else "overloaded"}},
+            status_code=status,
+            headers={"Retry-After": f"{retry_after:.2f}"},
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(body: dict):
+        stats["requests"] += 1
+        messages = body.get("messages") or []
+        prompt_tokens = sum(_tokens(m.get("content", "")) for m in messages)
+        wait = requests.take(1)
+        if wait is None:
+            wait = tokens.take(prompt_tokens + int(body.get("max_tokens") or 256))
+        if wait is not None:
+            return reject(429, wait)
+        if max_concurrency and stats["inflight"] >= max_concurrency:
+            return reject(503, latency)
+        stats["inflight"] += 1
+        stats["peak_inflight"] = max(stats["peak_inflight"], stats["inflight"])
+        if body.get("stream"):
+            stats["streams"] += 1
+            return StreamingResponse(stream(body, reply_for(messages)), media_type="text/event-stream")
+        try:
+            await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+        finally:
+            stats["inflight"] -= 1
+        text = reply_for(messages)
+        stats["ok"] += 1
+        return {
+            "id": f"fake-{stats['requests']}",
+            "object": "chat.completion",
+            "model": body.get("model") or "fake",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": _tokens(text), "total_tokens": prompt_tokens + _tokens(text)},
+        }
+
+    async def stream(body: dict, text: str):
+        finished = False
+        try:
+            await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))  # time to first token
+            for i, word in enumerate(text.split(" ")):
+                chunk = {"object": "chat.completion.chunk", "model": body.get("model") or "fake",
+                         "choices": [{"index": 0, "delta": {"content": (" " if i else "") + word}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_delay)
+            yield "data: [DONE]\n\n"
+            finished = True
+            stats["ok"] += 1
+        finally:
+            stats["inflight"] -= 1
+            if not finished:
+                stats["aborted"] += 1
+
+    @app.get("/stats")
+    def get_stats() -> dict:
+        return stats
+
+    return app
+
+
+def serve_in_thread(app: FastAPI, port: int = 0):
+    """Start ``app`` with uvicorn on a daemon thread; returns ``(server, base_url)`` once it listens."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, name="fake-llm", daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    bound = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{bound}/v1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--rpm", type=float, default=600)
+    parser.add_argument("--tpm", type=float, default=0)
+    parser.add_argument("--max-concurrency", type=int, default=0)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(
+        create_app(args.latency, args.jitter, args.rpm, args.tpm, args.max_concurrency, args.token_delay),
+        host="0.0.0.0",
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Rubric-grading-style LLM calls: blocking prefork workers vs. the async ``LLMClient``.
+
+A local ``fake_llm`` server plays the provider (fixed latency, a request-per-minute quota answered
+with 429s, a concurrency cap answered with 503s). The same batch of calls is made
+
+- ``blocking``: ``--workers`` threads, each making one call at a time, as prefork Celery workers
+  blocked in a sync HTTP client would; throughput is capped at ``workers / latency``;
+- ``async``: one event loop through ``LLMClient``. The client is given no quota (``--client-rpm 0``),
+  so the adaptive limiter has to find the provider's limit from its 429/503 answers alone.
+
+    python -m apps.api.benchmarks.llm_throughput [--calls 1000] [--latency 0.2] [--server-rpm 6000]
+        [--server-concurrency 48] [--workers 4] [--client-rpm 0] [--json]
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+
+from apps.api.app.services import llm
+from apps.api.benchmarks.fake_llm import create_app, serve_in_thread
+
+
+MESSAGES = [
+    {"role": "system", "content": 'Reply with JSON {"score": 0-5, "feedback": "..."}'},
+    {"role": "user", "content": "Question: why does ice float?\n\nStudent answer: it is less dense than water."},
+]
+
+
+def _pct(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1) if ordered else 0.0
+
+
+def _blocking(base_url: str, calls: int, workers: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    todo = iter(range(calls))
+    lock = threading.Lock()
+
+    def worker() -> None:
+        nonlocal errors
+        with httpx.Client(timeout=30) as http:
+            while True:
+                with lock:
+                    if next(todo, None) is None:
+                        return
+                while True:  # a blocked worker just retries after Retry-After
+                    t0 = time.perf_counter()
+                    r = http.post(f"{base_url}/chat/completions", json={"model": "fake", "messages": MESSAGES, "max_tokens": 64})
+                    if r.status_code == 200:
+                        latencies.append(time.perf_counter() - t0)
+                        break
+                    errors += 1
+                    time.sleep(float(r.headers.get("retry-after", "0.5")))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - t0
+    return {"mode": f"blocking x{workers}", "seconds": round(seconds, 2), "calls_per_s": round(calls / seconds, 1),
+            "p50_ms": _pct(latencies, 0.5), "p99_ms": _pct(latencies, 0.99), "rejected": errors}
+
+
+async def _async(base_url: str, calls: int, client_rpm: float) -> dict:
+    client = llm.LLMClient(
+        provider=llm.OpenAICompatibleProvider(base_url=base_url, model="fake"),
+        rpm=client_rpm,
+        tpm=0,
+        concurrency=(llm.LLM_CONCURRENCY_INITIAL, llm.LLM_CONCURRENCY_MIN, 256),
+        retry_base=0.1,
+        max_retries=20,
+    )
+    latencies: list[float] = []
+
+    async def one() -> None:
+        t0 = time.perf_counter()
+        await client.complete(MESSAGES, max_tokens=64)
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    results = await llm.gather_limited([one] * calls)
+    seconds = time.perf_counter() - t0
+    await client.aclose()
+    stats = client.stats()
+    return {"mode": "async", "seconds": round(seconds, 2), "calls_per_s": round(calls / seconds, 1),
+            "p50_ms": _pct(latencies, 0.5), "p99_ms": _pct(latencies, 0.99), "rejected": stats["retries"],
+            "failed": sum(isinstance(r, Exception) for r in results), "final_concurrency": stats["concurrency_limit"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--server-rpm", type=float, default=6000)
+    parser.add_argument("--server-concurrency", type=int, default=48)
+    parser.add_argument("--workers", type=int, default=4, help="blocking worker processes to emulate")
+    parser.add_argument("--client-rpm", type=float, default=0, help="client-side request quota (0 = rely on adaptation)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    app = create_app(latency=args.latency, jitter=args.latency / 4, rpm=args.server_rpm, max_concurrency=args.server_concurrency)
+    server, base_url = serve_in_thread(app)
+    results = []
+    try:
+        results.append(_blocking(base_url, args.calls, args.workers))
+        if args.server_rpm:
+            time.sleep(10.5)  # the provider's buckets hold 10 s of quota: start the second run from full
+        results.append(asyncio.run(_async(base_url, args.calls, args.client_rpm)))
+    finally:
+        server.should_exit = True
+
+    report = {
+        "provider": {"latency_s": args.latency, "rpm": args.server_rpm, "max_concurrency": args.server_concurrency,
+                     "ceiling_calls_per_s": round(min(args.server_rpm / 60 or float("inf"), args.server_concurrency / args.latency), 1)},
+        "calls": args.calls,
+        "results": results,
+        "server": dict(app.state.stats),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(" ".join(f"{k}={v}" for k, v in report["provider"].items()), f"calls={args.calls}")
+    cols = ["mode", "seconds", "calls_per_s", "p50_ms", "p99_ms", "rejected"]
+    print(" ".join(f"{c:>14}" for c in cols))
+    for r in results:
+        print(" ".join(f"{r[c]:>14}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Login (bcrypt verify) throughput and event-loop responsiveness.
+
+``inline`` verifies on the event loop like the old sync handlers did on their request thread;
+``thread`` and ``process`` go through ``HashingPool``. Loop lag is how late a 10 ms ticker fires
+while the logins are running — a proxy for how much every other route suffers.
+
+    python -m apps.api.benchmarks.login_throughput [--logins 200] [--rounds 10] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+
+async def _ticker(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - t0 - 0.01)
+
+
+def _pct(values: list[float], p: float) -> float:
+    ordered = sorted(values) or [0.0]
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+
+async def _bench(mode: str, logins: int, password: str, hashed: str) -> dict:
+    from apps.api.app.passwords import HashingPool, verify_and_update
+
+    pool = None if mode == "inline" else HashingPool(kind=mode, max_pending=logins)
+    if pool is not None:
+        await pool.run(verify_and_update, password, hashed)  # warm up workers
+
+    async def one() -> None:
+        if pool is None:
+            verify_and_update(password, hashed)
+        else:
+            await pool.run(verify_and_update, password, hashed)
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    await asyncio.sleep(0)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await ticker
+    if pool is not None:
+        pool.shutdown()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "logins_per_s": round(logins / elapsed, 1),
+        "loop_lag_p50_ms": round(_pct(lags, 0.5), 2),
+        "loop_lag_max_ms": round(_pct(lags, 1.0), 2),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"])
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    # must be set before passwords is imported so the workers hash with the same cost
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    from apps.api.app.passwords import hash_password
+
+    password = "Secret123!"
+    hashed = hash_password(password)
+    results = [await _bench(mode, args.logins, password, hashed) for mode in args.modes]
+
+    if args.json:
+        print(json.dumps({"cpus": os.cpu_count(), "rounds": args.rounds, "results": results}, indent=2))
+        return
+    print(f"cpus={os.cpu_count()} rounds={args.rounds}")
+    print(f"{'mode':<8} {'logins/s':>10} {'seconds':>9} {'lag p50 ms':>11} {'lag max ms':>11}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['logins_per_s']:>10} {r['seconds']:>9} {r['loop_lag_p50_ms']:>11} {r['loop_lag_max_ms']:>11}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""Hint throttle latency vs. number of concurrent clients.
+
+Compares the previous global-lock throttle with the per-key limiter used by ``/realtime``.
+A fraction of clients request faster than the window allows (and must wait for their own slot);
+the latency reported is for everyone else, which should stay flat for the per-key limiter.
+
+    python -m apps.api.benchmarks.realtime_throttle [--clients 10 100 1000] [--json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from apps.api.app.ratelimit import MemoryRateLimiter, throttle
+
+
+WINDOW = 0.05
+
+
+class GlobalLockThrottle:
+    """The old ``_throttle``: one asyncio.Lock held while sleeping."""
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._last: dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, key: str) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delta = now - self._last.get(key, 0.0)
+            if delta < self.window:
+                await asyncio.sleep(self.window - delta)
+            self._last[key] = time.monotonic()
+
+
+async def _run(acquire, clients: int, hot_ratio: float, rounds: int = 5) -> list[float]:
+    """Every client sends ``rounds`` hint requests; hot clients retry twice as fast as the window allows."""
+    latencies: list[float] = []
+    hot = max(1, int(clients * hot_ratio))
+
+    async def client(i: int) -> None:
+        key = f"c{i}"
+        is_hot = i < hot
+        period = WINDOW / 2 if is_hot else WINDOW * 4
+        await asyncio.sleep(random.uniform(0, period))
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            await acquire(key)
+            if not is_hot:
+                latencies.append(time.perf_counter() - t0)
+            await asyncio.sleep(period)
+
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return latencies
+
+
+def _pct(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--hot-ratio", type=float, default=0.05)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.clients:
+        legacy = GlobalLockThrottle(WINDOW)
+        limiter = MemoryRateLimiter(WINDOW)
+        for name, acquire in (("global_lock", legacy), ("per_key", lambda k: throttle(limiter, k))):
+            if name == "global_lock" and n > 1000:
+                continue  # serialised sleeps make this run for minutes; the trend is already clear
+            lat = await _run(acquire, n, args.hot_ratio)
+            results.append(
+                {
+                    "impl": name,
+                    "clients": n,
+                    "p50_ms": round(_pct(lat, 0.50), 3),
+                    "p99_ms": round(_pct(lat, 0.99), 3),
+                    "mean_ms": round(statistics.fmean(lat) * 1000, 3),
+                }
+            )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'impl':<12} {'clients':>8} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10}")
+    for r in results:
+        print(f"{r['impl']:<12} {r['clients']:>8} {r['p50_ms']:>10} {r['p99_ms']:>10} {r['mean_ms']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
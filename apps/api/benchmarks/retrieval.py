@@ -0,0 +1,211 @@
+"""Retrieval quality and latency over a synthetic lecture corpus with known answers.
+
+Each video is a transcript of ~4 s cues of Zipf-distributed filler words. For every query a
+"fact" cue (a handful of rare words) is planted at a random time in a random video; the query
+repeats most of those words, shuffled and mixed with question words. Distractor cues elsewhere
+share part of each fact, so lexical overlap alone is not enough. A hit is relevant when it comes
+from that video and its time span covers the fact cue, so overlapping windows can both count.
+
+The corpus is segmented with ``video_rag.segment_cues`` and embedded with the configured model,
+then ``SegmentIndex`` is built and every (alpha, nprobe) combination is scored: recall@1/5/k, MRR,
+query latency percentiles; plus embedding and index build time and index memory. ``--nprobe all``
+scans every IVF list, i.e. exact vector search, separating ANN loss from embedding quality.
+
+    python -m apps.api.benchmarks.retrieval [--videos 100] [--minutes 60] [--queries 500]
+        [--distractors 2] [--alpha 0,0.5,1] [--nprobe 4,8,all] [--window 30] [--overlap 5] [--json]
+        [--save corpus.json | --load corpus.json]
+"""
+import argparse
+import itertools
+import json
+import random
+import resource
+import time
+
+
+CUE_MS = 4000
+QUESTION_WORDS = ["what", "how", "explain", "why", "does", "the", "lecture", "say", "about"]
+
+
+def _words(rng: random.Random, n: int, syllables: int) -> list[str]:
+    parts = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]  # 70 syllables
+    out: set[str] = set()
+    while len(out) < n:
+        out.add("".join(rng.choice(parts) for _ in range(syllables)))
+    return sorted(out)
+
+
+def generate(videos: int, minutes: int, queries: int, distractors: int = 2, seed: int = 7) -> dict:
+    """``{"videos": {id: [[start_ms, end_ms, text], ...]}, "queries": [{text, video_id, at_ms}]}``"""
+    rng = random.Random(seed)
+    common = _words(rng, 4000, 3)
+    rare = [w for w in _words(rng, 20000, 4) if w not in set(common)]
+    cum = list(itertools.accumulate(1 / (i + 1) for i in range(len(common))))  # Zipf
+    cues_per_video = minutes * 60_000 // CUE_MS
+    corpus: dict[int, list] = {}
+    for vid in range(1, videos + 1):
+        corpus[vid] = [
+            [i * CUE_MS, i * CUE_MS + CUE_MS - 200, " ".join(rng.choices(common, cum_weights=cum, k=rng.randint(6, 12)))]
+            for i in range(cues_per_video)
+        ]
+    planted = []
+    for _ in range(queries):
+        vid = rng.randint(1, videos)
+        i = rng.randrange(cues_per_video)
+        fact = rng.sample(rare, 6)
+        cue = corpus[vid][i]
+        cue[2] = " ".join(rng.choices(common, cum_weights=cum, k=3) + fact)
+        for _ in range(distractors):
+            other = corpus[rng.randint(1, videos)][rng.randrange(cues_per_video)]
+            if other is not cue:
+                other[2] += " " + " ".join(rng.sample(fact, 3))
+        asked = rng.sample(fact, 4) + rng.sample(QUESTION_WORDS, 3)
+        rng.shuffle(asked)
+        planted.append({"text": " ".join(asked), "video_id": vid, "at_ms": cue[0]})
+    return {"videos": {str(v): c for v, c in corpus.items()}, "queries": planted}
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def _rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KiB
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=100)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--alpha", default="0,0.5,1", help="comma-separated lexical/vector weights")
+    parser.add_argument("--distractors", type=int, default=2, help="partial copies of each fact elsewhere")
+    parser.add_argument("--nprobe", default="4,8,all", help="comma-separated IVF lists probed ('all' = exact)")
+    parser.add_argument("--candidates", type=int, default=None)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--window", type=float, default=None, help="segment window seconds")
+    parser.add_argument("--overlap", type=float, default=None, help="segment overlap seconds")
+    parser.add_argument("--max-chars", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", help="write the generated corpus to this JSON file")
+    parser.add_argument("--load", help="read a corpus written by --save instead of generating one")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    import numpy as np
+
+    from apps.api.app.services import retrieval, video_rag
+    from apps.api.app.services.embeddings import EmbeddingService, get_embedder, tokenize
+
+    if args.load:
+        with open(args.load) as f:
+            corpus = json.load(f)
+    else:
+        corpus = generate(args.videos, args.minutes, args.queries, args.distractors, args.seed)
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump(corpus, f)
+
+    window_s = args.window if args.window is not None else video_rag.SEGMENT_WINDOW_S
+    overlap_s = args.overlap if args.overlap is not None else video_rag.SEGMENT_OVERLAP_S
+    max_chars = args.max_chars if args.max_chars is not None else video_rag.SEGMENT_MAX_CHARS
+    segments = []  # (segment id, video id, start_ms, end_ms, text)
+    for vid, cues in corpus["videos"].items():
+        for s in video_rag.segment_cues(
+            (video_rag.Cue(*c) for c in cues), int(window_s * 1000), int(overlap_s * 1000), max_chars
+        ):
+            segments.append((len(segments) + 1, int(vid), s.start_ms, s.end_ms, s.text))
+
+    embedder = EmbeddingService(backend=get_embedder(), use_redis=False, cache_size=0)
+    t0 = time.perf_counter()
+    vectors = embedder.embed_sync([s[4] for s in segments])
+    embed_s = time.perf_counter() - t0
+
+    rss_before = _rss_mib()
+    t0 = time.perf_counter()
+    batch = retrieval.LOAD_BATCH
+    index = retrieval.SegmentIndex.build(
+        ([(*s, v) for s, v in zip(segments[lo : lo + batch], vectors[lo : lo + batch])] for lo in range(0, len(segments), batch)),
+        nlist=args.nlist if args.nlist is not None else retrieval.RETRIEVAL_NLIST,
+    )
+    build_s = time.perf_counter() - t0
+    del vectors
+    peak_rss_delta = _rss_mib() - rss_before
+
+    queries = corpus["queries"]
+    by_video: dict[int, list] = {}
+    for s in segments:
+        by_video.setdefault(s[1], []).append(s)
+    relevant = [{s[0] for s in by_video.get(q["video_id"], []) if s[2] <= q["at_ms"] < s[3]} for q in queries]
+    query_vectors = EmbeddingService(backend=get_embedder(), use_redis=False).embed_sync([q["text"] for q in queries])
+    query_terms = [tokenize(q["text"]) for q in queries]
+
+    candidates = args.candidates if args.candidates is not None else retrieval.RETRIEVAL_CANDIDATES
+    results = []
+    for alpha in (float(a) for a in args.alpha.split(",")):
+        for nprobe in (len(index.centroids) if n == "all" else int(n) for n in args.nprobe.split(",")):
+            if alpha == 0 and results and results[-1]["alpha"] == 0:
+                continue  # BM25 only: nprobe is irrelevant
+            index.search(query_vectors[0], query_terms[0], args.k, alpha=alpha, candidates=candidates, nprobe=nprobe)  # warm up
+            latencies, ranks = [], []
+            for qv, terms, rel in zip(query_vectors, query_terms, relevant):
+                t0 = time.perf_counter()
+                hits = index.search(qv, terms, args.k, alpha=alpha, candidates=candidates, nprobe=nprobe)
+                latencies.append(time.perf_counter() - t0)
+                ranks.append(next((i + 1 for i, h in enumerate(hits) if h.segment_id in rel), None))
+            n = len(ranks)
+
+            def recall(k: int) -> float:
+                return round(sum(1 for r in ranks if r is not None and r <= k) / n, 4)
+
+            results.append(
+                {
+                    "alpha": alpha,
+                    "nprobe": nprobe,
+                    "candidates": candidates,
+                    "recall@1": recall(1),
+                    "recall@5": recall(5),
+                    f"recall@{args.k}": recall(args.k),
+                    "mrr": round(sum(1 / r for r in ranks if r is not None) / n, 4),
+                    "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3),
+                    "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+                    "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+                    "qps": round(n / sum(latencies), 1),
+                }
+            )
+
+    report = {
+        "corpus": {
+            "videos": len(corpus["videos"]),
+            "segments": len(segments),
+            "queries": len(queries),
+            "window_s": window_s,
+            "overlap_s": overlap_s,
+            "max_chars": max_chars,
+            "model": embedder.name,
+        },
+        "build": {
+            "embed_s": round(embed_s, 3),
+            "index_s": round(build_s, 3),
+            "index_mib": round(index.nbytes / 2**20, 2),
+            "peak_rss_delta_mib": round(peak_rss_delta, 1),
+            "lists": len(index.centroids),
+            "vocabulary": len(index.vocab),
+        },
+        "results": results,
+        "numpy": np.__version__,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(" ".join(f"{k}={v}" for k, v in {**report["corpus"], **report["build"]}.items()))
+    cols = ["alpha", "nprobe", "recall@1", "recall@5", f"recall@{args.k}", "mrr", "p50_ms", "p99_ms", "qps"]
+    print(" ".join(f"{c:>10}" for c in cols))
+    for r in results:
+        print(" ".join(f"{r[c]:>10}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Per-row cost of serialising a list endpoint body.
+
+``orm+model`` is the regular path (entities validated into ``FormOut``, dumped to JSON-able
+dicts, encoded with stdlib ``json``); ``rows+adapter`` and ``rows+orjson`` are the ``fastjson``
+path over plain column mappings, without and with orjson.
+
+    python -m apps.api.benchmarks.serialization [--rows 500] [--repeat 50] [--json]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+
+def _sample(n: int) -> tuple[list, list[dict]]:
+    from apps.api.app.models.entities import Form
+
+    base = datetime(2024, 1, 1)
+    rows = [
+        {
+            "id": i,
+            "title": f"Quiz {i}",
+            "description": "Weekly practice quiz covering the previous lecture.",
+            "owner_id": 1 + i % 7,
+            "course_id": 1 + i % 3,
+            "settings_json": {"shuffle": bool(i % 2), "time_limit_min": 30, "tags": ["week", str(i % 12)]},
+            "created_at": base + timedelta(minutes=i),
+            "updated_at": base + timedelta(minutes=i, seconds=5),
+        }
+        for i in range(n)
+    ]
+    return [Form(**r) for r in rows], rows
+
+
+def _time(fn, repeat: int) -> tuple[float, int]:
+    fn()  # warm up
+    size = 0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        size = len(fn())
+    return (time.perf_counter() - t0) / repeat, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    from pydantic import TypeAdapter
+
+    from apps.api.app import fastjson
+    from apps.api.app.schemas.forms import FormOut, FormRow
+
+    entities, rows = _sample(args.rows)
+    model_adapter = TypeAdapter(list[FormOut])
+    encoder = fastjson.RowEncoder(FormRow)
+
+    def orm_model() -> bytes:
+        items = model_adapter.validate_python(entities, from_attributes=True)
+        return json.dumps(model_adapter.dump_python(items, mode="json")).encode()
+
+    paths = {"orm+model": orm_model, "rows+adapter": lambda: encoder.adapter.dump_json(rows)}
+    if fastjson.orjson is not None:
+        paths["rows+orjson"] = lambda: fastjson.orjson.dumps(rows)
+
+    results = []
+    for name, fn in paths.items():
+        seconds, size = _time(fn, args.repeat)
+        results.append(
+            {
+                "path": name,
+                "rows": args.rows,
+                "ms_per_response": round(seconds * 1000, 3),
+                "us_per_row": round(seconds / args.rows * 1e6, 3),
+                "bytes": size,
+            }
+        )
+    baseline = results[0]["ms_per_response"]
+    for r in results:
+        r["speedup"] = round(baseline / r["ms_per_response"], 2) if r["ms_per_response"] else None
+
+    if args.json:
+        print(json.dumps({"results": results}, indent=2))
+        return
+    print(f"{'path':<14} {'ms/resp':>9} {'us/row':>8} {'bytes':>9} {'speedup':>8}")
+    for r in results:
+        print(f"{r['path']:<14} {r['ms_per_response']:>9} {r['us_per_row']:>8} {r['bytes']:>9} {r['speedup']:>8}")
+
+
+if __name__ == "__main__":
+    main()
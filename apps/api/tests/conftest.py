@@ -0,0 +1,14 @@
+"""Test settings: sqlite on the sync session and in-memory storage, pub/sub and Celery transport.
+
+They are read at import time, so they are set here, before any test imports ``apps.api.app``.
+"""
+import os
+import tempfile
+
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='edurag-tests-')}/test.db")
+os.environ.setdefault("DB_ASYNC", "false")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("PUBSUB_BACKEND", "memory")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.api.app.main import app
+from apps.api.app.models.db import SessionLocal
+from apps.api.app.models.entities import User
+from apps.api.app.tokens import create_token
+
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        admin = User(email="admin-filter@example.com", password_hash="x", role="admin")
+        db.add(admin)
+        db.add_all(
+            User(email=email, password_hash="x", role="student")
+            for email in ("ab_c@example.com", "abxc@example.com", "ab%c@example.com", "ab\\c@example.com")
+        )
+        db.commit()
+        token = create_token(sub=str(admin.id), role="admin")
+    with TestClient(app) as c:
+        c.headers["Authorization"] = f"Bearer {token}"
+        yield c
+
+
+@pytest.mark.parametrize(
+    "prefix, expected",
+    [
+        ("ab_", {"ab_c@example.com"}),
+        ("AB%", {"ab%c@example.com"}),
+        ("ab\\", {"ab\\c@example.com"}),
+        ("ab", {"ab_c@example.com", "abxc@example.com", "ab%c@example.com", "ab\\c@example.com"}),
+    ],
+)
+def test_email_filter_treats_wildcards_literally(client, prefix, expected):
+    r = client.get("/admin/users", params={"email": prefix})
+    assert r.status_code == 200
+    assert {u["email"] for u in r.json()} == expected
+
+
+def test_user_list_pages_follow_the_next_cursor(client):
+    everyone = client.get("/admin/users", params={"limit": 500}).json()
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        r = client.get("/admin/users", params=params)
+        assert len(r.json()) <= 2
+        seen += r.json()
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert [u["id"] for u in seen] == [u["id"] for u in everyone]
+    assert len(everyone) >= 5
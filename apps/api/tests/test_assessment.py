@@ -0,0 +1,131 @@
+from datetime import datetime
+from itertools import zip_longest
+
+import pytest
+from sqlalchemy import select
+
+import apps.api.app.main  # noqa: F401  (creates the schema)
+from apps.api.app.models.db import SessionLocal
+from apps.api.app.models.entities import Answer, Form, Question, Submission, User
+from apps.api.app.services import assessment
+from apps.api.app.services.assessment import CORRECT, INCORRECT, NO_ANSWER, NOT_A_CHOICE, NOT_A_NUMBER
+
+MCQ = {"choices": ["Paris", "Lyon", "Nice"], "answer": 0, "points": 2}
+NUMERIC = {"answer": 9.81, "tolerance": "1%"}
+
+MCQ_ANSWERS = {
+    "Paris": (2, CORRECT),
+    "  paris ": (2, CORRECT),
+    "a": (2, CORRECT),
+    "0": (2, CORRECT),
+    "Lyon": (0, INCORRECT),
+    "B": (0, INCORRECT),
+    "Marseille": (0, NOT_A_CHOICE),
+    "": (0, NO_ANSWER),
+    None: (0, NO_ANSWER),
+}
+NUMERIC_ANSWERS = {
+    "9.81": (1, CORRECT),
+    "9.9": (1, CORRECT),
+    "1,000": (0, INCORRECT),
+    "10.5": (0, INCORRECT),
+    "about ten": (0, NOT_A_NUMBER),
+    "  ": (0, NO_ANSWER),
+}
+
+
+def _key(type_: str, meta: dict) -> assessment.CompiledKey:
+    return assessment.compile_key(Question(id=1, type=type_, prompt="?", metadata_json=meta))
+
+
+@pytest.mark.parametrize("type_, meta, expected", [("mcq", MCQ, MCQ_ANSWERS), ("numeric", NUMERIC, NUMERIC_ANSWERS)])
+def test_column_grading_matches_grading_each_answer_alone(type_, meta, expected):
+    key = _key(type_, meta)
+    column = [c for c in expected for _ in range(3)]  # repeated responses share one verdict
+    scores, feedback = assessment.grade_column(key, column)
+    one_by_one = [assessment.grade_column(key, [c]) for c in column]
+    assert list(zip(scores.tolist(), feedback.tolist())) == [(s[0], f[0]) for s, f in one_by_one]
+    assert list(zip(scores.tolist(), feedback.tolist())) == [expected[c] for c in column]
+
+
+@pytest.mark.parametrize(
+    "type_, meta",
+    [("mcq", {"choices": ["a"]}), ("mcq", {"answer": 0}), ("mcq", {"choices": ["x", "y"], "answer": "z"}), ("numeric", {})],
+)
+def test_malformed_keys_are_rejected(type_, meta):
+    with pytest.raises(ValueError):
+        _key(type_, meta)
+
+
+@pytest.fixture(scope="module")
+def student_id():
+    with SessionLocal() as db:
+        student = User(email="grading@example.com", password_hash="x", role="student")
+        db.add(student)
+        db.commit()
+        return student.id
+
+
+@pytest.fixture
+def form(student_id):
+    """A form with an MCQ, a numeric and an open question, each answer in its own submitted attempt."""
+    with SessionLocal() as db:
+        form = Form(title="Graded exam")
+        db.add(form)
+        db.flush()
+        mcq = Question(form_id=form.id, type="mcq", prompt="Capital?", metadata_json=MCQ)
+        numeric = Question(form_id=form.id, type="numeric", prompt="g?", metadata_json=NUMERIC)
+        essay = Question(form_id=form.id, type="open", prompt="Why?")
+        db.add_all([mcq, numeric, essay])
+        db.flush()
+        for m, n in zip_longest(MCQ_ANSWERS, NUMERIC_ANSWERS, fillvalue=""):
+            sub = Submission(form_id=form.id, user_id=student_id, submitted_at=datetime.utcnow())
+            db.add(sub)
+            db.flush()
+            db.add_all(
+                [
+                    Answer(submission_id=sub.id, question_id=mcq.id, content=m),
+                    Answer(submission_id=sub.id, question_id=numeric.id, content=n),
+                    Answer(submission_id=sub.id, question_id=essay.id, content="Because."),
+                ]
+            )
+        draft = Submission(form_id=form.id, user_id=student_id)
+        db.add(draft)
+        db.flush()
+        db.add(Answer(submission_id=draft.id, question_id=mcq.id, content="Paris"))
+        db.commit()
+        yield db, form.id, mcq, numeric, essay, draft.id
+
+
+def _graded(db, question_id: int) -> list:
+    rows = db.execute(
+        select(Answer.content, Answer.score, Answer.feedback)
+        .join(Submission, Submission.id == Answer.submission_id)
+        .where(Answer.question_id == question_id, Submission.submitted_at.is_not(None))
+        .order_by(Answer.id)
+    )
+    return [tuple(r) for r in rows]
+
+
+def test_grade_form_stores_the_per_answer_verdicts(form):
+    db, form_id, mcq, numeric, essay, draft_id = form
+    summary = assessment.grade_form(db, form_id)
+    rows = 2 * len(MCQ_ANSWERS)  # the shorter numeric column is padded with blanks
+    assert (summary["questions"], summary["answers"], summary["updated"]) == (2, rows, rows)
+    db.expire_all()
+    for question, answers in ((mcq, MCQ_ANSWERS), (numeric, NUMERIC_ANSWERS)):
+        for content, score, feedback in _graded(db, question.id):
+            assert (score, feedback) == answers.get(content, (0, NO_ANSWER)), content
+    assert all(score is None for _, score, _ in _graded(db, essay.id))
+    draft = db.scalar(select(Answer).where(Answer.submission_id == draft_id))
+    assert draft.score is None  # not submitted yet
+
+
+def test_regrading_writes_only_changed_rows(form):
+    db, form_id, _, numeric, *_ = form
+    assessment.grade_form(db, form_id)
+    assert assessment.grade_form(db, form_id)["updated"] == 0
+    numeric.metadata_json = {"answer": 10.5}
+    db.commit()
+    # "9.81" and "9.9" turn incorrect, "10.5" turns correct
+    assert assessment.grade_form(db, form_id)["updated"] == 3
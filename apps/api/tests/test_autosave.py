@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from apps.api.app.main import app
+from apps.api.app.models.db import SessionLocal
+from apps.api.app.models.entities import Answer, Form, Question, User
+from apps.api.app.routers import submissions
+from apps.api.app.services import autosave, monitor
+from apps.api.app.tokens import create_token
+
+
+@pytest.fixture(scope="module")
+def exam():
+    """A student's client and a form with two questions."""
+    with TestClient(app) as c, SessionLocal() as db:
+        student = User(email="autosave@example.com", password_hash="x", role="student")
+        form = Form(title="Autosaved exam")
+        db.add_all([student, form])
+        db.flush()
+        questions = [Question(form_id=form.id, type="short", prompt=f"Q{i}") for i in range(2)]
+        db.add_all(questions)
+        db.commit()
+        c.headers["Authorization"] = f"Bearer {create_token(sub=str(student.id), role='student')}"
+        yield c, form.id, [q.id for q in questions]
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    """Run the routers in write-behind mode (``AUTOSAVE_MODE=memory``)."""
+    buf = autosave.MemoryAnswerBuffer()
+    for module in (autosave, submissions, monitor):
+        monkeypatch.setattr(module, "answer_buffer", buf)
+    return buf
+
+
+def _start(client, form_id: int) -> int:
+    return client.post("/submissions/start", json={"form_id": form_id}).json()["id"]
+
+
+def _save(client, sid: int, qid: int, content: str):
+    return client.post("/submissions/answer", json={"submission_id": sid, "question_id": qid, "content": content})
+
+
+def _stored(sid: int) -> dict[int, str]:
+    with SessionLocal() as db:
+        return {a.question_id: a.content for a in db.scalars(select(Answer).where(Answer.submission_id == sid))}
+
+
+def test_buffered_autosave_is_coalesced_readable_and_flushed_on_submit(exam, buffer):
+    client, form_id, (q1, q2) = exam
+    sid = _start(client, form_id)
+    assert _save(client, sid, q1, "draft").status_code == 200
+    assert _save(client, sid, q1, "final").status_code == 200
+    assert _stored(sid) == {}  # not written yet
+    answers = client.get(f"/submissions/{sid}").json()["answers"]
+    assert answers == [{"question_id": q1, "content": "final"}]
+    assert client.post("/submissions/submit", json={"submission_id": sid}).status_code == 200
+    assert _stored(sid) == {q1: "final"}
+
+
+def test_periodic_flush_writes_the_buffer(exam, buffer):
+    client, form_id, (q1, q2) = exam
+    sid = _start(client, form_id)
+    _save(client, sid, q1, "one")
+    _save(client, sid, q2, "two")
+    assert asyncio.run(autosave.flush_all()) == 2
+    assert _stored(sid) == {q1: "one", q2: "two"}
+    assert asyncio.run(autosave.flush_all()) == 0
+
+
+def test_a_flush_that_commits_late_does_not_overwrite_a_newer_answer(exam, buffer):
+    client, form_id, (q1, _) = exam
+    sid = _start(client, form_id)
+    _save(client, sid, q1, "old")
+    stale = asyncio.run(buffer.drain())  # e.g. another worker's flusher, still to commit
+    _save(client, sid, q1, "new")
+    asyncio.run(autosave.flush_all())
+    asyncio.run(autosave._write_batch(stale))
+    assert _stored(sid) == {q1: "new"}
+
+
+def test_saves_drained_before_submit_still_land(exam, buffer):
+    client, form_id, (q1, _) = exam
+    sid = _start(client, form_id)
+    _save(client, sid, q1, "before submit")
+    in_flight = asyncio.run(buffer.drain())  # the flusher took it, so submit finds nothing buffered
+    client.post("/submissions/submit", json={"submission_id": sid})
+    asyncio.run(autosave._write_batch(in_flight))
+    assert _stored(sid) == {q1: "before submit"}
+
+
+def test_autosaves_after_submit_are_refused_or_dropped(exam, buffer):
+    client, form_id, (q1, q2) = exam
+    sid = _start(client, form_id)
+    _save(client, sid, q1, "submitted")
+    client.post("/submissions/submit", json={"submission_id": sid})
+    # q1's key is cached as validated (as on another worker): accepted into the buffer, dropped by the flush
+    assert _save(client, sid, q1, "too late").status_code == 200
+    assert asyncio.run(autosave.flush_all()) == 0
+    # an unvalidated key reads the submission and is refused outright
+    assert _save(client, sid, q2, "too late").status_code == 409
+    batch = client.post(f"/submissions/{sid}/answers:batch", json={"answers": [{"question_id": q2, "content": "x"}]})
+    assert batch.status_code == 409
+    assert _stored(sid) == {q1: "submitted"}
+
+
+def _batch(client, sid: int, answers: list[tuple[int, str]]):
+    body = {"answers": [{"question_id": q, "content": c} for q, c in answers]}
+    return client.post(f"/submissions/{sid}/answers:batch", json=body)
+
+
+def test_batch_upsert_saves_valid_answers_and_reports_the_rest(exam):
+    client, form_id, (q1, q2) = exam
+    sid = _start(client, form_id)
+    _save(client, sid, q2, "earlier")
+    r = _batch(client, sid, [(q1, "first"), (q2, "replaced"), (999_999, "nope"), (q1, "last wins")])
+    assert r.status_code == 200
+    assert r.json()["saved"] == 2
+    assert {x["question_id"]: x["status"] for x in r.json()["results"]} == {
+        q1: "saved",
+        q2: "saved",
+        999_999: "invalid_question",
+    }
+    assert _stored(sid) == {q1: "last wins", q2: "replaced"}
+
+
+def test_batch_upsert_is_not_overwritten_by_an_older_buffered_autosave(exam, buffer):
+    client, form_id, (q1, q2) = exam
+    sid = _start(client, form_id)
+    _save(client, sid, q1, "buffered before the batch")
+    _save(client, sid, q2, "only buffered")
+    assert _batch(client, sid, [(q1, "from the batch")]).status_code == 200
+    asyncio.run(autosave.flush_all())
+    assert _stored(sid) == {q1: "from the batch", q2: "only buffered"}
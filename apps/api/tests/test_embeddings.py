@@ -0,0 +1,132 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from apps.api.app.services.embeddings import EmbeddingService, HashingEmbedder
+
+
+class _CountingBackend(HashingEmbedder):
+    """Records every backend batch; ``gate`` (if set) holds a batch until the test releases it."""
+
+    name = "counting"
+
+    def __init__(self, gate: threading.Event = None) -> None:
+        super().__init__(dim=32)
+        self.calls: list[list[str]] = []
+        self.started = threading.Event()
+        self.gate = gate
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        return super().embed(texts)
+
+
+def _service(backend, **kw) -> EmbeddingService:
+    return EmbeddingService(backend=backend, batch_size=kw.pop("batch_size", 16), use_redis=False, **kw)
+
+
+def test_concurrent_embed_calls_share_one_backend_batch():
+    backend = _CountingBackend()
+    service = _service(backend, batch_wait_ms=20)
+
+    async def scenario():
+        return await asyncio.gather(service.embed(["alpha beta"]), service.embed(["gamma", "delta"]))
+
+    first, second = asyncio.run(scenario())
+    assert backend.calls == [["alpha beta", "gamma", "delta"]]
+    assert first.shape == (1, 32) and second.shape == (2, 32)
+    np.testing.assert_allclose(second, HashingEmbedder(dim=32).embed(["gamma", "delta"]))
+    assert service.counts["batches"] == 1 and service.counts["batched"] == 3
+
+
+def test_full_queue_flushes_without_waiting_for_the_timer():
+    backend = _CountingBackend()
+    service = _service(backend, batch_size=2, batch_wait_ms=10_000)
+
+    async def scenario():
+        return await asyncio.wait_for(service.embed(["one", "two", "three", "four"]), 2)
+
+    assert asyncio.run(scenario()).shape == (4, 32)
+    assert backend.calls == [["one", "two"], ["three", "four"]]
+
+
+def test_cached_texts_skip_the_backend():
+    backend = _CountingBackend()
+    service = _service(backend, batch_wait_ms=1)
+
+    async def scenario():
+        first = await service.embed(["Hello   world"])
+        # normalised whitespace/NFKC maps to the same cache key
+        second = await service.embed(["Hello world", "hello world"])
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    # "hello world" differs in case, so it is the only new text computed
+    assert backend.calls == [["Hello world"], ["hello world"]]
+    np.testing.assert_array_equal(first[0], second[0])
+    assert service.counts["hits"] == 1
+    assert service.stats()["cached"] == 2
+
+
+def test_duplicate_texts_in_flight_are_computed_once():
+    gate = threading.Event()
+    backend = _CountingBackend(gate)
+    service = _service(backend, batch_wait_ms=1)
+
+    async def scenario():
+        first = asyncio.create_task(service.embed(["same text", "same text"]))
+        # wait until the batch is running in its worker thread, then ask again
+        await asyncio.to_thread(backend.started.wait, 5)
+        assert service.stats()["inflight"] == 1
+        second = asyncio.create_task(service.embed(["same text"]))
+        await asyncio.sleep(0.05)
+        gate.set()
+        return await first, await second
+
+    first, second = asyncio.run(scenario())
+    assert backend.calls == [["same text"]]
+    assert service.counts["coalesced"] == 2
+    np.testing.assert_array_equal(first[0], second[0])
+    np.testing.assert_array_equal(first[0], first[1])
+    assert service.stats()["inflight"] == 0
+
+
+def test_backend_failure_releases_every_waiter():
+    class _Broken(_CountingBackend):
+        def embed(self, texts):
+            raise RuntimeError("model unavailable")
+
+    service = _service(_Broken(), batch_wait_ms=1)
+
+    async def scenario():
+        return await asyncio.gather(service.embed(["x"]), service.embed(["x"]), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert service.stats()["inflight"] == 0
+
+
+def test_cancelled_caller_does_not_fail_others_waiting_on_the_same_text():
+    gate = threading.Event()
+    backend = _CountingBackend(gate)
+    service = _service(backend, batch_wait_ms=1)
+
+    async def scenario():
+        first = asyncio.create_task(service.embed(["shared query"]))
+        second = asyncio.create_task(service.embed(["shared query"]))
+        await asyncio.to_thread(backend.started.wait, 5)
+        first.cancel()  # e.g. the client of one /retrieval/search request disconnected
+        await asyncio.sleep(0)
+        gate.set()
+        vector = await second
+        assert first.cancelled()
+        return vector
+
+    vector = asyncio.run(scenario())
+    np.testing.assert_allclose(vector, HashingEmbedder(dim=32).embed(["shared query"]))
+    assert backend.calls == [["shared query"]]
+    assert service.stats()["inflight"] == 0
@@ -0,0 +1,64 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.api.app.main import app
+from apps.api.app.models.db import SessionLocal
+from apps.api.app.models.entities import Form, Question, User
+from apps.api.app.tokens import create_token
+
+
+@pytest.fixture(scope="module")
+def exam():
+    """A tutor's client and a form with one multiple-choice question."""
+    with SessionLocal() as db:
+        tutor = User(email="exam-cache@example.com", password_hash="x", role="tutor")
+        form = Form(title="Cached exam")
+        db.add_all([tutor, form])
+        db.flush()
+        question = Question(
+            form_id=form.id,
+            type="mcq",
+            prompt="2 + 2?",
+            metadata_json={"choices": ["3", "4"], "answer": 1},
+        )
+        db.add(question)
+        db.commit()
+        token = create_token(sub=str(tutor.id), role="tutor")
+        ids = form.id, question.id
+    with TestClient(app) as c:
+        c.headers["Authorization"] = f"Bearer {token}"
+        yield c, *ids
+
+
+def test_exam_carries_an_etag_and_hides_the_answer_key(exam):
+    client, form_id, _ = exam
+    r = client.get(f"/forms/{form_id}/exam")
+    assert r.status_code == 200
+    assert r.headers["ETag"].startswith('W/"')
+    assert r.json()["version"] in r.headers["ETag"]
+    (question,) = r.json()["questions"]
+    assert question["metadata_json"] == {"choices": ["3", "4"]}
+
+
+def test_matching_if_none_match_gets_304(exam):
+    client, form_id, _ = exam
+    etag = client.get(f"/forms/{form_id}/exam").headers["ETag"]
+    r = client.get(f"/forms/{form_id}/exam", headers={"If-None-Match": f'W/"stale", {etag}'})
+    assert r.status_code == 304
+    assert r.headers["ETag"] == etag and r.content == b""
+    assert client.get(f"/forms/{form_id}/exam", headers={"If-None-Match": 'W/"stale"'}).status_code == 200
+
+
+def test_question_edit_invalidates_the_cached_exam(exam):
+    client, form_id, question_id = exam
+    etag = client.get(f"/forms/{form_id}/exam").headers["ETag"]
+    assert client.patch(f"/questions/{question_id}", json={"prompt": "3 + 3?"}).status_code == 200
+    r = client.get(f"/forms/{form_id}/exam", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert r.json()["questions"][0]["prompt"] == "3 + 3?"
+
+
+def test_unknown_form_is_404(exam):
+    client, *_ = exam
+    assert client.get("/forms/987654/exam").status_code == 404
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import pytest
+
+from apps.api.app.services import hint, llm
+from apps.workers import tasks
+
+
+def test_queue_ladders_runs_off_the_loop_and_survives_a_broker_outage(monkeypatch):
+    calls = []
+
+    def unreachable_broker(**kwargs):
+        calls.append((threading.current_thread(), kwargs))
+        raise ConnectionError("broker unreachable")
+
+    monkeypatch.setattr(llm, "llm_enabled", lambda: True)
+    monkeypatch.setattr(tasks.precompute_hints, "delay", unreachable_broker)
+    asyncio.run(hint.queue_ladders(question_ids=[7]))
+    ((thread, kwargs),) = calls
+    assert thread is not threading.main_thread()
+    assert kwargs == {"form_id": None, "question_ids": [7]}
+
+
+class _FakeLLM:
+    """Streams "Think" at once and " again" when ``release`` is set; records calls and closes."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.closed = 0
+        self.release = asyncio.Event()
+
+    async def stream(self, messages, max_tokens, temperature):
+        self.calls += 1
+        try:
+            yield "Think"
+            await self.release.wait()
+            yield " again"
+        finally:
+            self.closed += 1
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    fake = _FakeLLM()
+    monkeypatch.setattr(llm, "llm_enabled", lambda: True)
+    monkeypatch.setattr(llm, "get_llm", lambda: fake)
+    return fake
+
+
+async def _collect(service, text: str) -> str:
+    return "".join([token async for token in service.stream(None, 3, text)])
+
+
+async def _ticks(n: int = 5) -> None:
+    for _ in range(n):
+        await asyncio.sleep(0)
+
+
+def test_identical_requests_share_one_generation(fake_llm):
+    service = hint.HintService()
+
+    async def scenario():
+        first = asyncio.create_task(_collect(service, "my answer"))
+        await _ticks()
+        # case, whitespace and punctuation fold away: the same generation, replayed then followed live
+        second = asyncio.create_task(_collect(service, " My  answer!"))
+        await _ticks()
+        fake_llm.release.set()
+        return await first, await second
+
+    assert asyncio.run(scenario()) == ("Think again", "Think again")
+    assert fake_llm.calls == 1
+    assert service.counts["generations"] == 1 and service.counts["coalesced"] == 1
+    assert service.stats()["inflight"] == 0
+
+
+def test_generation_is_cancelled_when_the_last_subscriber_leaves(fake_llm):
+    service = hint.HintService()
+
+    async def scenario():
+        first = asyncio.create_task(_collect(service, "stuck"))
+        second = asyncio.create_task(_collect(service, "stuck"))
+        await _ticks()
+        first.cancel()
+        await _ticks()
+        assert fake_llm.closed == 0  # the other subscriber still listens
+        second.cancel()
+        await _ticks()
+        assert fake_llm.closed == 1 and service.stats()["inflight"] == 0
+        # a new request starts afresh instead of joining the cancelled generation
+        fake_llm.release.set()
+        return await _collect(service, "stuck")
+
+    assert asyncio.run(scenario()) == "Think again"
+    assert fake_llm.calls == 2 and service.counts["cancelled"] == 1
+
+
+def test_cancelled_question_load_does_not_fail_other_waiters(monkeypatch):
+    reads, release = [], asyncio.Event()
+    context = hint.QuestionContext(9001, 1, "mcq", "2 + 2?", ("3", "4"), "v1")
+
+    async def slow_read(question_id):
+        reads.append(question_id)
+        await release.wait()
+        return context
+
+    monkeypatch.setattr(hint, "_read_question", slow_read)
+
+    async def scenario():
+        first = asyncio.create_task(hint.load_question(9001))  # started the read
+        second = asyncio.create_task(hint.load_question(9001))
+        await _ticks()
+        first.cancel()  # e.g. its WebSocket closed
+        await _ticks()
+        release.set()
+        loaded = await second
+        assert first.cancelled()
+        return loaded
+
+    assert asyncio.run(scenario()) == context
+    assert reads == [9001]
+    assert asyncio.run(hint.load_question(9001)) == context  # cached
+    hint.forget_question(9001)
+
+
+def test_failed_question_load_is_retried_by_the_next_caller(monkeypatch):
+    attempts = []
+
+    async def flaky_read(question_id):
+        attempts.append(question_id)
+        if len(attempts) == 1:
+            raise ConnectionError("database went away")
+        return None
+
+    monkeypatch.setattr(hint, "_read_question", flaky_read)
+
+    async def scenario():
+        results = await asyncio.gather(hint.load_question(9002), hint.load_question(9002), return_exceptions=True)
+        assert [type(r) for r in results] == [ConnectionError, ConnectionError]
+        return await hint.load_question(9002)
+
+    assert asyncio.run(scenario()) is None
+    assert attempts == [9002, 9002]
+    hint.forget_question(9002)
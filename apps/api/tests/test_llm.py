@@ -0,0 +1,205 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from apps.api.app.services.llm import (
+    AdaptiveLimiter,
+    LLMClient,
+    LLMError,
+    OpenAICompatibleProvider,
+    RetryableError,
+    TokenBucket,
+)
+from apps.api.benchmarks.fake_llm import create_app, serve_in_thread
+
+
+MESSAGES = [{"role": "user", "content": "hint please"}]
+
+
+@pytest.fixture
+def fake_llm():
+    """Start a fake provider built with the given ``create_app`` options; stopped after the test."""
+    servers = []
+
+    def start(**options):
+        app = create_app(**options)
+        server, base_url = serve_in_thread(app)
+        servers.append(server)
+        return app.state.stats, base_url
+
+    yield start
+    for server in servers:
+        server.should_exit = True
+
+
+def _client(base_url: str, **kw) -> LLMClient:
+    kw.setdefault("rpm", 0)
+    kw.setdefault("tpm", 0)
+    kw.setdefault("retry_base", 0.001)
+    return LLMClient(OpenAICompatibleProvider(base_url, model="fake"), **kw)
+
+
+class _RecordingProvider(OpenAICompatibleProvider):
+    """Logs when each attempt starts and the ``Retry-After`` of each pushback."""
+
+    def __init__(self, base_url: str) -> None:
+        super().__init__(base_url, model="fake")
+        self.attempts: list[float] = []
+        self.pushback: list[tuple[float, float]] = []
+
+    async def complete(self, http, messages, max_tokens, temperature):
+        self.attempts.append(time.monotonic())
+        try:
+            return await super().complete(http, messages, max_tokens, temperature)
+        except RetryableError as e:
+            self.pushback.append((time.monotonic(), e.retry_after))
+            raise
+
+
+def test_429_is_retried_no_sooner_than_retry_after(fake_llm):
+    # 120 rpm: a burst of 20, then one request every 0.5 s
+    stats, base_url = fake_llm(latency=0.01, jitter=0, rpm=120)
+
+    async def scenario():
+        async with httpx.AsyncClient() as http:
+            # drain the provider's quota, then take the next request slot the moment it refills, so
+            # the client's call finds an empty bucket and is told to wait about 0.5 s
+            throttled = False
+            while True:
+                status = (await http.post(f"{base_url}/chat/completions", json={"messages": MESSAGES})).status_code
+                if status == 429:
+                    throttled = True
+                elif throttled:
+                    break
+        provider = _RecordingProvider(base_url)
+        client = LLMClient(provider, rpm=0, tpm=0, retry_base=0.001)
+        try:
+            result = await client.complete(MESSAGES, max_tokens=16)
+        finally:
+            await client.aclose()
+        return client, provider, result
+
+    client, provider, result = asyncio.run(scenario())
+    assert result.text
+    assert client.counts["throttled"] >= 1 and client.counts["ok"] == 1
+    assert len(provider.attempts) == len(provider.pushback) + 1
+    assert provider.pushback[0][1] > 0.3
+    # the jittered backoff alone (retry_base 1 ms) would have retried almost at once
+    for (rejected_at, retry_after), retried_at in zip(provider.pushback, provider.attempts[1:]):
+        assert retried_at - rejected_at >= retry_after
+
+
+def test_non_retryable_error_is_not_retried(fake_llm):
+    _, base_url = fake_llm(latency=0.01, jitter=0)
+
+    async def scenario():
+        client = _client(base_url + "/missing")
+        try:
+            with pytest.raises(LLMError) as exc:
+                await client.complete(MESSAGES)
+        finally:
+            await client.aclose()
+        return client, exc.value
+
+    client, error = asyncio.run(scenario())
+    assert "404" in str(error)
+    assert client.counts["retries"] == 0 and client.counts["failed"] == 1
+
+
+def test_overloaded_provider_halves_the_concurrency_limit(fake_llm):
+    stats, base_url = fake_llm(latency=0.1, jitter=0, max_concurrency=2)
+
+    async def scenario():
+        client = _client(base_url, concurrency=(8, 1, 64))
+        try:
+            results = await asyncio.gather(*(client.complete(MESSAGES, max_tokens=16) for _ in range(8)))
+        finally:
+            await client.aclose()
+        return client, results
+
+    client, results = asyncio.run(scenario())
+    assert len(results) == 8 and stats["ok"] == 8
+    assert stats["503"] >= 1 and client.counts["throttled"] == stats["503"]
+    # one halving to 4 per burst of 503s; eight successes only add back about 2
+    assert client.limiter.limit < 8
+
+
+def test_limiter_halves_once_per_burst_and_respects_bounds():
+    limiter = AdaptiveLimiter(initial=8, minimum=2, maximum=10)
+
+    async def scenario():
+        for _ in range(3):
+            await limiter.acquire()
+        limiter.latency = 0.05
+        limiter.release("overload", 0.05)
+        limiter.release("overload", 0.05)  # same burst: ignored
+        assert limiter.limit == 4
+        await asyncio.sleep(0.06)
+        limiter.release("overload", 0.05)
+        assert limiter.limit == 2
+        await asyncio.sleep(0.06)
+        await limiter.acquire()
+        limiter.release("overload", 0.05)
+        assert limiter.limit == 2  # floor
+        for _ in range(40):
+            await limiter.acquire()
+            limiter.release("ok", 0.05)
+        assert 8 < limiter.limit <= 10
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_settle_refunds_and_charges():
+    async def scenario():
+        bucket = TokenBucket(rate=10, capacity=100)
+        await bucket.acquire(60)
+        assert bucket.level == pytest.approx(40, abs=0.5)
+        bucket.settle(-50)  # used 10 of the 60 reserved
+        assert bucket.level == pytest.approx(90, abs=0.5)
+        bucket.settle(-50)  # refunds never overfill
+        assert bucket.level == 100
+        bucket.settle(110)  # used more than reserved: the debt delays the next caller
+        assert bucket.level == pytest.approx(-10, abs=0.5)
+        started = time.monotonic()
+        await bucket.acquire(1)
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 1.0
+
+
+def test_completed_call_is_charged_its_reported_usage(fake_llm):
+    _, base_url = fake_llm(latency=0.01, jitter=0)
+
+    async def scenario():
+        client = _client(base_url, tpm=600)  # 10 tokens/s, bucket of 100
+        try:
+            result = await client.complete(MESSAGES, max_tokens=50)
+        finally:
+            await client.aclose()
+        return client, result
+
+    client, result = asyncio.run(scenario())
+    used = result.prompt_tokens + result.completion_tokens
+    assert used < 50
+    # the 50 + prompt reservation was settled down to the usage (plus a little refill)
+    assert 100 - used <= client.tokens.level < 100 - used + 3
+
+
+def test_cancelled_call_refunds_its_reservation(fake_llm):
+    _, base_url = fake_llm(latency=5, jitter=0)
+
+    async def scenario():
+        client = _client(base_url, tpm=600)
+        call = asyncio.create_task(client.complete(MESSAGES, max_tokens=50))
+        await asyncio.sleep(0.2)
+        assert client.tokens.level < 60 and client.limiter.inflight == 1
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await client.aclose()
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.tokens.level == pytest.approx(100, abs=0.01) and client.limiter.inflight == 0
@@ -0,0 +1,40 @@
+import asyncio
+
+from apps.api.app.models.db import SessionLocal, SyncSessionAdapter, engine
+from apps.api.app.models.entities import Answer, Base, Form, Question, Submission, User
+from apps.api.app.services import autosave, monitor
+
+
+def _exam_in_progress():
+    """A form with three questions and one open submission whose first answer is already in the DB."""
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        user = User(email="monitor@example.com", password_hash="x", role="student")
+        form = Form(title="Monitored exam")
+        db.add_all([user, form])
+        db.flush()
+        questions = [Question(form_id=form.id, type="short", prompt=f"Q{i}") for i in range(3)]
+        sub = Submission(form_id=form.id, user_id=user.id)
+        db.add_all([*questions, sub])
+        db.flush()
+        db.add(Answer(submission_id=sub.id, question_id=questions[0].id, content="saved"))
+        db.commit()
+        return form.id, sub.id, [q.id for q in questions]
+
+
+def test_snapshot_counts_answers_still_in_the_autosave_buffer(monkeypatch):
+    form_id, sub_id, (q1, q2, q3) = _exam_in_progress()
+    buffer = autosave.MemoryAnswerBuffer()
+    monkeypatch.setattr(monitor, "answer_buffer", buffer)
+
+    async def scenario():
+        await buffer.put(sub_id, q1, "edited, not flushed yet")
+        await buffer.put(sub_id, q2, "not flushed yet")
+        live = monitor.LiveExamMonitor()
+        await live.load(SyncSessionAdapter(SessionLocal()), [form_id])
+        return live
+
+    live = asyncio.run(scenario())
+    (row,) = [r for r in live.snapshot() if r["id"] == sub_id]
+    assert row["answered"] == 2  # q1 from the DB and the buffer counts once
+    assert live.apply("answer.saved", {"submission_id": sub_id, "user_id": row["user_id"], "question_ids": [q3]})["answered"] == 3
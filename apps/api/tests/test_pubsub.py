@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import pytest
+
+from apps.api.app.pubsub import MemoryBroker, RedisBroker, Subscription, form_channel, submission_channel
+
+
+def test_memory_broker_delivers_to_channel_subscribers_only():
+    async def scenario():
+        broker = MemoryBroker()
+        async with broker.subscribe([form_channel(1)]) as form_sub, broker.subscribe([submission_channel(7)]) as sub_sub:
+            await broker.publish(form_channel(1), "answer.saved", {"question_id": 3})
+            assert await form_sub.get(timeout=1) == {"channel": "form:1", "event": "answer.saved", "data": {"question_id": 3}}
+            assert await sub_sub.get(timeout=0.05) is None
+        assert broker.subscriber_count(form_channel(1)) == 0
+
+    asyncio.run(scenario())
+
+
+def test_memory_broker_fans_out_to_every_subscriber():
+    async def scenario():
+        broker = MemoryBroker()
+        async with broker.subscribe(["form:1"]) as a, broker.subscribe(["form:1", "classroom:2"]) as b:
+            assert broker.subscriber_count("form:1") == 2
+            await broker.publish("form:1", "submission.submitted")
+            await broker.publish("classroom:2", "form.published")
+            assert (await a.get(timeout=1))["event"] == "submission.submitted"
+            assert [(await b.get(timeout=1))["event"] for _ in range(2)] == ["submission.submitted", "form.published"]
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_drops_instead_of_blocking_publisher():
+    sub = Subscription(["form:1"], maxsize=2)
+    for i in range(5):
+        sub.deliver({"channel": "form:1", "event": "e", "data": i})
+    assert sub.dropped == 3
+
+
+def test_publish_sync_from_another_thread_reaches_the_loop():
+    async def scenario():
+        broker = MemoryBroker()
+        async with broker.subscribe(["grading:1"]) as sub:
+            thread = threading.Thread(target=broker.publish_sync, args=("grading:1", "grading.progress", {"percent": 50}))
+            thread.start()
+            thread.join()
+            msg = await sub.get(timeout=1)
+        assert msg["data"] == {"percent": 50}
+
+    asyncio.run(scenario())
+
+
+class _FlakyPubSub:
+    """Redis ``PubSub`` double whose first SUBSCRIBE fails, as during a Redis restart."""
+
+    def __init__(self) -> None:
+        self.subscribed: list[str] = []
+        self.fail_next = True
+
+    async def subscribe(self, *channels: str) -> None:
+        if self.fail_next:
+            self.fail_next = False
+            raise ConnectionError("Connection reset by peer")
+        self.subscribed.extend(channels)
+
+    async def unsubscribe(self, *channels: str) -> None:
+        for ch in channels:
+            self.subscribed.remove(ch)
+
+    async def get_message(self, timeout: float):
+        await asyncio.sleep(timeout)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.ps = _FlakyPubSub()
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> _FlakyPubSub:
+        return self.ps
+
+
+def test_redis_broker_failed_subscribe_does_not_leave_channel_counted():
+    async def scenario():
+        redis = _FakeRedis()
+        broker = RedisBroker(redis)
+        with pytest.raises(ConnectionError):
+            async with broker.subscribe(["form:1"]):
+                pass
+        # the next subscriber must send SUBSCRIBE again instead of trusting a stale refcount
+        async with broker.subscribe(["form:1"]):
+            assert redis.ps.subscribed == ["form:1"]
+        assert redis.ps.subscribed == []
+        await broker.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from apps.api.app import ratelimit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A manual ``time.monotonic`` for the limiter."""
+    now = SimpleNamespace(t=1000.0)
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=lambda: now.t))
+    return now
+
+
+def _reserve(limiter, key: str, max_wait=None) -> float:
+    return asyncio.run(limiter.reserve(key, max_wait))
+
+
+def test_burst_is_allowed_then_requests_are_spaced_by_the_interval(clock):
+    limiter = ratelimit.MemoryRateLimiter(interval=1.0, burst=3)
+    assert [_reserve(limiter, "user:1") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert _reserve(limiter, "user:1") == pytest.approx(1.0)
+    assert _reserve(limiter, "user:1") == pytest.approx(2.0)
+    clock.t += 10  # idle long enough to refill the whole burst
+    assert [_reserve(limiter, "user:1") for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_keys_are_limited_independently(clock):
+    limiter = ratelimit.MemoryRateLimiter(interval=1.0)
+    assert _reserve(limiter, "user:1") == 0.0
+    assert _reserve(limiter, "user:1") == pytest.approx(1.0)
+    assert _reserve(limiter, "user:2") == 0.0
+
+
+def test_denied_request_reports_retry_after_and_keeps_no_slot(clock):
+    limiter = ratelimit.MemoryRateLimiter(interval=2.0)
+    asyncio.run(ratelimit.throttle(limiter, "user:1", max_wait=0.5))
+    with pytest.raises(ratelimit.RateLimited) as exc:
+        asyncio.run(ratelimit.throttle(limiter, "user:1", max_wait=0.5))
+    assert exc.value.retry_after == pytest.approx(2.0)
+    # the rejected request did not push the key further back
+    with pytest.raises(ratelimit.RateLimited) as exc:
+        asyncio.run(ratelimit.throttle(limiter, "user:1", max_wait=0.5))
+    assert exc.value.retry_after == pytest.approx(2.0)
+    clock.t += 1.6
+    asyncio.run(ratelimit.throttle(limiter, "user:1", max_wait=0.5))  # waits the remaining 0.4 s
+
+
+def test_idle_keys_are_evicted(clock):
+    limiter = ratelimit.MemoryRateLimiter(interval=1.0, idle_ttl=5.0, shards=1)
+    for i in range(10):
+        _reserve(limiter, f"user:{i}")
+    assert len(limiter) == 10
+    clock.t += 7
+    _reserve(limiter, "user:new")
+    assert len(limiter) == 1
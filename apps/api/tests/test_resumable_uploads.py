@@ -0,0 +1,65 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.api.app import storage
+from apps.api.app.main import app
+from apps.api.app.models.db import SessionLocal
+from apps.api.app.models.entities import UploadSession, User
+from apps.api.app.tokens import create_token
+
+
+@pytest.fixture(scope="module")
+def client():
+    with SessionLocal() as db:
+        user = User(email="uploader@example.com", password_hash="x", role="tutor")
+        db.add(user)
+        db.commit()
+        token = create_token(sub=str(user.id), role="tutor")
+    with TestClient(app) as c:
+        c.headers["Authorization"] = f"Bearer {token}"
+        yield c
+
+
+def _session_with_one_part(client, data: bytes) -> str:
+    session = client.post("/videos/uploads", json={"filename": "lecture.mp4", "content_type": "video/mp4"}).json()
+    r = client.put(f"/videos/uploads/{session['id']}/parts/1", content=data, headers={"Content-Type": "application/octet-stream"})
+    assert r.status_code == 200
+    return session["id"]
+
+
+def test_complete_retry_finishes_an_already_assembled_upload(client, monkeypatch):
+    session_id = _session_with_one_part(client, b"frame" * 1000)
+    real_sha256 = storage.sha256_object
+
+    def flaky_sha256(key):
+        monkeypatch.setattr(storage, "sha256_object", real_sha256)
+        raise ConnectionError("storage connection reset while hashing")
+
+    monkeypatch.setattr(storage, "sha256_object", flaky_sha256)
+    with pytest.raises(ConnectionError):
+        client.post(f"/videos/uploads/{session_id}/complete")
+    # the multipart upload is gone now (NoSuchUpload), but its object is there to hash and register
+    r = client.post(f"/videos/uploads/{session_id}/complete")
+    assert r.status_code == 200
+    video = r.json()
+    assert client.get(f"/videos/uploads/{session_id}").json()["video_id"] == video["id"]
+
+
+def test_abort_after_assembly_removes_the_orphaned_object(client, monkeypatch):
+    session_id = _session_with_one_part(client, b"other" * 1000)
+    monkeypatch.setattr(storage, "sha256_object", lambda key: (_ for _ in ()).throw(ConnectionError("reset")))
+    with pytest.raises(ConnectionError):
+        client.post(f"/videos/uploads/{session_id}/complete")
+    with SessionLocal() as db:
+        key = db.get(UploadSession, session_id).storage_key
+    assert storage.object_exists(key)
+    assert client.delete(f"/videos/uploads/{session_id}").status_code == 204
+    assert not storage.object_exists(key)
+
+
+def test_complete_of_an_unknown_multipart_upload_is_gone(client):
+    session_id = _session_with_one_part(client, b"gone" * 1000)
+    with SessionLocal() as db:
+        s = db.get(UploadSession, session_id)
+        storage.abort_multipart_upload(s.storage_key, s.upload_id)
+    assert client.post(f"/videos/uploads/{session_id}/complete").status_code == 410
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from apps.api.app import tokens
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """A small, empty cache behind ``decode_token`` that counts signature checks."""
+    cache = tokens.VerifiedTokenCache(maxsize=2)
+    monkeypatch.setattr(tokens, "token_cache", cache)
+    decodes = []
+    real_decode = tokens.jwt.decode
+    monkeypatch.setattr(tokens.jwt, "decode", lambda *a, **kw: decodes.append(a[0]) or real_decode(*a, **kw))
+    cache.decodes = decodes
+    return cache
+
+
+def test_a_token_is_verified_once_then_served_from_the_cache(cache):
+    token = tokens.create_token(sub="1", role="student")
+    assert tokens.decode_token(token)["sub"] == "1"
+    assert tokens.decode_token(token)["sub"] == "1"
+    assert cache.decodes == [token]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_an_entry_expires_with_its_token(cache, monkeypatch):
+    token = tokens.create_token(sub="1", role="student")
+    exp = tokens.decode_token(token)["exp"]
+    monkeypatch.setattr(tokens, "time", SimpleNamespace(time=lambda: exp + 1))
+    assert cache.get(token) is None
+    assert len(cache._entries) == 0
+    tokens.decode_token(token)  # the next request checks the signature again
+    assert cache.decodes == [token, token]
+
+
+def test_least_recently_used_token_is_evicted(cache):
+    a, b, c = (tokens.create_token(sub=str(i), role="student") for i in range(3))
+    for token in (a, b):
+        tokens.decode_token(token)
+    tokens.decode_token(a)  # a is now the most recently used
+    tokens.decode_token(c)
+    assert cache.get(b) is None
+    assert cache.get(a) is not None and cache.get(c) is not None
+    assert cache.decodes == [a, b, c]
+
+
+def test_invalid_tokens_are_not_cached(cache):
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            tokens.decode_token("not.a.jwt")
+    assert cache.decodes == ["not.a.jwt", "not.a.jwt"]
+    assert len(cache._entries) == 0
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import os
+import threading
+
+import pytest
+from fastapi import HTTPException
+from minio.error import S3Error
+from starlette.requests import ClientDisconnect
+
+from apps.api.app import storage, uploads
+
+
+def _chunks(data: bytes, size: int = 64 * 1024):
+    async def gen():
+        for i in range(0, len(data), size):
+            yield data[i : i + size]
+            await asyncio.sleep(0)
+
+    return gen()
+
+
+def _stored(key: str) -> bytes:
+    resp = storage.get_client().get_object(storage.MINIO_BUCKET, key)
+    return resp.read()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_executor():
+    yield
+    uploads.shutdown()
+
+
+def test_stream_upload_stores_and_hashes_the_bytes():
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    result = asyncio.run(uploads.stream_upload(_chunks(data), "t/hash.bin", "video/mp4"))
+    assert result == uploads.UploadResult(len(data), hashlib.sha256(data).hexdigest())
+    assert _stored("t/hash.bin") == data
+    assert storage.sha256_object("t/hash.bin") == result.sha256
+
+
+def test_client_disconnect_aborts_the_storage_upload():
+    failed_before = uploads.upload_metrics.failed
+
+    async def disconnecting():
+        yield b"x" * 65536
+        await asyncio.sleep(0.01)
+        raise ClientDisconnect()
+
+    with pytest.raises(HTTPException):
+        asyncio.run(uploads.stream_upload(disconnecting(), "t/gone.bin"))
+    # the storage thread unwinds with UploadAborted and never writes a partial object
+    with pytest.raises(S3Error):
+        _stored("t/gone.bin")
+    assert uploads.upload_metrics.failed == failed_before + 1
+    assert uploads.upload_metrics.in_flight == 0
+
+
+def test_cancelled_request_aborts_and_propagates():
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def stalled():
+            yield b"x" * 1024
+            await gate.wait()  # client went quiet; the request task gets cancelled
+            yield b"never"
+
+        task = asyncio.create_task(uploads.stream_upload(stalled(), "t/cancel.bin"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    with pytest.raises(S3Error):
+        _stored("t/cancel.bin")
+
+
+class _BrokenStorage(storage.MemoryS3Client):
+    def put_object(self, bucket_name, object_name, data, length, **kwargs):
+        data.read(1024)
+        raise S3Error("AccessDenied", "Access Denied.", f"/{bucket_name}/{object_name}", "req-1", "minio.internal:9000", None)
+
+
+def test_storage_error_is_logged_not_leaked(monkeypatch, caplog):
+    monkeypatch.setattr(storage, "get_client", lambda: _BrokenStorage())
+    monkeypatch.setattr(storage, "_bucket_ready", True)
+    data = os.urandom(1024 * 1024)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(uploads.stream_upload(_chunks(data), "t/denied.bin"))
+    assert exc.value.status_code == 500
+    assert exc.value.detail == "upload failed"
+    assert "AccessDenied" in caplog.text
+
+
+def test_oversized_upload_is_rejected(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_BYTES", 100 * 1024)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(uploads.stream_upload(_chunks(b"x" * 200 * 1024), "t/big.bin"))
+    assert exc.value.status_code == 413
+
+
+def test_full_pipe_waits_on_the_loop_without_a_thread():
+    """Backpressure: with a slow reader the writer awaits queue space; no extra thread is parked on put()."""
+
+    async def scenario():
+        pipe = uploads.UploadPipe(max_chunks=2)
+        received = []
+
+        def reader():
+            while True:
+                chunk = pipe.read(4096)
+                if not chunk:
+                    break
+                received.append(chunk)
+                threading.Event().wait(0.002)
+            pipe.reader_done()
+
+        threads_before = threading.active_count()
+        thread = threading.Thread(target=reader)
+        thread.start()
+        for _ in range(50):
+            await pipe.write(b"y" * 4096)
+            assert threading.active_count() <= threads_before + 1
+        await pipe.close()
+        await asyncio.to_thread(thread.join)
+        return b"".join(received)
+
+    assert asyncio.run(scenario()) == b"y" * 4096 * 50
@@ -0,0 +1,67 @@
+import hashlib
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from apps.api.app.main import app
+from apps.api.app.models.db import SessionLocal
+from apps.api.app.models.entities import User
+from apps.api.app.tokens import create_token
+
+
+class _As:
+    """``client`` requests with one user's token."""
+
+    def __init__(self, client: TestClient, token: str) -> None:
+        self.client, self.headers = client, {"Authorization": f"Bearer {token}"}
+
+    def __getattr__(self, method):
+        def call(url, headers=None, **kw):
+            return getattr(self.client, method)(url, headers={**self.headers, **(headers or {})}, **kw)
+
+        return call
+
+
+@pytest.fixture(scope="module")
+def tutors():
+    """Two tutors, and content the first one has uploaded."""
+    with SessionLocal() as db:
+        owner = User(email="dedup-owner@example.com", password_hash="x", role="tutor")
+        other = User(email="dedup-other@example.com", password_hash="x", role="tutor")
+        db.add_all([owner, other])
+        db.commit()
+        tokens = [create_token(sub=str(u.id), role="tutor") for u in (owner, other)]
+    with TestClient(app) as c:
+        a, b = _As(c, tokens[0]), _As(c, tokens[1])
+        data = os.urandom(256 * 1024)
+        uploaded = a.post("/videos", files={"file": ("lecture.mp4", data, "video/mp4")})
+        assert uploaded.status_code == 201
+        yield a, b, data, uploaded.json()
+
+
+def test_owner_can_skip_the_upload_with_a_known_hash(tutors):
+    owner, _, data, video = tutors
+    r = owner.post("/videos", headers={"X-Content-SHA256": hashlib.sha256(data).hexdigest()})
+    assert r.status_code == 200 and r.headers["X-Deduplicated"] == "true"
+    assert r.json()["id"] == video["id"]
+
+
+def test_a_claimed_hash_does_not_link_someone_elses_video(tutors):
+    _, other, data, video = tutors
+    digest = hashlib.sha256(data).hexdigest()
+    # no bytes: the claim alone is not answered with the existing video
+    r = other.post("/videos", headers={"X-Content-SHA256": digest})
+    assert r.status_code >= 400
+    # with the bytes, the server's own hash deduplicates
+    r = other.post("/videos", headers={"X-Content-SHA256": digest}, files={"file": ("copy.mp4", data, "video/mp4")})
+    assert r.status_code == 200 and r.json()["id"] == video["id"]
+
+
+def test_resumable_session_short_cut_is_for_the_owner_only(tutors):
+    owner, other, data, video = tutors
+    payload = {"filename": "again.mp4", "content_type": "video/mp4", "sha256": hashlib.sha256(data).hexdigest()}
+    assert owner.post("/videos/uploads", json=payload).json()["video_id"] == video["id"]
+    session = other.post("/videos/uploads", json=payload).json()
+    assert session["video_id"] is None
+    assert other.delete(f"/videos/uploads/{session['id']}").status_code < 300
@@ -1,7 +1,7 @@
 "use client"
 
 import { useEffect, useState } from "react"
-import { getApiBase } from "@/lib/api"
+import { fetchAllPages, getApiBase } from "@/lib/api"
 import { getRole, getToken, getEmail } from "@/lib/auth"
 
 type User = { id: number; email: string; role: "admin" | "tutor" | "student"; created_at: string }
@@ -24,8 +24,7 @@ export default function AdminPage() {
   }
 
   const load = () => {
-    fetch(`${API}/admin/users`, { headers: authHeaders() })
-      .then((r) => r.json())
+    fetchAllPages<User>(`${API}/admin/users`, { headers: authHeaders() })
       .then(setUsers)
       .catch(() => setError("Failed to load users"))
   }
@@ -1,7 +1,7 @@
 "use client"
 
 import { useEffect, useState } from "react"
-import { getApiBase } from "@/lib/api"
+import { fetchAllPages, getApiBase } from "@/lib/api"
 import { getRole, getToken } from "@/lib/auth"
 
 type Classroom = { id: number; name: string }
@@ -36,16 +36,10 @@ export default function ClassroomsPage() {
       const token = getToken()
       const headers = { Authorization: `Bearer ${token}` }
       
-      const [classroomsRes, usersRes, formsRes] = await Promise.all([
-        fetch(`${API}/classrooms`, { headers }),
-        fetch(`${API}/admin/users`, { headers }),
-        fetch(`${API}/forms`, { headers })
-      ])
-      
       const [classroomsData, usersData, formsData] = await Promise.all([
-        classroomsRes.json(),
-        usersRes.json(),
-        formsRes.json()
+        fetchAllPages<Classroom>(`${API}/classrooms`, { headers }),
+        fetchAllPages<User>(`${API}/admin/users?role=student`, { headers }),
+        fetchAllPages<Form>(`${API}/forms`, { headers })
       ])
       
       setClassrooms(classroomsData)
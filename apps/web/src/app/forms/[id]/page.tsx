@@ -2,7 +2,7 @@
 
 import { useEffect, useMemo, useState } from "react"
 import { useParams } from "next/navigation"
-import { getApiBase } from "@/lib/api"
+import { fetchAllPages, getApiBase } from "@/lib/api"
 import { getRole, getToken } from "@/lib/auth"
 
 type Question = {
@@ -44,9 +44,7 @@ export default function FormQuestionsPage() {
   const load = async () => {
     try {
       setError(null)
-      const res = await fetch(`${API}/questions?form_id=${formId}`, { headers: buildHeaders() })
-      const data = await res.json()
-      setQuestions(data)
+      setQuestions(await fetchAllPages<Question>(`${API}/questions?form_id=${formId}`, { headers: buildHeaders() }))
     } catch {
       setError("Failed to load questions")
     }
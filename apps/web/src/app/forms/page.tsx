@@ -8,7 +8,7 @@ type FormOut = {
   description?: string | null
 }
 
-import { getApiBase } from "@/lib/api"
+import { fetchAllPages, getApiBase } from "@/lib/api"
 import { getRole, getToken } from "@/lib/auth"
 const API = getApiBase()
 
@@ -26,9 +26,7 @@ export default function FormsPage() {
     try {
       setError(null)
       const token = getToken()
-      const res = await fetch(`${API}/forms`, { headers: token ? { Authorization: `Bearer ${token}` } : {} })
-      const data = await res.json()
-      setForms(data)
+      setForms(await fetchAllPages<FormOut>(`${API}/forms`, { headers: token ? { Authorization: `Bearer ${token}` } : {} }))
     } catch {
       setError("Failed to load forms")
     }
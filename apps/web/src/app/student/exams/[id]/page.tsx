@@ -72,7 +72,9 @@ export default function ExamDetail() {
   const startHints = () => {
     if (!content) return
     if (esRef.current) esRef.current.close()
-    const qs = new URLSearchParams({ text: content }).toString()
+    const params: Record<string, string> = { text: content, token: getToken() || "" }
+    if (questionId) params.question_id = questionId
+    const qs = new URLSearchParams(params).toString()
     const es = new EventSource(`${API}/realtime/hint?${qs}`)
     es.addEventListener("hint", (e) => setStream((prev) => [...prev, (e as MessageEvent).data]))
     es.addEventListener("context", (e) => setStream((prev) => [...prev, (e as MessageEvent).data]))
@@ -1,7 +1,7 @@
 "use client"
 
 import { useEffect, useState } from "react"
-import { getApiBase } from "@/lib/api"
+import { fetchAllPages, getApiBase } from "@/lib/api"
 import { getRole, getToken } from "@/lib/auth"
 
 type Sub = { id: number; form_id: number; user_id: number }
@@ -16,9 +16,7 @@ export default function StudentExams() {
     try {
       setError(null)
       const token = getToken()
-      const res = await fetch(`${API}/submissions/mine`, { headers: { Authorization: `Bearer ${token}` } })
-      const data = await res.json()
-      setSubs(data)
+      setSubs(await fetchAllPages<Sub>(`${API}/submissions/mine`, { headers: { Authorization: `Bearer ${token}` } }))
     } catch {
       setError("Failed to load submissions")
     }
@@ -29,7 +29,7 @@ export default function StudentExamPage() {
     try {
       setError(null)
       if (esRef.current) esRef.current.close()
-      const qs = new URLSearchParams({ text: answer || "", form_id: formId || "" }).toString()
+      const qs = new URLSearchParams({ text: answer || "", form_id: formId || "", token: getToken() || "" }).toString()
       const es = new EventSource(`${API}/realtime/hint?${qs}`)
       es.addEventListener("hint", (e) => setStream((prev) => [...prev, (e as MessageEvent).data]))
       es.addEventListener("context", (e) => setStream((prev) => [...prev, (e as MessageEvent).data]))
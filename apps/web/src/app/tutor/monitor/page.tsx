@@ -1,15 +1,16 @@
 "use client"
 
 import { useEffect, useState } from "react"
-import { getApiBase } from "@/lib/api"
+import { fetchAllPages, getApiBase } from "@/lib/api"
 import { getRole, getToken } from "@/lib/auth"
 
-type Active = { id: number; form_id: number; user_id: number; started_at: string }
+type Active = { id: number; form_id: number; user_id: number; started_at: string; answered?: number }
 
 export default function TutorMonitor() {
   const API = getApiBase()
   const [rows, setRows] = useState<Active[]>([])
   const [error, setError] = useState<string | null>(null)
+  const [formId, setFormId] = useState("")
 
   useEffect(() => {
     const role = getRole()
@@ -18,13 +19,29 @@ export default function TutorMonitor() {
       window.location.href = "/login"
       return
     }
+    if (formId) {
+      // Live push stream for one form: snapshot first, then incremental updates
+      const qs = new URLSearchParams({ form_id: formId, token })
+      const es = new EventSource(`${API}/submissions/monitor/stream?${qs}`)
+      es.addEventListener("snapshot", (ev) => {
+        setError(null)
+        setRows(JSON.parse((ev as MessageEvent).data).rows)
+      })
+      es.addEventListener("update", (ev) => {
+        const { type, row } = JSON.parse((ev as MessageEvent).data) as { type: string; row: Active }
+        setRows((prev) => {
+          const rest = prev.filter((r) => r.id !== row.id)
+          return type === "submission.submitted" ? rest : [row, ...rest].sort((a, b) => b.id - a.id)
+        })
+      })
+      es.onerror = () => setError("Live stream interrupted, retrying…")
+      return () => es.close()
+    }
     const headers = { Authorization: `Bearer ${token}` }
     const load = async () => {
       try {
         setError(null)
-        const res = await fetch(`${API}/submissions/monitor`, { headers })
-        const data = await res.json()
-        setRows(data)
+        setRows(await fetchAllPages<Active>(`${API}/submissions/monitor`, { headers }))
       } catch {
         setError("Failed to load active submissions")
       }
@@ -32,11 +49,16 @@ export default function TutorMonitor() {
     load()
     const t = setInterval(load, 5000)
     return () => clearInterval(t)
-  }, [API])
+  }, [API, formId])
 
   return (
     <main className="p-6 max-w-5xl mx-auto space-y-4">
       <h1 className="text-2xl font-bold">Monitoring</h1>
+      <div className="flex items-center gap-2 text-sm">
+        <label htmlFor="form-id">Live form ID</label>
+        <input id="form-id" className="border rounded px-2 py-1 w-24" value={formId} onChange={(e) => setFormId(e.target.value.replace(/\D/g, ""))} placeholder="all" />
+        <span className="text-gray-600">{formId ? "streaming" : "polling every 5s"}</span>
+      </div>
       {error && <div className="text-red-600 text-sm">{error}</div>}
       <table className="w-full text-sm border">
         <thead>
@@ -45,6 +67,7 @@ export default function TutorMonitor() {
             <th className="text-left p-2 border">Form</th>
             <th className="text-left p-2 border">Student</th>
             <th className="text-left p-2 border">Started</th>
+            <th className="text-left p-2 border">Answered</th>
           </tr>
         </thead>
         <tbody>
@@ -54,11 +77,12 @@ export default function TutorMonitor() {
               <td className="p-2 border">{r.form_id}</td>
               <td className="p-2 border">{r.user_id}</td>
               <td className="p-2 border">{new Date(r.started_at).toLocaleString()}</td>
+              <td className="p-2 border">{r.answered ?? "-"}</td>
             </tr>
           ))}
           {rows.length === 0 && (
             <tr>
-              <td className="p-2 border" colSpan={4}>No active submissions.</td>
+              <td className="p-2 border" colSpan={5}>No active submissions.</td>
             </tr>
           )}
         </tbody>
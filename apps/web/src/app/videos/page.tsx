@@ -1,7 +1,7 @@
 "use client"
 
 import { useEffect, useRef, useState } from "react"
-import { getApiBase } from "@/lib/api"
+import { fetchAllPages, getApiBase } from "@/lib/api"
 
 type VideoOut = {
   id: number
@@ -21,9 +21,7 @@ export default function VideosPage() {
   const load = async () => {
     try {
       setError(null)
-      const res = await fetch(`${API}/videos`)
-      const data = await res.json()
-      setVideos(data)
+      setVideos(await fetchAllPages<VideoOut>(`${API}/videos`))
     } catch {
       setError("Failed to load videos")
     }
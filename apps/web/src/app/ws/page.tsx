@@ -2,6 +2,7 @@
 
 import { useEffect, useMemo, useRef, useState } from "react"
 import { getApiBase } from "@/lib/api"
+import { getToken } from "@/lib/auth"
 
 function toWsUrl(httpUrl: string): string {
   try {
@@ -21,7 +22,9 @@ export default function WebSocketDemo() {
 
   const wsEndpoint = useMemo(() => {
     const base = getApiBase()
-    return toWsUrl(`${base}/realtime/ws/hint`)
+    const token = getToken()
+    const qs = token ? `?token=${encodeURIComponent(token)}` : ""
+    return toWsUrl(`${base}/realtime/ws/hint`) + qs
   }, [])
 
   useEffect(() => {
@@ -11,3 +11,16 @@ export function getApiBase(): string {
 }
 
 
+// List endpoints are keyset-paginated: follow X-Next-Cursor until the last page.
+export async function fetchAllPages<T>(url: string, init?: RequestInit): Promise<T[]> {
+  const items: T[] = []
+  let cursor: string | null = null
+  do {
+    const sep = url.includes('?') ? '&' : '?'
+    const res: Response = await fetch(cursor ? `${url}${sep}cursor=${encodeURIComponent(cursor)}` : url, init)
+    if (!res.ok) throw new Error(`${res.status} ${res.statusText}`)
+    items.push(...(await res.json()))
+    cursor = res.headers.get('X-Next-Cursor')
+  } while (cursor)
+  return items
+}
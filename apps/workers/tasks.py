@@ -1,14 +1,113 @@
+from typing import Optional
+
+from celery import chord
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from urllib3.exceptions import HTTPError as StorageConnectionError
+
 from .celery_app import celery_app
 
 
-@celery_app.task(name="videos.index")
-def index_video(video_id: str) -> str:
-    # placeholder: simulate indexing
-    return f"indexed {video_id}"
+# DB connection loss / pool exhaustion and object-storage connection errors (minio speaks urllib3);
+# none of them subclass the builtin ConnectionError or TimeoutError
+TRANSIENT_ERRORS = (OperationalError, PoolTimeoutError, StorageConnectionError, ConnectionError, TimeoutError)
+
+
+@celery_app.task(name="videos.index", bind=True, acks_late=True, max_retries=3)
+def index_video(self, video_id: str) -> dict:
+    """Segment + embed a video's transcript into ``video_segments``.
+
+    Idempotent and resumable (see ``services.video_rag``): ``acks_late`` redelivers the task if the
+    worker dies, and the re-run continues after the last committed batch. Progress is published as
+    the ``PROGRESS`` task state.
+    """
+    from apps.api.app.models.db import SessionLocal
+    from apps.api.app.services.video_rag import index_video as run_index
+
+    def progress(meta: dict) -> None:
+        self.update_state(state="PROGRESS", meta=meta)
+
+    db = SessionLocal()
+    try:
+        return run_index(db, int(video_id), progress=progress)
+    except TRANSIENT_ERRORS as e:  # storage/DB blips: retry, resuming from the checkpoint
+        raise self.retry(exc=e, countdown=10 * (self.request.retries + 1))
+    finally:
+        db.close()
+
+
+@celery_app.task(name="grading.run", bind=True, acks_late=True, max_retries=3)
+def run_grading(self, run_id: str) -> dict:
+    """Fan a grading run out as a chord: one ``grading.chunk`` per pending chunk, then ``grading.finalize``.
+
+    Also resumes a failed or interrupted run: the plan is reused and chunks already ``done`` are not
+    dispatched again, so throughput scales with the number of worker processes consuming the chunks.
+    """
+    from apps.api.app.models.db import SessionLocal
+    from apps.api.app.services import grading
+
+    db = SessionLocal()
+    try:
+        chunks = grading.plan_chunks(db, int(run_id))
+        pending = [c.id for c in chunks if c.status != "done"]
+        grading.publish_progress(db, int(run_id))
+    except TRANSIENT_ERRORS as e:
+        raise self.retry(exc=e, countdown=10 * (self.request.retries + 1))
+    finally:
+        db.close()
+    if pending:
+        chord(grade_chunk.s(chunk_id) for chunk_id in pending)(finalize_grading.s(run_id))
+    else:
+        finalize_grading.delay([], run_id)
+    return {"run_id": int(run_id), "chunks": len(chunks), "dispatched": len(pending)}
+
+
+@celery_app.task(name="grading.chunk", bind=True, acks_late=True, max_retries=3)
+def grade_chunk(self, chunk_id: int) -> dict:
+    """Grade one chunk of submissions; its scores and ``done`` checkpoint commit together."""
+    from apps.api.app.models.db import SessionLocal
+    from apps.api.app.services import grading
+
+    db = SessionLocal()
+    try:
+        return grading.grade_chunk(db, chunk_id)
+    except TRANSIENT_ERRORS as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=10 * (self.request.retries + 1))
+        grading.fail_chunk(db, chunk_id, repr(e))
+        raise
+    except Exception as e:
+        grading.fail_chunk(db, chunk_id, repr(e))
+        raise
+    finally:
+        db.close()
+
+
+@celery_app.task(name="grading.finalize")
+def finalize_grading(results: list, run_id: str) -> dict:
+    from apps.api.app.models.db import SessionLocal
+    from apps.api.app.services import grading
+
+    db = SessionLocal()
+    try:
+        return grading.finish_run(db, int(run_id))
+    finally:
+        db.close()
 
 
-@celery_app.task(name="grading.run")
-def run_grading(submission_id: str) -> str:
-    return f"graded {submission_id}"
+@celery_app.task(name="hints.precompute", bind=True, acks_late=True, max_retries=3)
+def precompute_hints(self, form_id: Optional[int] = None, question_ids: Optional[list[int]] = None) -> dict:
+    """Generate the student-independent hint stages of a form's (or the given) questions.
 
+    Queued on form/question create and on hint-relevant question edits; questions whose current
+    version already has a ladder are skipped, so duplicate or redelivered tasks are cheap.
+    """
+    from apps.api.app.models.db import SessionLocal
+    from apps.api.app.services.hint import precompute_ladders
 
+    db = SessionLocal()
+    try:
+        return precompute_ladders(db, form_id=form_id, question_ids=question_ids)
+    except TRANSIENT_ERRORS as e:
+        raise self.retry(exc=e, countdown=10 * (self.request.retries + 1))
+    finally:
+        db.close()